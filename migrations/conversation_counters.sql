@@ -0,0 +1,125 @@
+-- Migration: Denormalised conversation counters
+-- Description: Keep message_count, last_message_at and last_message_preview
+--              on conversations, maintained by triggers on messages, so the
+--              conversation list is a plain indexed read.
+-- Requires: create_chat_history_tables.sql, list_user_conversations.sql
+-- After running: python -m src.db.backfill_conversation_counters
+
+-- ============================================
+-- COLUMNS
+-- ============================================
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS last_message_preview TEXT;
+
+COMMENT ON COLUMN conversations.message_count IS 'Number of messages, maintained by triggers on messages';
+COMMENT ON COLUMN conversations.last_message_at IS 'created_at of the newest message, maintained by triggers';
+COMMENT ON COLUMN conversations.last_message_preview IS 'First 200 characters of the newest message, maintained by triggers';
+
+-- ============================================
+-- INSERT TRIGGER
+-- ============================================
+
+-- Same function the existing trigger_update_conversation_timestamp calls,
+-- now also bumping the counters. A message only replaces the preview if it
+-- is at least as new as the current one, so out-of-order inserts are safe.
+CREATE OR REPLACE FUNCTION update_conversation_timestamp()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE conversations
+    SET updated_at = NOW(),
+        message_count = message_count + 1,
+        last_message_preview = CASE
+            WHEN last_message_at IS NULL OR NEW.created_at >= last_message_at
+            THEN LEFT(NEW.content, 200)
+            ELSE last_message_preview
+        END,
+        last_message_at = GREATEST(last_message_at, NEW.created_at)
+    WHERE id = NEW.conversation_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- DELETE TRIGGER
+-- ============================================
+
+-- Only deleting the newest message needs a lookup for the next one
+-- (idx_messages_conv_created); when the whole conversation is being
+-- deleted the UPDATE simply matches no row.
+CREATE OR REPLACE FUNCTION update_conversation_counters_on_delete()
+RETURNS TRIGGER AS $$
+DECLARE
+    newest RECORD;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM conversations
+        WHERE id = OLD.conversation_id AND last_message_at = OLD.created_at
+    ) THEN
+        SELECT m.created_at, m.content INTO newest
+        FROM messages m
+        WHERE m.conversation_id = OLD.conversation_id
+        ORDER BY m.created_at DESC
+        LIMIT 1;
+
+        UPDATE conversations
+        SET message_count = GREATEST(message_count - 1, 0),
+            last_message_at = newest.created_at,
+            last_message_preview = LEFT(newest.content, 200)
+        WHERE id = OLD.conversation_id;
+    ELSE
+        UPDATE conversations
+        SET message_count = GREATEST(message_count - 1, 0)
+        WHERE id = OLD.conversation_id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_conversation_counters_on_delete ON messages;
+CREATE TRIGGER trigger_update_conversation_counters_on_delete
+    AFTER DELETE ON messages
+    FOR EACH ROW
+    EXECUTE FUNCTION update_conversation_counters_on_delete();
+
+-- ============================================
+-- READERS
+-- ============================================
+
+CREATE OR REPLACE FUNCTION list_user_conversations(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    message_count BIGINT,
+    last_message TEXT
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    SELECT c.id, c.title, c.created_at, c.updated_at,
+           c.message_count::BIGINT, c.last_message_preview
+    FROM conversations c
+    WHERE c.user_id = p_user_id
+    ORDER BY c.updated_at DESC
+    LIMIT p_limit;
+$$;
+
+CREATE OR REPLACE VIEW conversation_summaries
+WITH (security_invoker = true) AS
+SELECT
+    c.id,
+    c.user_id,
+    c.title,
+    c.created_at,
+    c.updated_at,
+    c.message_count::BIGINT AS message_count,
+    c.last_message_at,
+    c.last_message_preview AS last_message
+FROM conversations c;
@@ -0,0 +1,14 @@
+-- Migration: Index for streaming exports
+-- Description: Lets src/db/export.py page through one user's messages in
+--              (conversation_id, created_at, id) order with an index range
+--              scan, instead of a request per conversation.
+-- Requires: create_chat_history_tables.sql
+
+-- ============================================
+-- INDEXES
+-- ============================================
+
+-- Each page continues from the last row read, so without this every page
+-- would sort all of the user's messages again.
+CREATE INDEX IF NOT EXISTS idx_messages_user_conv_created
+    ON messages(user_id, conversation_id, created_at, id);
@@ -0,0 +1,95 @@
+-- Migration: Single-round-trip conversation listing
+-- Description: RPC returning a user's conversations with message counts and
+--              last-message previews, so the sidebar needs one request instead
+--              of 1 + 2 per conversation.
+-- Requires: create_chat_history_tables.sql
+
+-- ============================================
+-- LIST USER CONVERSATIONS (RPC)
+-- ============================================
+
+-- The page of conversations is picked first (idx_conversations_user_updated),
+-- then each row gets its last message and count through LATERAL subqueries
+-- that only touch idx_messages_conv_created. SECURITY INVOKER keeps the
+-- caller's RLS policies in force, so p_user_id can only ever narrow results.
+CREATE OR REPLACE FUNCTION list_user_conversations(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    message_count BIGINT,
+    last_message TEXT
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    SELECT
+        c.id,
+        c.title,
+        c.created_at,
+        c.updated_at,
+        counts.message_count,
+        last_msg.content AS last_message
+    FROM (
+        SELECT conv.id, conv.title, conv.created_at, conv.updated_at
+        FROM conversations conv
+        WHERE conv.user_id = p_user_id
+        ORDER BY conv.updated_at DESC
+        LIMIT p_limit
+    ) c
+    LEFT JOIN LATERAL (
+        SELECT m.content
+        FROM messages m
+        WHERE m.conversation_id = c.id
+        ORDER BY m.created_at DESC
+        LIMIT 1
+    ) last_msg ON TRUE
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS message_count
+        FROM messages m
+        WHERE m.conversation_id = c.id
+    ) counts
+    ORDER BY c.updated_at DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION list_user_conversations(UUID, INTEGER) TO authenticated;
+
+-- ============================================
+-- CONVERSATION SUMMARIES VIEW
+-- ============================================
+
+-- Views run with the owner's privileges by default, which bypasses RLS on
+-- conversations/messages. security_invoker (Postgres 15+) makes the view
+-- respect the caller's policies, and the LATERAL form avoids aggregating
+-- every message of the user before the page is cut.
+CREATE OR REPLACE VIEW conversation_summaries
+WITH (security_invoker = true) AS
+SELECT
+    c.id,
+    c.user_id,
+    c.title,
+    c.created_at,
+    c.updated_at,
+    counts.message_count,
+    counts.last_message_at,
+    last_msg.content AS last_message
+FROM conversations c
+CROSS JOIN LATERAL (
+    SELECT COUNT(*) AS message_count, MAX(m.created_at) AS last_message_at
+    FROM messages m
+    WHERE m.conversation_id = c.id
+) counts
+LEFT JOIN LATERAL (
+    SELECT m.content
+    FROM messages m
+    WHERE m.conversation_id = c.id
+    ORDER BY m.created_at DESC
+    LIMIT 1
+) last_msg ON TRUE;
+
+COMMENT ON FUNCTION list_user_conversations(UUID, INTEGER) IS 'Conversation list with message counts and last-message previews in one call';
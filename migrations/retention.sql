@@ -0,0 +1,53 @@
+-- Migration: Batched retention for old conversations
+-- Description: A procedure that deletes idle conversations in small
+--              committed batches so it never holds long locks or one huge
+--              transaction (schedulable with pg_cron).
+--              To archive before deleting, use python -m src.db.retention.
+-- Requires: create_chat_history_tables.sql
+
+-- ============================================
+-- PURGE OLD CONVERSATIONS (PROCEDURE)
+-- ============================================
+
+-- The cutoff scan uses idx_conversations_updated_at from
+-- create_chat_history_tables.sql (read backwards; ties on updated_at are put
+-- in id order by an incremental sort), so no extra index is needed on a
+-- column every new message updates.
+--
+-- Each batch locks up to batch_size expired conversations with SKIP LOCKED
+-- (rows in use are left for the next run), deletes them - messages follow
+-- via ON DELETE CASCADE - and commits before pausing. Must be CALLed
+-- outside an explicit transaction:
+--     CALL purge_old_conversations(365);
+CREATE OR REPLACE PROCEDURE purge_old_conversations(
+    days_old INTEGER DEFAULT 365,
+    batch_size INTEGER DEFAULT 100,
+    pause_seconds REAL DEFAULT 0.2
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cutoff TIMESTAMPTZ := NOW() - make_interval(days => days_old);
+    deleted INTEGER;
+    total INTEGER := 0;
+BEGIN
+    LOOP
+        DELETE FROM conversations
+        WHERE id IN (
+            SELECT id FROM conversations
+            WHERE updated_at < cutoff
+            ORDER BY updated_at, id
+            LIMIT batch_size
+            FOR UPDATE SKIP LOCKED
+        );
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        COMMIT;
+        EXIT WHEN deleted = 0;
+        total := total + deleted;
+        RAISE NOTICE 'purge_old_conversations: % deleted', total;
+        PERFORM pg_sleep(pause_seconds);
+    END LOOP;
+END;
+$$;
+
+COMMENT ON PROCEDURE purge_old_conversations(INTEGER, INTEGER, REAL) IS 'Delete conversations idle for days_old days in committed batches';
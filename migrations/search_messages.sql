@@ -0,0 +1,89 @@
+-- Migration: Ranked full-text search over a user's messages
+-- Description: RPC that searches message content through the existing
+--              idx_messages_content_search GIN index and returns ranked,
+--              highlighted snippets with their conversation context.
+-- Requires: create_chat_history_tables.sql
+
+-- ============================================
+-- SEARCH MESSAGES (RPC)
+-- ============================================
+
+-- The WHERE clause repeats the index expression exactly
+-- (to_tsvector('english', content)) so the planner can use the GIN index.
+-- Only the requested page is ranked into `hits`; ts_headline, the
+-- conversation title and the neighbouring message are fetched for those
+-- rows alone. SECURITY INVOKER keeps RLS in force.
+CREATE OR REPLACE FUNCTION search_messages(
+    p_user_id UUID,
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 10,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    message_id UUID,
+    conversation_id UUID,
+    conversation_title TEXT,
+    role TEXT,
+    created_at TIMESTAMPTZ,
+    rank REAL,
+    snippet TEXT,
+    context TEXT
+)
+LANGUAGE sql
+STABLE
+SECURITY INVOKER
+AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', p_query) AS query
+    ),
+    hits AS (
+        SELECT m.id, m.conversation_id, m.role, m.content, m.created_at,
+               ts_rank_cd(to_tsvector('english', m.content), q.query) AS rank
+        FROM messages m, q
+        WHERE to_tsvector('english', m.content) @@ q.query
+          AND m.user_id = p_user_id
+        ORDER BY rank DESC, m.created_at DESC, m.id
+        LIMIT LEAST(p_limit, 100)
+        OFFSET GREATEST(p_offset, 0)
+    )
+    SELECT
+        h.id,
+        h.conversation_id,
+        c.title,
+        h.role,
+        h.created_at,
+        h.rank,
+        ts_headline(
+            'english', h.content, q.query,
+            'StartSel=**, StopSel=**, MaxWords=35, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "'
+        ),
+        COALESCE(question.content, reply.content)
+    FROM hits h
+    CROSS JOIN q
+    JOIN conversations c ON c.id = h.conversation_id
+    -- an answer is shown with the question that led to it ...
+    LEFT JOIN LATERAL (
+        SELECT LEFT(p.content, 200) AS content
+        FROM messages p
+        WHERE p.conversation_id = h.conversation_id
+          AND p.created_at < h.created_at
+          AND p.role = 'user'
+        ORDER BY p.created_at DESC
+        LIMIT 1
+    ) question ON h.role = 'assistant'
+    -- ... and a question with the start of its answer
+    LEFT JOIN LATERAL (
+        SELECT LEFT(n.content, 200) AS content
+        FROM messages n
+        WHERE n.conversation_id = h.conversation_id
+          AND n.created_at > h.created_at
+          AND n.role = 'assistant'
+        ORDER BY n.created_at
+        LIMIT 1
+    ) reply ON h.role = 'user'
+    ORDER BY h.rank DESC, h.created_at DESC, h.id;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_messages(UUID, TEXT, INTEGER, INTEGER) TO authenticated;
+
+COMMENT ON FUNCTION search_messages(UUID, TEXT, INTEGER, INTEGER) IS 'Ranked full-text search over a user''s messages with highlighted snippets';
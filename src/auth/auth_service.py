@@ -1,5 +1,6 @@
 from typing import Optional, Tuple
-from .supabase_client import supabase
+from .supabase_client import sign_in_client, supabase
+from .supabase_user_client import discard_user_client
 
 def signup_email_password(email: str, password: str, full_name: str = "") -> Tuple[bool, str]:
     try:
@@ -32,15 +33,40 @@ def signup_email_password(email: str, password: str, full_name: str = "") -> Tup
         return False, f"Signup error: {e}"
 
 def login_email_password(email: str, password: str):
-    sb = supabase()
-    return sb.auth.sign_in_with_password({"email": email, "password": password})
+    """
+    Sign in on a one-off client and return the response. Pass its session
+    to session.start_session, which hands it to an AuthSession (or to the
+    shared client with adopt_session when the token cannot be verified).
+    """
+    return sign_in_client().auth.sign_in_with_password({"email": email, "password": password})
 
-def logout():
+def logout(access_token: Optional[str] = None):
+    """
+    Sign out. Pass the AuthSession's token when there is one; without it
+    this signs out the shared client's session (see adopt_session).
+    """
+    discard_user_client(access_token or current_access_token())
     try:
-        supabase().auth.sign_out()
+        if access_token:
+            supabase().auth.admin.sign_out(access_token)
+        else:
+            supabase().auth.sign_out()
     except Exception:
         pass
 
+def adopt_session(session) -> bool:
+    """
+    Keep a sign-in's session on the shared client, for current_user() and
+    current_access_token(). Only for sessions no AuthSession owns: the
+    shared client refreshes what it holds, and two refreshers would rotate
+    the same refresh token (Supabase ends the session on the loser's reuse).
+    """
+    try:
+        supabase().auth.set_session(session.access_token, session.refresh_token)
+        return True
+    except Exception:
+        return False
+
 def current_user() -> Optional[dict]:
     try:
         sess = supabase().auth.get_session()
@@ -50,3 +76,11 @@ def current_user() -> Optional[dict]:
     except Exception:
         pass
     return None
+
+def current_access_token() -> Optional[str]:
+    """JWT of the signed-in user, for user-scoped (RLS) clients."""
+    try:
+        sess = supabase().auth.get_session()
+        return getattr(sess, "access_token", None) if sess else None
+    except Exception:
+        return None
@@ -1,12 +1,13 @@
 from __future__ import annotations
-import os, time
+import asyncio, os, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Tuple, Dict, Any
 from pathlib import Path
 from dotenv import load_dotenv
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.pool import QueuePool
-from passlib.hash import bcrypt
+import bcrypt
 import jwt
 
 # ---------- env ----------
@@ -16,6 +17,10 @@ load_dotenv(PROJECT_ROOT / ".env")
 DATABASE_URL = os.getenv("DATABASE_URL")
 AUTH_SECRET = os.getenv("AUTH_SECRET_KEY", "dev-secret-change-me")
 AUTH_TTL = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", "86400"))
+BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "32"))
+HASH_QUEUE_TIMEOUT = float(os.getenv("AUTH_HASH_QUEUE_TIMEOUT", "2"))
 
 if not DATABASE_URL:
     raise RuntimeError("Missing DATABASE_URL in .env")
@@ -29,10 +34,62 @@ engine = create_engine(
     pool_pre_ping=True,
 )
 
+# ---------- password hashing ----------
+# bcrypt costs 100+ ms of CPU per call. It runs on a small dedicated pool so a
+# burst of logins queues up there (bcrypt releases the GIL while it works)
+# instead of taking every request thread. At most HASH_WORKERS + HASH_QUEUE
+# jobs are admitted; beyond that callers get AuthBusyError.
+
+class AuthBusyError(RuntimeError):
+    """Password hashing pool and queue are full."""
+
+BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment."
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="auth-hash")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+def _submit(fn, *args, wait: bool = True) -> Future:
+    """Queue a hashing job; async callers pass wait=False so the event loop never blocks here."""
+    acquired = _hash_slots.acquire(timeout=HASH_QUEUE_TIMEOUT) if wait else _hash_slots.acquire(blocking=False)
+    if not acquired:
+        raise AuthBusyError(BUSY_MESSAGE)
+    try:
+        fut = _hash_pool.submit(fn, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    fut.add_done_callback(lambda _: _hash_slots.release())
+    return fut
+
+def _secret(password: str) -> bytes:
+    # bcrypt only reads 72 bytes; passlib truncated the same way, so older hashes still match
+    return password.encode("utf-8")[:72]
+
+def _hash(password: str) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(_secret(password), password_hash.encode())
+    except ValueError:
+        return False
+
+def hash_password(password: str) -> str:
+    return _submit(_hash, password).result()
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return _submit(_verify, password, password_hash).result()
+
+async def ahash_password(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password, wait=False))
+
+async def averify_password(password: str, password_hash: str) -> bool:
+    return await asyncio.wrap_future(_submit(_verify, password, password_hash, wait=False))
+
 # ---------- helpers ----------
 def _user_row_to_dict(row) -> Dict[str, Any]:
     return {
-        "id": row["id"],
+        "id": str(row["id"]),  # uuid columns come back as UUID, which jwt.encode rejects
         "email": row["email"],
         "full_name": row.get("full_name"),
         "created_at": row.get("created_at"),
@@ -51,29 +108,26 @@ def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
         d["password_hash"] = res["password_hash"]
         return d
 
-def create_user(email: str, password: str, full_name: str = "") -> Tuple[bool, str]:
-    email = email.lower().strip()
-    if len(password) < 6:
-        return False, "Password must be at least 6 characters."
-    if get_user_by_email(email):
-        return False, "Email already registered."
+# One statement: the unique index on users.email decides, not a prior SELECT
+INSERT_USER_SQL = text("""
+    insert into public.users (email, password_hash, full_name)
+    values (:e, :ph, :n)
+    on conflict (email) do nothing
+    returning id
+""")
 
-    pwd_hash = bcrypt.hash(password)
+def _insert_user(email: str, pwd_hash: str, full_name: str) -> Tuple[bool, str]:
     with engine.begin() as cx:
-        cx.execute(
-            text("""
-                insert into public.users (email, password_hash, full_name)
-                values (:e, :ph, :n)
-            """),
-            {"e": email, "ph": pwd_hash, "n": full_name},
-        )
+        row = cx.execute(INSERT_USER_SQL, {"e": email, "ph": pwd_hash, "n": full_name}).first()
+    if row is None:
+        return False, "Email already registered."
     return True, "Signup successful."
 
-def verify_password(password: str, password_hash: str) -> bool:
-    try:
-        return bcrypt.verify(password, password_hash)
-    except Exception:
-        return False
+def create_user(email: str, password: str, full_name: str = "") -> Tuple[bool, str]:
+    email = email.lower().strip()
+    if len(password) < 6:
+        return False, "Password must be at least 6 characters."
+    return _insert_user(email, hash_password(password), full_name)
 
 # ---------- tokens (optional) ----------
 def make_token(user_id: str, email: str) -> str:
@@ -92,18 +146,51 @@ def signup_email_password(email: str, password: str, full_name: str = "") -> Tup
     try:
         ok, msg = create_user(email, password, full_name)
         return ok, msg
+    except AuthBusyError as e:
+        return False, str(e)
     except Exception as e:
         return False, f"Signup error: {e}"
 
-def login_email_password(email: str, password: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
-    user = get_user_by_email(email)
-    if not user:
-        return False, "User not found.", None
-    if not verify_password(password, user["password_hash"]):
-        return False, "Invalid credentials.", None
+def _login_result(user: Dict[str, Any]) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
     user_public = {k: v for k, v in user.items() if k != "password_hash"}
     # token is optional; UIs may just stash user_public in session
     token = make_token(user_public["id"], user_public["email"])
     user_public["token"] = token
     return True, "Login successful.", user_public
+
+def login_email_password(email: str, password: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    user = get_user_by_email(email)
+    if not user:
+        return False, "User not found.", None
+    try:
+        if not verify_password(password, user["password_hash"]):
+            return False, "Invalid credentials.", None
+    except AuthBusyError as e:
+        return False, str(e), None
+    return _login_result(user)
+
+# Same as above for asyncio callers (Chainlit): database calls run in a thread
+# and hashing on the pool, so the event loop keeps serving chat traffic.
+async def asignup_email_password(email: str, password: str, full_name: str = "") -> Tuple[bool, str]:
+    email = email.lower().strip()
+    if len(password) < 6:
+        return False, "Password must be at least 6 characters."
+    try:
+        pwd_hash = await ahash_password(password)
+        return await asyncio.to_thread(_insert_user, email, pwd_hash, full_name)
+    except AuthBusyError as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Signup error: {e}"
+
+async def alogin_email_password(email: str, password: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    user = await asyncio.to_thread(get_user_by_email, email)
+    if not user:
+        return False, "User not found.", None
+    try:
+        if not await averify_password(password, user["password_hash"]):
+            return False, "Invalid credentials.", None
+    except AuthBusyError as e:
+        return False, str(e), None
+    return _login_result(user)
     
\ No newline at end of file
@@ -0,0 +1,231 @@
+"""
+Signed-in sessions checked locally instead of through the Supabase auth API.
+
+An AuthSession holds one user's access and refresh tokens. Its user() check
+verifies the access token against the project's JWT secret (HS256,
+SUPABASE_JWT_SECRET) or its published signing keys (JWKS, fetched once and
+cached). The decoded claims are cached until the token expires, so a
+message or rerun costs a dict lookup rather than a request.
+
+A single background thread refreshes each live session REFRESH_MARGIN
+seconds before its token expires. If that fails, user() refreshes inline
+once the token has actually expired. Sign-in happens on a one-off client
+(auth_service.login_email_password), so the shared Supabase client never
+holds, or refreshes, a session an AuthSession owns, and sign-out goes
+through the AuthSession's current token (logout(token)).
+"""
+
+from __future__ import annotations
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+
+from .auth_service import adopt_session
+from .supabase_client import SUPABASE_ANON_KEY, SUPABASE_URL
+from .supabase_user_client import discard_user_client
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (
+    f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+)
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWT_LEEWAY_SECONDS = int(os.getenv("SUPABASE_JWT_LEEWAY_SECONDS", "10"))
+JWKS_CACHE_SECONDS = int(os.getenv("SUPABASE_JWKS_CACHE_SECONDS", "600"))
+REFRESH_MARGIN = int(os.getenv("AUTH_REFRESH_MARGIN_SECONDS", "120"))
+CLAIMS_CACHE_MAX = int(os.getenv("AUTH_CLAIMS_CACHE_MAX", "2048"))
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256", "EdDSA")
+
+# --------------------------- Verification ---------------------------
+
+_claims: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_claims_lock = threading.Lock()
+_jwks: Optional[jwt.PyJWKClient] = None
+
+
+def _jwks_client() -> jwt.PyJWKClient:
+    global _jwks
+    if _jwks is None:
+        if not SUPABASE_JWKS_URL:
+            raise RuntimeError("SUPABASE_URL or SUPABASE_JWKS_URL is required for JWKS verification")
+        _jwks = jwt.PyJWKClient(
+            SUPABASE_JWKS_URL,
+            cache_keys=True,
+            lifespan=JWKS_CACHE_SECONDS,
+            headers={"apikey": SUPABASE_ANON_KEY or ""},
+            timeout=5,
+        )
+    return _jwks
+
+
+def _decode(token: str) -> Dict[str, Any]:
+    alg = jwt.get_unverified_header(token).get("alg")
+    if alg == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            raise jwt.InvalidKeyError("HS256 token but SUPABASE_JWT_SECRET is not set")
+        key = SUPABASE_JWT_SECRET
+    elif alg in ASYMMETRIC_ALGORITHMS:
+        key = _jwks_client().get_signing_key_from_jwt(token).key
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported JWT algorithm {alg!r}")
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[alg],
+        audience=JWT_AUDIENCE,
+        leeway=JWT_LEEWAY_SECONDS,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def verify_access_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Verified claims of a Supabase access token, or None if invalid or expired."""
+    if not token:
+        return None
+    now = time.time()
+    with _claims_lock:
+        claims = _claims.get(token)
+        if claims is not None:
+            if claims["exp"] + JWT_LEEWAY_SECONDS > now:
+                _claims.move_to_end(token)
+                return claims
+            del _claims[token]
+    try:
+        claims = _decode(token)
+    except (jwt.PyJWTError, RuntimeError) as e:
+        logger.debug("access token rejected: %s", e)
+        return None
+    with _claims_lock:
+        _claims[token] = claims
+        while len(_claims) > CLAIMS_CACHE_MAX:
+            _claims.popitem(last=False)
+    return claims
+
+# --------------------------- Sessions ---------------------------
+
+class AuthSession:
+    """One signed-in user's tokens; keep it in the UI's per-user session state."""
+
+    def __init__(self, access_token: str, refresh_token: Optional[str], claims: Dict[str, Any]):
+        self._lock = threading.Lock()
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.claims = claims
+        self.closed = False
+
+    @property
+    def expires_at(self) -> float:
+        return float(self.claims["exp"])
+
+    def user(self) -> Optional[Dict[str, Any]]:
+        """The signed-in user, or None once the session can no longer be renewed."""
+        if self.closed:
+            return None
+        # self.claims were verified when the token was issued to this session
+        if self.expires_at <= time.time() and not self.refresh():
+            self.close()  # signed out; don't retry on every call
+            return None
+        return {"id": self.claims["sub"], "email": self.claims.get("email")}
+
+    def refresh(self) -> bool:
+        """Exchange the refresh token for a new pair (Supabase rotates both)."""
+        with self._lock:
+            if self.closed or not self.refresh_token:
+                return False
+            if self.expires_at - time.time() > REFRESH_MARGIN:
+                return True  # another caller got here first
+            try:
+                res = httpx.post(
+                    f"{SUPABASE_URL.rstrip('/')}/auth/v1/token",
+                    params={"grant_type": "refresh_token"},
+                    json={"refresh_token": self.refresh_token},
+                    headers={"apikey": SUPABASE_ANON_KEY, "Authorization": f"Bearer {SUPABASE_ANON_KEY}"},
+                    timeout=10,
+                )
+                res.raise_for_status()
+                body = res.json()
+            except Exception as e:
+                logger.warning("token refresh failed: %s", e)
+                return False
+            claims = verify_access_token(body.get("access_token"))
+            if claims is None:
+                logger.warning("refreshed access token failed verification")
+                return False
+            old_token = self.access_token
+            self.access_token, self.claims = body["access_token"], claims
+            self.refresh_token = body.get("refresh_token") or self.refresh_token
+        discard_user_client(old_token)
+        _refresher.schedule(self)
+        return True
+
+    def close(self):
+        self.closed = True
+        discard_user_client(self.access_token)
+
+
+class _Refresher:
+    """Daemon thread renewing sessions REFRESH_MARGIN seconds before expiry."""
+
+    def __init__(self):
+        self._heap: list = []  # (due, seq, weakref to AuthSession)
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, session: AuthSession, due: Optional[float] = None):
+        due = due if due is not None else session.expires_at - REFRESH_MARGIN
+        with self._cv:
+            heapq.heappush(self._heap, (due, next(self._seq), weakref.ref(session)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="auth-refresh", daemon=True)
+                self._thread.start()
+            self._cv.notify()
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cv.wait(timeout=self._heap[0][0] - time.time() if self._heap else None)
+                due, _, ref = heapq.heappop(self._heap)
+            session = ref()
+            if session is None or session.closed:
+                continue
+            if session.expires_at - REFRESH_MARGIN > due + 1:
+                continue  # refreshed inline since; that refresh scheduled the next one
+            if not session.refresh() and session.expires_at > time.time():
+                # Retry until the token runs out; user() then tries once more inline
+                self.schedule(session, time.time() + min(30, max(1, (session.expires_at - time.time()) / 2)))
+
+
+_refresher = _Refresher()
+
+
+def start_session(session: Any) -> Optional[AuthSession]:
+    """
+    AuthSession for the session returned by sign-in (needs .access_token and
+    .refresh_token), or None if its token cannot be verified locally, in
+    which case the shared client takes the session and callers keep using
+    auth_service.current_user().
+    """
+    token = getattr(session, "access_token", None)
+    claims = verify_access_token(token)
+    if claims is None:
+        if token:
+            logger.warning("access token could not be verified locally; set SUPABASE_JWT_SECRET "
+                           "or check SUPABASE_JWKS_URL")
+            adopt_session(session)
+        return None
+    auth = AuthSession(token, getattr(session, "refresh_token", None), claims)
+    _refresher.schedule(auth)
+    return auth
@@ -3,9 +3,9 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 try:
-    from supabase import create_client, Client
+    from supabase import create_client, Client, ClientOptions
 except Exception:
-    create_client, Client = None, object
+    create_client, Client, ClientOptions = None, object, None
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 load_dotenv(PROJECT_ROOT / ".env")
@@ -25,3 +25,15 @@ def supabase() -> "Client":
         raise RuntimeError("supabase-py not installed. Add `supabase>=2.4.0`.")
     _sb = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
     return _sb
+
+def sign_in_client() -> "Client":
+    """
+    One-off client for a single sign-in: it neither keeps the session nor
+    refreshes it, so the session stays with whoever the caller hands it to.
+    """
+    if not (SUPABASE_URL and SUPABASE_ANON_KEY):
+        raise RuntimeError("Supabase not configured: set SUPABASE_URL and SUPABASE_ANON_KEY in .env")
+    if create_client is None:
+        raise RuntimeError("supabase-py not installed. Add `supabase>=2.4.0`.")
+    options = ClientOptions(auto_refresh_token=False, persist_session=False)
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY, options=options)
@@ -1,15 +1,33 @@
 # src/auth/supabase_user_client.py
 from __future__ import annotations
+import base64
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from postgrest import SyncPostgrestClient
 from supabase import create_client, Client
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY")
 
+USER_CLIENTS_MAX = int(os.getenv("SUPABASE_USER_CLIENTS_MAX", "512"))
+USER_CLIENT_TTL = float(os.getenv("SUPABASE_USER_CLIENT_TTL", "3600"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_HTTP_TIMEOUT_SECONDS", "30"))
+
 def make_user_client(access_token: str) -> Client:
     """
     Build a Supabase client authenticated AS THE USER (with their JWT).
     Required for Postgres RLS policies to allow per-user reads/writes.
+
+    Each call opens its own connection pool; for database access prefer
+    pooled_user_client(), which reuses one.
     """
     if not SUPABASE_URL or not SUPABASE_ANON_KEY:
         raise RuntimeError("Missing SUPABASE_URL / SUPABASE_ANON_KEY in environment.")
@@ -17,3 +35,176 @@ def make_user_client(access_token: str) -> Client:
     # Attach user JWT so PostgREST sees auth.uid()
     c.postgrest.auth(access_token)
     return c
+
+def _claims(access_token: str) -> dict:
+    payload = access_token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+def token_expiry(access_token: str) -> Optional[float]:
+    """`exp` claim of a JWT, unverified (PostgREST verifies it); None if unreadable."""
+    try:
+        return float(_claims(access_token)["exp"])
+    except Exception:
+        return None
+
+
+def verified_subject(access_token: str) -> Optional[str]:
+    """`sub` claim (the user id) of a JWT whose signature checks out locally; None otherwise."""
+    from .session import verify_access_token  # session imports this module
+    claims = verify_access_token(access_token)
+    return str(claims["sub"]) if claims else None
+
+
+class UserClient:
+    """
+    Database-only Supabase client for one user's JWT: `table`, `from_`,
+    `rpc` and `postgrest`, which is all chat_history needs. Requests go out
+    on the pool's shared keep-alive connections.
+    """
+
+    def __init__(self, postgrest: SyncPostgrestClient, access_token: str):
+        self.postgrest = postgrest
+        self.access_token = access_token
+        # Keys this user's history_cache entries, so only a verified token gets one:
+        # a forged token naming someone else's `sub` must not read their cached rows
+        self.user_id = verified_subject(access_token)
+
+    def table(self, table_name: str):
+        return self.postgrest.from_(table_name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[dict] = None, **kwargs):
+        return self.postgrest.rpc(fn, params or {}, **kwargs)
+
+
+class UserClientPool:
+    """
+    Per-token UserClient views over one shared httpx connection pool.
+    Views are keyed on the whole token, never on a claim read from it.
+
+    Each view is a small httpx.Client carrying the user's headers on top of
+    one shared HTTPTransport, which is where httpx keeps its keep-alive
+    connections. Building a view therefore opens no sockets. Views are
+    cached until the token expires (or `ttl` seconds, whichever is sooner),
+    and the least recently used is dropped beyond `max_clients`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        anon_key: Optional[str] = None,
+        max_clients: int = USER_CLIENTS_MAX,
+        ttl: float = USER_CLIENT_TTL,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.url = (url or SUPABASE_URL or "").rstrip("/")
+        self.anon_key = anon_key or SUPABASE_ANON_KEY
+        if not self.url or not self.anon_key:
+            raise RuntimeError("Missing SUPABASE_URL / SUPABASE_ANON_KEY in environment.")
+        self.max_clients = max_clients
+        self.ttl = ttl
+        self.rest_url = f"{self.url}/rest/v1"
+        self.transport = transport or httpx.HTTPTransport(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        self._clients: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expires_at, UserClient)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, access_token: str) -> UserClient:
+        now = time.time()
+        with self._lock:
+            entry = self._clients.get(access_token)
+            if entry and entry[0] > now:
+                self._clients.move_to_end(access_token)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+            client = self._build(access_token)
+            exp = token_expiry(access_token)
+            self._clients[access_token] = (min(now + self.ttl, exp or float("inf")), client)
+            self._clients.move_to_end(access_token)
+            self._evict(now)
+            return client
+
+    def _build(self, access_token: str) -> UserClient:
+        headers = {
+            "apiKey": self.anon_key,
+            "Authorization": f"Bearer {access_token}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        session = httpx.Client(
+            base_url=self.rest_url,
+            headers=headers,
+            transport=self.transport,
+            timeout=HTTP_TIMEOUT_SECONDS,
+            follow_redirects=True,
+        )
+        try:
+            postgrest = SyncPostgrestClient(self.rest_url, headers=headers, http_client=session)
+        except TypeError:
+            # postgrest-py < 0.17 has no http_client argument: swap in our session
+            postgrest = SyncPostgrestClient(self.rest_url, headers=headers)
+            postgrest.session.close()
+            postgrest.session = session
+        return UserClient(postgrest, access_token)
+
+    def _evict(self, now: float):
+        """Drop expired views, then the least recently used beyond max_clients (lock held)."""
+        before = len(self._clients)
+        for token in [t for t, (expires_at, _) in self._clients.items() if expires_at <= now]:
+            del self._clients[token]
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+        self.stats["evictions"] += before - len(self._clients)
+
+    def discard(self, access_token: str):
+        """Forget a token, e.g. on sign-out."""
+        with self._lock:
+            self._clients.pop(access_token, None)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+        self.transport.close()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+_pool: Optional[UserClientPool] = None
+_pool_lock = threading.Lock()
+
+def user_client_pool() -> UserClientPool:
+    """Process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = UserClientPool()
+    return _pool
+
+def pooled_user_client(access_token: str) -> UserClient:
+    """Cached UserClient for this JWT on the shared connection pool (RLS applies)."""
+    return user_client_pool().get(access_token)
+
+def discard_user_client(access_token: Optional[str]):
+    """Drop a signed-out token's view; no-op if the pool was never used."""
+    if _pool is not None and access_token:
+        _pool.discard(access_token)
@@ -0,0 +1,213 @@
+# 📁 File: src/benchmarks/auth_bench.py
+# Login throughput and event-loop lag for auth_service_pg against a local Postgres
+
+"""
+Seeds --users accounts in public.users of a local Postgres (creating the
+table if it does not exist), then runs --logins logins from --concurrency
+asyncio tasks three ways:
+
+    inline     verify on the event loop (a sync login called from async code)
+    to-thread  the sync login in asyncio.to_thread: hashing on as many
+               threads as there are callers
+    pooled     alogin_email_password: hashing on the bounded auth pool
+
+A heartbeat coroutine sleeps 10 ms in a loop alongside and records how late
+it wakes up. That lag is what chat messages on the same process would
+see. It also compares signup done as a SELECT then INSERT with the new
+single INSERT ... ON CONFLICT, including concurrent signups for one email.
+
+    python -m src.benchmarks.auth_bench --dsn postgresql://postgres@localhost/postgres
+    python -m src.benchmarks.auth_bench --rounds 12 --concurrency 32 --logins 200
+
+Bench accounts use @legabot-bench.invalid addresses and are deleted at the end.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.benchmarks.common import latency_summary, write_result
+
+EMAIL_DOMAIN = "legabot-bench.invalid"
+PASSWORD = "correct horse battery"
+
+USERS_SQL = """
+    create table if not exists public.users (
+        id uuid primary key default gen_random_uuid(),
+        email text not null unique,
+        password_hash text not null,
+        full_name text,
+        created_at timestamptz not null default now(),
+        updated_at timestamptz not null default now()
+    )
+"""
+
+
+def email(n: int) -> str:
+    return f"user{n}@{EMAIL_DOMAIN}"
+
+
+def legacy_create_user(auth, address: str, password: str) -> bool:
+    """The previous signup: SELECT for the email, then INSERT."""
+    if auth.get_user_by_email(address):
+        return False
+    pwd_hash = auth.hash_password(password)
+    with auth.engine.begin() as cx:
+        cx.execute(auth.text("insert into public.users (email, password_hash, full_name) values (:e, :ph, '')"),
+                   {"e": address, "ph": pwd_hash})
+    return True
+
+
+async def heartbeat(stop: asyncio.Event, lags: List[float], interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_logins(name: str, login, users: int, logins: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    lags: List[float] = []
+    outcomes = {"ok": 0, "busy": 0, "failed": 0}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i % users)
+
+    async def worker():
+        while not queue.empty():
+            n = queue.get_nowait()
+            start = time.perf_counter()
+            ok, msg, _ = await login(email(n), PASSWORD)
+            latencies.append(time.perf_counter() - start)
+            outcomes["ok" if ok else "busy" if "try again" in msg else "failed"] += 1
+
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await beat
+    result = {
+        **outcomes,
+        "logins_per_s": round(logins / wall, 1),
+        "latency": latency_summary(latencies),
+        "loop_lag": latency_summary(lags or [0.0]),
+    }
+    print(f"   {name:<10} {result['logins_per_s']:>6.1f} logins/s  login p50 {result['latency']['p50_ms']:.0f} ms  "
+          f"loop lag p99 {result['loop_lag']['p99_ms']:.0f} ms  busy {outcomes['busy']}")
+    return result
+
+
+def measure_signup(auth, count: int, offset: int) -> Dict:
+    results = {}
+    for name, create in (
+        ("select+insert", lambda address: legacy_create_user(auth, address, PASSWORD)),
+        ("on-conflict", lambda address: auth.create_user(address, PASSWORD)[0]),
+    ):
+        latencies = []
+        for i in range(count):
+            address = email(offset + i)
+            start = time.perf_counter()
+            create(address)
+            latencies.append(time.perf_counter() - start)
+        offset += count
+        # Concurrent signups racing for one address: exactly one should win
+        racers = 8
+        address = email(offset)
+        offset += 1
+        with ThreadPoolExecutor(max_workers=racers) as pool:
+            outcomes = list(pool.map(lambda _: _try(create, address), range(racers)))
+        results[name] = {
+            "latency": latency_summary(latencies),
+            "race": {"created": outcomes.count(True), "rejected": outcomes.count(False),
+                     "errors": len([o for o in outcomes if isinstance(o, str)])},
+        }
+        print(f"   {name:<14} p50 {results[name]['latency']['p50_ms']:.0f} ms  race {results[name]['race']}")
+    return results
+
+
+def _try(create, address: str):
+    try:
+        return create(address)
+    except Exception as e:
+        return type(e).__name__
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="auth_service_pg login throughput benchmark (local Postgres)")
+    p.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="defaults to DATABASE_URL")
+    p.add_argument("--rounds", type=int, default=10, help="bcrypt cost (production default is 12)")
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--logins", type=int, default=60)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--signups", type=int, default=10)
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.dsn:
+        raise SystemExit("Set --dsn or DATABASE_URL to a local Postgres")
+    os.environ["DATABASE_URL"] = args.dsn
+    os.environ["AUTH_BCRYPT_ROUNDS"] = str(args.rounds)
+    from src.auth import auth_service_pg as auth
+
+    with auth.engine.begin() as cx:
+        cx.execute(auth.text(USERS_SQL))
+        cx.execute(auth.text("delete from public.users where email like :d"), {"d": f"%@{EMAIL_DOMAIN}"})
+    print(f"👤 Seeding {args.users} users (bcrypt cost {args.rounds}, {auth.HASH_WORKERS} hash workers)")
+    for n in range(args.users):
+        auth.create_user(email(n), PASSWORD)
+
+    async def inline(address, password):
+        return _inline_login(auth, address, password)
+
+    async def to_thread(address, password):
+        return await asyncio.to_thread(_inline_login, auth, address, password)
+
+    async def logins():
+        print(f"🔐 {args.logins} logins from {args.concurrency} concurrent tasks")
+        return {
+            "inline": await run_logins("inline", inline, args.users, args.logins, args.concurrency),
+            "to-thread": await run_logins("to-thread", to_thread, args.users, args.logins, args.concurrency),
+            "pooled": await run_logins("pooled", auth.alogin_email_password, args.users, args.logins, args.concurrency),
+        }
+
+    try:
+        login_results = asyncio.run(logins())
+        print(f"📝 {args.signups} signups each way")
+        signup_results = measure_signup(auth, args.signups, args.users)
+    finally:
+        with auth.engine.begin() as cx:
+            cx.execute(auth.text("delete from public.users where email like :d"), {"d": f"%@{EMAIL_DOMAIN}"})
+
+    write_result("auth", {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "dsn"},
+        "hash_workers": auth.HASH_WORKERS,
+        "hash_queue": auth.HASH_QUEUE,
+        "logins": login_results,
+        "signup": signup_results,
+    }, args.out)
+
+
+def _inline_login(auth, address: str, password: str):
+    """The previous login: lookup and bcrypt on the calling thread."""
+    user = auth.get_user_by_email(address)
+    if not user or not auth._verify(password, user["password_hash"]):
+        return False, "Invalid credentials.", None
+    return True, "Login successful.", user
+
+
+if __name__ == "__main__":
+    main()
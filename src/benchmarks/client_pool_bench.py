@@ -0,0 +1,161 @@
+# 📁 File: src/benchmarks/client_pool_bench.py
+# User-scoped Supabase client setup cost: per call vs per session vs pooled
+
+"""
+Runs --users concurrent users, each making --calls chat-history reads
+(get_conversation_page) against a local stub of PostgREST, with three ways
+of getting the user's client:
+
+    per-call     make_user_client(token) before every call
+    per-session  one make_user_client per user, kept for the session
+                 (what the UIs did before the pool)
+    pooled       pooled views from UserClientPool on one shared httpx pool
+
+The stub speaks HTTP/1.1 keep-alive and counts accepted TCP connections;
+each new connection sleeps --connect-ms first, which stands in for the TCP
+and TLS handshakes a hosted project costs, and each request --rtt-ms.
+
+    python -m src.benchmarks.client_pool_bench
+    python -m src.benchmarks.client_pool_bench --users 50 --calls 20 --connect-ms 60 --rtt-ms 25
+"""
+
+import argparse
+import base64
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.auth import supabase_user_client
+from src.auth.supabase_user_client import UserClientPool, make_user_client
+from src.benchmarks.common import latency_summary, write_result
+from src.db.chat_history import get_conversation_page
+
+ANON_KEY = "bench-anon-key"
+
+
+class _StubPostgREST(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connect_s = 0.0
+    rtt_s = 0.0
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).connections += 1
+        time.sleep(self.connect_s)
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with self.lock:
+            type(self).requests += 1
+        time.sleep(self.rtt_s)
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_jwt(user: int, ttl: int = 3600) -> str:
+    def b64(obj) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    claims = {"sub": f"00000000-0000-0000-0000-{user:012d}", "exp": int(time.time()) + ttl, "role": "authenticated"}
+    return f"{b64({'alg': 'HS256', 'typ': 'JWT'})}.{b64(claims)}.signature"
+
+
+def run_mode(name: str, get_client: Callable[[str, Dict], object], users: int, calls: int) -> Dict:
+    _StubPostgREST.connections = _StubPostgREST.requests = 0
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def user_session(u: int):
+        token, session = fake_jwt(u), {}
+        mine = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            sb = get_client(token, session)
+            get_conversation_page(sb, "00000000-0000-0000-0000-000000000000", 30)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user_session, range(users)))
+    wall = time.perf_counter() - start
+    result = {
+        "connections": _StubPostgREST.connections,
+        "requests": _StubPostgREST.requests,
+        "wall_s": round(wall, 3),
+        "calls_per_s": round(users * calls / wall, 1),
+        "latency": latency_summary(latencies),
+    }
+    print(f"   {name:<12} {result['connections']:>5} connections  "
+          f"p50 {result['latency']['p50_ms']:.1f} ms  {result['calls_per_s']:.0f} calls/s")
+    return result
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="User-scoped Supabase client pooling benchmark")
+    p.add_argument("--users", type=int, default=20, help="concurrent users (threads)")
+    p.add_argument("--calls", type=int, default=10, help="chat-history reads per user")
+    p.add_argument("--connect-ms", type=float, default=40.0, help="simulated TCP+TLS setup per new connection")
+    p.add_argument("--rtt-ms", type=float, default=10.0, help="simulated PostgREST round trip")
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _StubPostgREST.connect_s = args.connect_ms / 1000
+    _StubPostgREST.rtt_s = args.rtt_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubPostgREST)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    supabase_user_client.SUPABASE_URL, supabase_user_client.SUPABASE_ANON_KEY = url, ANON_KEY
+
+    def per_session(token, session):
+        if "sb" not in session:
+            session["sb"] = make_user_client(token)
+        return session["sb"]
+
+    pool = UserClientPool(url, ANON_KEY)
+    print(f"👥 {args.users} users × {args.calls} calls")
+    results = {
+        "per-call": run_mode("per-call", lambda token, _: make_user_client(token), args.users, args.calls),
+        "per-session": run_mode("per-session", per_session, args.users, args.calls),
+        "pooled": run_mode("pooled", lambda token, _: pool.get(token), args.users, args.calls),
+    }
+    results["pooled"]["pool"] = {**pool.stats, "views": len(pool)}
+    pool.close()
+    server.shutdown()
+
+    write_result("client_pool", {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "runs": results,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Offline stand-ins for the remote services used by the RAG pipeline.
+
+- FakeEmbedder: deterministic query vectors with the SentenceTransformer
+  `encode` signature, drawn near real corpus vectors so scores look realistic
+- FakeVectorIndex: Pinecone-style `query` over the local embeddings with
+  configurable latency, jitter and error rate
+- FakeChatModel: `invoke` / `stream` with configurable time-to-first-token,
+  token rate and error rate; honours the `timeout` keyword like ChatOpenAI
+- FakeSupabase: in-memory tables behind the supabase-py query builder
+  (`table(...).select().eq().order().limit().execute()`, `rpc(...)`), with a
+  fixed round-trip latency per `execute()` and a round-trip counter
+
+They let the load-test harness drive `get_legal_answer` end to end on one
+box without spending OpenAI or Pinecone credits.
+"""
+
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from src.retrieval.local_index import LocalIndex
+
+_WORDS = (
+    "Section", "IPC", "the", "accused", "punishment", "shall", "be", "liable",
+    "imprisonment", "fine", "court", "offence", "under", "provided", "that",
+)
+
+
+class FakeEmbedder:
+    def __init__(self, corpus: Optional[np.ndarray] = None, dim: int = 384,
+                 noise: float = 0.35, ms_per_text: float = 2.0):
+        self.corpus = corpus
+        self.dim = corpus.shape[1] if corpus is not None else dim
+        self.noise = noise
+        self.ms_per_text = ms_per_text
+
+    def _vector(self, text: str) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vec = rng.normal(size=self.dim).astype(np.float32) * self.noise
+        if self.corpus is not None:
+            vec += self.corpus[rng.integers(len(self.corpus))]
+        return vec
+
+    def encode(self, texts, normalize_embeddings: bool = False, batch_size: int = 32, **_) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if self.ms_per_text:
+            time.sleep(self.ms_per_text * len(texts) / 1000)
+        vecs = np.stack([self._vector(t) for t in texts])
+        if normalize_embeddings:
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return vecs
+
+
+class FakeVectorIndex:
+    def __init__(self, local: LocalIndex, latency_ms: float = 40.0,
+                 jitter_ms: float = 20.0, error_rate: float = 0.0):
+        self.local = local
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def query(self, vector: Sequence[float], top_k: int = 5, include_metadata: bool = True, **_):
+        with self._lock:
+            self.calls += 1
+        # Exponential jitter gives the long tail hedging is meant to cut
+        time.sleep((self.latency_ms + random.expovariate(1 / self.jitter_ms if self.jitter_ms else 1e9)) / 1000)
+        if random.random() < self.error_rate:
+            raise ConnectionError("fake vector service: injected failure")
+        return self.local.query(vector, top_k=top_k)
+
+
+class _Chunk:
+    __slots__ = ("content",)
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    def __init__(self, ttft_ms: float = 300.0, tokens_per_second: float = 60.0,
+                 answer_tokens: int = 150, error_rate: float = 0.0):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, **_) -> Iterator[_Chunk]:
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        if random.random() < self.error_rate:
+            raise ConnectionError("fake chat model: injected failure")
+        time.sleep(self.ttft_ms / 1000)
+        step = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for i in range(self.answer_tokens):
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise TimeoutError("fake chat model: request timed out")
+            if i and step:
+                time.sleep(step)
+            yield _Chunk(random.choice(_WORDS) + " ")
+
+    def invoke(self, prompt: str, **kwargs) -> _Chunk:
+        return _Chunk("".join(c.content for c in self.stream(prompt, **kwargs)))
+
+
+# --------------------------- Supabase / PostgREST ---------------------------
+
+class _Response:
+    __slots__ = ("data", "count")
+
+    def __init__(self, data: List[Dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    """Just enough of postgrest's request builder for src/db."""
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns: Optional[List[str]] = None
+        self.count: Optional[str] = None
+        self.payload: Any = None
+        self.filters: List[Callable[[Dict], bool]] = []
+        self.orders: List[tuple] = []
+        self.row_limit: Optional[int] = None
+        self.row_offset = 0
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "_Query":
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        return self
+
+    def insert(self, rows) -> "_Query":
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False, **_) -> "_Query":
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.conflict_key, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, values: Dict) -> "_Query":
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self) -> "_Query":
+        self.op = "delete"
+        return self
+
+    def _filter(self, column: str, test: Callable[[Any], bool]) -> "_Query":
+        self.filters.append(lambda row: row.get(column) is not None and test(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: v != value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v < value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v <= value)
+
+    def gt(self, column, value):
+        return self._filter(column, lambda v: v > value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v >= value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(column, lambda v: v in values)
+
+    _OPS = {
+        "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+        "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+    }
+
+    def or_(self, filters: str) -> "_Query":
+        """PostgREST `or=(a.lt.1,b.eq."x")`: flat comma-separated conditions only."""
+        conditions, part, quoted = [], "", False
+        for ch in filters + ",":
+            if ch == '"':
+                quoted = not quoted
+            elif ch == "," and not quoted:
+                column, op, value = part.split(".", 2)
+                conditions.append((column, self._OPS[op], value))
+                part = ""
+                continue
+            part += ch
+        self.filters.append(lambda row: any(
+            row.get(c) is not None and test(str(row.get(c)), v.strip('"')) for c, test, v in conditions
+        ))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "_Query":
+        self.row_limit = n
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self.row_offset, self.row_limit = start, end - start + 1
+        return self
+
+    def execute(self) -> _Response:
+        return self.client._execute(self)
+
+
+class FakeSupabase:
+    """In-memory conversations/messages with the triggers from migrations/."""
+
+    def __init__(self, rtt_ms: float = 25.0, jitter_ms: float = 0.0):
+        self.rtt_ms = rtt_ms
+        self.jitter_ms = jitter_ms
+        self.tables: Dict[str, List[Dict]] = {"conversations": [], "messages": []}
+        self.functions: Dict[str, Callable[..., List[Dict]]] = {
+            "list_user_conversations": self._list_user_conversations,
+        }
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        self.tables.setdefault(name, [])
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None):
+        if name not in self.functions:
+            raise LookupError(f"fake postgrest: function {name} not found")
+        client = self
+
+        class _Call:
+            def execute(self):
+                client._round_trip()
+                with client._lock:
+                    return _Response(client.functions[name](**(params or {})))
+        return _Call()
+
+    def reset_counters(self):
+        self.round_trips = 0
+
+    # ---- internals ----
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        delay = self.rtt_ms + (random.expovariate(1 / self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def _execute(self, q: _Query) -> _Response:
+        self._round_trip()
+        with self._lock:
+            rows = self.tables[q.table]
+            if q.op == "insert":
+                rows.extend(dict(r) for r in q.payload)
+                self._after_insert(q.table, q.payload)
+                return _Response([dict(r) for r in q.payload])
+            if q.op == "upsert":
+                existing = {r.get(q.conflict_key): r for r in rows}
+                inserted = []
+                for r in q.payload:
+                    current = existing.get(r.get(q.conflict_key))
+                    if current is None:
+                        inserted.append(dict(r))
+                    elif not q.ignore_duplicates:
+                        current.update(r)
+                rows.extend(inserted)
+                self._after_insert(q.table, inserted)
+                return _Response([dict(r) for r in inserted])
+            matched = [r for r in rows if all(f(r) for f in q.filters)]
+            if q.op == "update":
+                for r in matched:
+                    r.update(q.payload)
+                return _Response([dict(r) for r in matched])
+            if q.op == "delete":
+                ids = {id(r) for r in matched}
+                self.tables[q.table] = [r for r in rows if id(r) not in ids]
+                self._after_delete(q.table, matched)
+                return _Response([dict(r) for r in matched])
+            total = len(matched)
+            for column, desc in reversed(q.orders):
+                matched.sort(key=lambda r: r.get(column), reverse=desc)
+            end = None if q.row_limit is None else q.row_offset + q.row_limit
+            page = matched[q.row_offset:end]
+            if q.columns is not None:
+                page = [{c: r.get(c) for c in q.columns} for r in page]
+            else:
+                page = [dict(r) for r in page]
+            return _Response(page, total if q.count else None)
+
+    def _after_insert(self, table: str, rows: List[Dict]):
+        # trigger_update_conversation_timestamp (with the counters from conversation_counters.sql)
+        if table != "messages":
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        convs = {c["id"]: c for c in self.tables["conversations"]}
+        for m in rows:
+            conv = convs.get(m["conversation_id"])
+            if conv is None:
+                continue
+            conv["updated_at"] = now
+            conv["message_count"] = conv.get("message_count", 0) + 1
+            if conv.get("last_message_at") is None or m["created_at"] >= conv["last_message_at"]:
+                conv["last_message_at"] = m["created_at"]
+                conv["last_message_preview"] = m["content"][:200]
+
+    def _after_delete(self, table: str, rows: List[Dict]):
+        if table == "conversations" and rows:
+            # ON DELETE CASCADE from conversations to messages
+            gone = {r["id"] for r in rows}
+            self.tables["messages"] = [m for m in self.tables["messages"] if m["conversation_id"] not in gone]
+        elif table == "messages":
+            # trigger_update_conversation_counters_on_delete
+            convs = {c["id"]: c for c in self.tables["conversations"]}
+            for m in rows:
+                conv = convs.get(m["conversation_id"])
+                if conv is None:
+                    continue
+                conv["message_count"] = max(conv.get("message_count", 0) - 1, 0)
+                if conv.get("last_message_at") == m["created_at"]:
+                    rest = [x for x in self.tables["messages"] if x["conversation_id"] == conv["id"]]
+                    newest = max(rest, key=lambda x: x["created_at"]) if rest else None
+                    conv["last_message_at"] = newest["created_at"] if newest else None
+                    conv["last_message_preview"] = newest["content"][:200] if newest else None
+
+    def _list_user_conversations(self, p_user_id: str, p_limit: int = 20) -> List[Dict]:
+        convs = sorted(
+            (c for c in self.tables["conversations"] if c["user_id"] == p_user_id),
+            key=lambda c: c["updated_at"], reverse=True,
+        )[:p_limit]
+        return [
+            {
+                "id": c["id"], "title": c["title"],
+                "created_at": c["created_at"], "updated_at": c["updated_at"],
+                "message_count": c.get("message_count", 0),
+                "last_message": c.get("last_message_preview"),
+            }
+            for c in convs
+        ]
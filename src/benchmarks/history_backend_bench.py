@@ -0,0 +1,318 @@
+# 📁 File: src/benchmarks/history_backend_bench.py
+# Chat-history latency per operation: PostgREST (HTTP) vs asyncpg, on one local Postgres
+
+"""
+Seeds one bench user with --conversations conversations of --messages
+messages each in a local Postgres that has the chat-history migrations
+applied (public schema), then times each operation the UIs perform:
+
+    list     get_user_conversations (sidebar)
+    page     get_conversation_page, newest page
+    older    get_conversation_page, the page before it
+    turn     save_turn, one question/answer pair
+    search   search_messages
+
+three ways:
+
+    http      chat_history through the real postgrest client (pooled, as the
+              UIs use it) against a PostgREST stand-in on 127.0.0.1 that runs
+              the equivalent SQL over psycopg2 on the same database
+    pg-sync   chat_history_pg.sync (what the write-behind worker and
+              Streamlit call)
+    pg-async  the chat_history_pg coroutines awaited directly (Chainlit)
+
+and then --concurrency callers reading pages at once. The stand-in only
+covers the requests these operations make and skips PostgREST's role
+switch, so the http numbers are a floor; a hosted project adds its network
+round trip (--rtt-ms simulates one) on top.
+
+    python -m src.benchmarks.history_backend_bench --dsn postgresql://postgres@localhost/postgres
+    python -m src.benchmarks.history_backend_bench --repeats 200 --concurrency 32 --rtt-ms 20
+
+The bench user and everything it owns are deleted at the end.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import psycopg2
+from psycopg2.extras import Json, RealDictCursor
+
+from src.auth.supabase_user_client import UserClientPool
+from src.benchmarks.client_pool_bench import ANON_KEY
+from src.benchmarks.common import latency_summary, write_result
+from src.db import chat_history
+
+BENCH_USER = "00000000-0000-0000-0000-0000000b0048"
+OPERATIONS = ("list", "page", "older", "turn", "search")
+SEARCH_QUERY = "Section"
+
+SEED_SQL = """
+    WITH convs AS (
+        INSERT INTO conversations (id, user_id, title, created_at, updated_at)
+        SELECT gen_random_uuid(), %(user)s, 'Bench conversation ' || c,
+               NOW() - c * INTERVAL '1 hour', NOW() - c * INTERVAL '1 hour'
+        FROM generate_series(1, %(conversations)s) AS c
+        RETURNING id, created_at
+    )
+    INSERT INTO messages (conversation_id, user_id, role, content, metadata, created_at)
+    SELECT convs.id, %(user)s,
+           CASE WHEN m %% 2 = 1 THEN 'user' ELSE 'assistant' END,
+           CASE WHEN m %% 2 = 1 THEN 'What does Section ' || (300 + m) || ' of the IPC say?'
+                ELSE 'Section ' || (299 + m) || ' of the IPC deals with offences against the human body.' END,
+           '{}'::jsonb, convs.created_at + m * INTERVAL '1 second'
+    FROM convs, generate_series(1, %(messages)s) AS m
+"""
+
+# --------------------------- PostgREST stand-in ---------------------------
+
+_OPS = {"eq": "=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+_IDENT = re.compile(r"^[a-z_][a-z0-9_]*$")
+_OR_TERM = re.compile(r'(\w+)\.(eq|lt|lte|gt|gte)\.("[^"]*"|[^,)]+)')
+
+
+def _ident(name: str) -> str:
+    if not _IDENT.match(name):
+        raise ValueError(f"bad identifier {name!r}")
+    return name
+
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    return str(v)  # uuid
+
+
+class _PostgRESTStandIn(BaseHTTPRequestHandler):
+    """Translates the handful of PostgREST requests chat_history makes into SQL."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16  # headers and body in one segment; handle_one_request flushes
+    dsn = ""
+    rtt_s = 0.0
+    local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = psycopg2.connect(self.dsn)
+            conn.autocommit = True
+        return conn
+
+    def _send(self, status: int, body):
+        time.sleep(self.rtt_s)
+        data = json.dumps(body, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _run(self, sql: str, params) -> List[Dict]:
+        with self._conn().cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall() if cur.description else []
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        table = _ident(url.path.rsplit("/", 1)[-1])
+        columns, where, params, order, limit = "*", [], [], "", ""
+        for key, value in parse_qsl(url.query):
+            if key == "select":
+                columns = ", ".join(_ident(c) for c in value.split(","))
+            elif key == "order":
+                order = "ORDER BY " + ", ".join(
+                    f"{_ident(c.split('.')[0])} {'DESC' if '.desc' in c else 'ASC'}" for c in value.split(",")
+                )
+            elif key == "limit":
+                limit = f"LIMIT {int(value)}"
+            elif key == "or":
+                terms = [(c, _OPS[op], v.strip('"')) for c, op, v in _OR_TERM.findall(value)]
+                where.append("(" + " OR ".join(f"{_ident(c)} {op} %s" for c, op, _ in terms) + ")")
+                params += [v for _, _, v in terms]
+            else:
+                op, _, v = value.partition(".")
+                where.append(f"{_ident(key)} {_OPS[op]} %s")
+                params.append(v)
+        sql = f"SELECT {columns} FROM {table} {'WHERE ' + ' AND '.join(where) if where else ''} {order} {limit}"
+        self._send(200, self._run(sql, params))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+        parts = url.path.split("/")
+        if parts[-2] == "rpc":
+            args = ", ".join(f"{_ident(k)} => %s" for k in body)
+            self._send(200, self._run(f"SELECT * FROM {_ident(parts[-1])}({args})", list(body.values())))
+            return
+        rows = body if isinstance(body, list) else [body]
+        columns = [_ident(c) for c in rows[0]]
+        values = ", ".join("(" + ", ".join(["%s"] * len(columns)) + ")" for _ in rows)
+        params = [Json(r[c]) if isinstance(r[c], dict) else r[c] for r in rows for c in columns]
+        conflict = " ON CONFLICT DO NOTHING" if "ignore-duplicates" in (self.headers.get("Prefer") or "") else ""
+        sql = f"INSERT INTO {_ident(parts[-1])} ({', '.join(columns)}) VALUES {values}{conflict} RETURNING *"
+        self._send(201, self._run(sql, params))
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_token(user_id: str) -> str:
+    """Unsigned token with the claims the pool reads; the stand-in does not check it."""
+    def b64(obj) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    claims = {"sub": user_id, "exp": int(time.time()) + 3600, "role": "authenticated"}
+    return f"{b64({'alg': 'HS256', 'typ': 'JWT'})}.{b64(claims)}.signature"
+
+# --------------------------- Measurement ---------------------------
+
+def operations(api, client, conversation_id: str, older_cursor: str) -> Dict[str, Callable]:
+    return {
+        "list": lambda: api.get_user_conversations(client, BENCH_USER),
+        "page": lambda: api.get_conversation_page(client, conversation_id, 30),
+        "older": lambda: api.get_conversation_page(client, conversation_id, 30, before=older_cursor),
+        "turn": lambda: api.save_turn(client, conversation_id, BENCH_USER, "Bench question?", "Bench answer."),
+        "search": lambda: api.search_messages(client, BENCH_USER, SEARCH_QUERY, 10),
+    }
+
+
+def time_calls(call: Callable, repeats: int) -> List[float]:
+    call()  # warm: connection, prepared statement, pool view
+    out = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+async def atime_calls(call: Callable, repeats: int) -> List[float]:
+    await call()
+    out = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await call()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def concurrent_sync(call: Callable, concurrency: int, repeats: int) -> Dict:
+    def worker(_):
+        return time_calls(call, repeats)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [s for batch in pool.map(worker, range(concurrency)) for s in batch]
+    wall = time.perf_counter() - start
+    return {"calls_per_s": round(len(latencies) / wall, 1), "latency": latency_summary(latencies)}
+
+
+async def concurrent_async(call: Callable, concurrency: int, repeats: int) -> Dict:
+    start = time.perf_counter()
+    batches = await asyncio.gather(*(atime_calls(call, repeats) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies = [s for batch in batches for s in batch]
+    return {"calls_per_s": round(len(latencies) / wall, 1), "latency": latency_summary(latencies)}
+
+
+def report(mode: str, results: Dict):
+    cells = "  ".join(f"{op} {results[op]['p50_ms']:>6.2f}" for op in OPERATIONS)
+    print(f"   {mode:<9} p50 ms  {cells}  |  {results['concurrent']['calls_per_s']:>7.0f} pages/s")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Chat-history backend benchmark: PostgREST vs asyncpg (local Postgres)")
+    p.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="defaults to DATABASE_URL")
+    p.add_argument("--conversations", type=int, default=50)
+    p.add_argument("--messages", type=int, default=200, help="messages per conversation")
+    p.add_argument("--repeats", type=int, default=100, help="sequential calls per operation")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip on the http path")
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.dsn:
+        raise SystemExit("Set --dsn or DATABASE_URL to a local Postgres with the chat-history migrations applied")
+    os.environ["CHAT_DATABASE_URL"] = args.dsn
+    os.environ.setdefault("CHAT_PG_POOL_MAX", str(max(10, args.concurrency)))
+    from src.db import chat_history_pg
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('auth.users') IS NOT NULL")
+    has_auth = cur.fetchone()[0]
+    if has_auth:
+        cur.execute("INSERT INTO auth.users (id) VALUES (%s) ON CONFLICT DO NOTHING", (BENCH_USER,))
+    cur.execute("DELETE FROM conversations WHERE user_id = %s", (BENCH_USER,))
+    print(f"🏗️  Seeding {args.conversations} conversations × {args.messages} messages")
+    cur.execute(SEED_SQL, {"user": BENCH_USER, "conversations": args.conversations, "messages": args.messages})
+    cur.execute("ANALYZE conversations; ANALYZE messages")
+    cur.execute("SELECT id FROM conversations WHERE user_id = %s ORDER BY updated_at DESC LIMIT 1", (BENCH_USER,))
+    conversation_id = str(cur.fetchone()[0])
+
+    _PostgRESTStandIn.dsn, _PostgRESTStandIn.rtt_s = args.dsn, args.rtt_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PostgRESTStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = UserClientPool(f"http://127.0.0.1:{server.server_address[1]}", ANON_KEY)
+
+    results: Dict[str, Dict] = {}
+    try:
+        sb, db = pool.get(fake_token(BENCH_USER)), chat_history_pg.PgClient(BENCH_USER)
+        older = chat_history.get_conversation_page(sb, conversation_id, 30)["older"]
+        print(f"⏱️  {args.repeats} calls per operation, then {args.concurrency} concurrent page readers")
+        for mode, api, client in (("http", chat_history, sb), ("pg-sync", chat_history_pg.sync, db)):
+            ops = operations(api, client, conversation_id, older)
+            results[mode] = {op: latency_summary(time_calls(ops[op], args.repeats)) for op in OPERATIONS}
+            results[mode]["concurrent"] = concurrent_sync(ops["page"], args.concurrency, max(1, args.repeats // 4))
+            report(mode, results[mode])
+
+        async def run_async():
+            ops = operations(chat_history_pg, db, conversation_id, older)
+            out = {op: latency_summary(await atime_calls(ops[op], args.repeats)) for op in OPERATIONS}
+            out["concurrent"] = await concurrent_async(ops["page"], args.concurrency, max(1, args.repeats // 4))
+            await chat_history_pg.close_pool()
+            return out
+
+        results["pg-async"] = asyncio.run(run_async())
+        report("pg-async", results["pg-async"])
+    finally:
+        pool.close()
+        server.shutdown()
+        cur.execute("DELETE FROM conversations WHERE user_id = %s", (BENCH_USER,))
+        if has_auth:
+            cur.execute("DELETE FROM auth.users WHERE id = %s", (BENCH_USER,))
+        conn.close()
+
+    write_result("history_backend", {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "dsn"},
+        "runs": results,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
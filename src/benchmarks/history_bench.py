@@ -0,0 +1,198 @@
+# 📁 File: src/benchmarks/history_bench.py
+# Chat-history round trips and latency against a simulated PostgREST
+
+"""
+Seeds an in-memory Supabase (see fakes.FakeSupabase) with one user's
+conversations and times the conversation listing that renders the sidebar:
+
+    per-row   1 + 2 requests per conversation (the original listing)
+    rpc       list_user_conversations, one request
+    counters  plain select of the trigger-maintained counter columns
+
+for each conversation count in --conversations, and the cost of persisting
+one question/answer turn:
+
+    per-message  save_message twice, each followed by an explicit
+                 update_conversation_timestamp (the original write path)
+    turn         save_turn, one multi-row insert
+
+It then replays --renders history-panel renders (the open conversation's
+newest --page-size page, read through the write-behind writer as both UIs
+do, with a turn saved and flushed every --write-every renders; the round
+trips include those writes) with and without history_cache in front.
+
+Every `execute()` costs
+--rtt-ms, which is what dominates against a hosted Supabase project, so
+the round-trip column is the number to watch; latency follows from it.
+
+    python -m src.benchmarks.history_bench
+    python -m src.benchmarks.history_bench --conversations 1,10,50,100 --rtt-ms 40
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.benchmarks.common import latency_summary, write_result
+from src.benchmarks.fakes import FakeSupabase
+from src.db import chat_history
+from src.db.history_cache import HistoryCache, MemoryStore
+from src.db.write_behind import WriteBehindWriter
+
+
+def seed(sb: FakeSupabase, user_id: str, conversations: int, messages: int):
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    for c in range(conversations):
+        created = start + timedelta(hours=c)
+        conv = {
+            "id": str(uuid.uuid4()), "user_id": user_id, "title": f"Conversation {c}",
+            "created_at": created.isoformat(), "updated_at": created.isoformat(), "metadata": {},
+            # What backfill_conversation_counters leaves behind
+            "message_count": messages, "last_message_at": None, "last_message_preview": None,
+        }
+        sb.tables["conversations"].append(conv)
+        for m in range(messages):
+            msg = {
+                "id": str(uuid.uuid4()), "conversation_id": conv["id"], "user_id": user_id,
+                "role": "user" if m % 2 == 0 else "assistant",
+                "content": f"Message {m} about IPC Section {300 + m}", "metadata": {},
+                "created_at": (created + timedelta(seconds=m)).isoformat(),
+            }
+            sb.tables["messages"].append(msg)
+            conv["updated_at"] = conv["last_message_at"] = msg["created_at"]
+            conv["last_message_preview"] = msg["content"][:200]
+
+
+def measure(sb: FakeSupabase, fn: Callable, user_id: str, limit: int, repeats: int) -> Dict:
+    latencies: List[float] = []
+    sb.reset_counters()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = fn(sb, user_id, limit)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "rows": len(rows),
+        "round_trips": sb.round_trips // repeats,
+        "latency": latency_summary(latencies),
+        "_result": rows,
+    }
+
+
+def save_turn_per_message(sb, conversation_id: str, user_id: str, question: str, answer: str):
+    for role, content in (("user", question), ("assistant", answer)):
+        chat_history.save_message(sb, conversation_id, user_id, role, content)
+        chat_history.update_conversation_timestamp(sb, conversation_id)
+
+
+def measure_persist(rtt_ms: float, user_id: str, turns: int) -> Dict:
+    results = {}
+    for name, fn in (("per-message", save_turn_per_message), ("turn", chat_history.save_turn)):
+        sb = FakeSupabase(rtt_ms=rtt_ms)
+        conv_id = chat_history.create_new_conversation(sb, user_id)
+        sb.reset_counters()
+        latencies: List[float] = []
+        for t in range(turns):
+            start = time.perf_counter()
+            fn(sb, conv_id, user_id, f"Question {t}?", f"Answer {t}.")
+            latencies.append(time.perf_counter() - start)
+        round_trips = sb.round_trips
+        history = chat_history.get_conversation_history(sb, conv_id)
+        if [m["role"] for m in history] != ["user", "assistant"] * turns:
+            raise SystemExit(f"❌ {name} stored the turn out of order")
+        results[name] = {"round_trips_per_turn": round_trips / turns, "latency": latency_summary(latencies)}
+    return results
+
+
+def measure_cache(rtt_ms: float, user_id: str, conversations: int, messages: int, renders: int,
+                  write_every: int, page_size: int) -> Dict:
+    results = {}
+    for name in ("uncached", "cached"):
+        sb = FakeSupabase(rtt_ms=rtt_ms)
+        sb.user_id = user_id  # what the cache keys on (UserClient.user_id / PgClient.user_id)
+        seed(sb, user_id, conversations, messages)
+        api = HistoryCache(chat_history, MemoryStore()) if name == "cached" else chat_history
+        conv_id = sb.tables["conversations"][-1]["id"]
+        with tempfile.TemporaryDirectory() as spool_dir:
+            # What both UIs render with: the write-behind writer's newest page over history()
+            writer = WriteBehindWriter(spool_path=Path(spool_dir) / "spool.jsonl", fsync=False, api=api,
+                                       dead_letter_path=Path(spool_dir) / "dead.jsonl").start()
+            sb.reset_counters()
+            latencies: List[float] = []
+            for r in range(renders):
+                if write_every and r and r % write_every == 0:
+                    writer.save_turn(sb, conv_id, user_id, f"Question {r}?", f"Answer {r}.")
+                    writer.flush()
+                start = time.perf_counter()
+                page = writer.get_conversation_page(sb, conv_id, page_size)
+                latencies.append(time.perf_counter() - start)
+            round_trips = sb.round_trips
+            writer.close()
+        if page["messages"] != chat_history.get_conversation_page(sb, conv_id, page_size)["messages"]:
+            raise SystemExit(f"❌ {name} page is stale after the last turn")
+        results[name] = {"round_trips": round_trips, "latency": latency_summary(latencies)}
+        if name == "cached":
+            results[name]["stats"] = dict(api.stats)
+        print(f"   {name:<9} {round_trips:>4} round trips  render p50 {results[name]['latency']['p50_ms']:.1f} ms")
+    return results
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Chat-history listing round trips/latency benchmark")
+    p.add_argument("--conversations", default="1,5,10,20,50")
+    p.add_argument("--messages", type=int, default=12, help="messages per conversation")
+    p.add_argument("--rtt-ms", type=float, default=25.0, help="simulated PostgREST round trip")
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--turns", type=int, default=20, help="question/answer turns to persist")
+    p.add_argument("--renders", type=int, default=50, help="history-panel renders for the cache run")
+    p.add_argument("--page-size", type=int, default=10, help="messages per page in the cache run")
+    p.add_argument("--write-every", type=int, default=5, help="renders between saved turns in the cache run")
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    user_id = str(uuid.uuid4())
+    methods = {
+        "per-row": chat_history._get_user_conversations_per_row,
+        "rpc": chat_history._get_user_conversations_rpc,
+        "counters": chat_history.get_user_conversations,
+    }
+
+    runs = []
+    for n in (int(c) for c in args.conversations.split(",")):
+        sb = FakeSupabase(rtt_ms=args.rtt_ms)
+        seed(sb, user_id, n, args.messages)
+        print(f"🗂️  {n} conversations × {args.messages} messages")
+        results = {name: measure(sb, fn, user_id, n, args.repeats) for name, fn in methods.items()}
+        reference = results["per-row"].pop("_result")
+        for name in ("rpc", "counters"):
+            if results[name].pop("_result") != reference:
+                raise SystemExit(f"❌ {name} listing differs from the per-row listing")
+        runs.append({"conversations": n, **results})
+
+    print(f"💾 Persisting {args.turns} turns")
+    persist = measure_persist(args.rtt_ms, user_id, args.turns)
+
+    print(f"🧠 {args.renders} renders, a turn every {args.write_every}")
+    cache = measure_cache(args.rtt_ms, user_id, 20, args.messages, args.renders, args.write_every, args.page_size)
+
+    write_result("history", {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "runs": runs,
+        "persist": persist,
+        "cache": cache,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
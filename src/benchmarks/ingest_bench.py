@@ -0,0 +1,243 @@
+# 📁 File: src/benchmarks/ingest_bench.py
+# Ingestion + embedding throughput benchmark with regression tracking
+
+"""
+Measures the offline ingestion path the same way load_pdfs.py and
+create_embeddings.py run it:
+
+    extract   pages/sec for PyMuPDF text extraction
+    clean     time spent in each clean_text regex and their share of the total
+    split     chunks/sec for the RecursiveCharacterTextSplitter
+    scaled    clean + split again on a synthetic corpus (Data/ PDFs × --scale)
+    embed     texts/sec for each --batch-sizes × --workers (torch threads)
+
+plus peak RSS. Each run is appended to bench_results/ingest.jsonl; the
+latest earlier run with the same --scale is used as the baseline, and any
+throughput that drops by more than --threshold percent is flagged.
+
+    python -m src.benchmarks.ingest_bench
+    python -m src.benchmarks.ingest_bench --scale 20 --no-embed --fail-on-regression
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import fitz  # PyMuPDF
+
+from src.benchmarks.common import load_history, peak_rss_mb, write_result
+from src.ingestion.load_pdfs import CLEAN_STEPS, PDF_DIR, make_splitter
+
+BENCH_NAME = "ingest"
+
+
+def extract_pages(pdf_dir: Path) -> Dict:
+    pages: List[str] = []
+    page_counts: List[int] = []
+    start = time.perf_counter()
+    for pdf_path in sorted(pdf_dir.glob("*.pdf")):
+        with fitz.open(pdf_path) as pdf:
+            texts = [page.get_text("text") for page in pdf]
+        pages.extend(texts)
+        page_counts.append(len(texts))
+    elapsed = time.perf_counter() - start
+    return {"pages": pages, "page_counts": page_counts, "seconds": elapsed}
+
+
+def join_documents(texts: List[str], page_counts: List[int]) -> List[str]:
+    """Re-assemble cleaned pages into one string per PDF, as extract_text_from_pdfs does."""
+    documents, pos = [], 0
+    for n in page_counts:
+        documents.append(" ".join(texts[pos:pos + n]) + " ")
+        pos += n
+    return documents
+
+
+def time_clean(pages: List[str]) -> Dict:
+    """Apply clean_text's steps one at a time across all pages, timing each."""
+    texts = list(pages)
+    per_step: Dict[str, float] = {}
+    for name, pattern, repl in CLEAN_STEPS:
+        start = time.perf_counter()
+        texts = [pattern.sub(repl, t) for t in texts]
+        per_step[name] = time.perf_counter() - start
+    start = time.perf_counter()
+    texts = [t.strip() for t in texts]
+    per_step["strip"] = time.perf_counter() - start
+    total = sum(per_step.values())
+    return {
+        "texts": texts,
+        "total_s": total,
+        "steps": {
+            name: {"seconds": round(sec, 4), "share": round(sec / total, 3) if total else 0.0}
+            for name, sec in per_step.items()
+        },
+    }
+
+
+def time_split(documents: List[str]) -> Dict:
+    splitter = make_splitter()
+    start = time.perf_counter()
+    chunks = [c for doc in documents for c in splitter.split_text(doc)]
+    elapsed = time.perf_counter() - start
+    return {"chunks": chunks, "seconds": elapsed}
+
+
+def time_embeddings(chunks: List[str], batch_sizes: List[int], workers: List[int], sample: int) -> Dict:
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    texts = chunks[:sample]
+    model.encode(texts[:8])  # warm up kernels outside the timings
+    results = {}
+    original_threads = torch.get_num_threads()
+    for w in workers:
+        torch.set_num_threads(w)
+        for bs in batch_sizes:
+            start = time.perf_counter()
+            model.encode(texts, batch_size=bs)
+            elapsed = time.perf_counter() - start
+            results[f"bs{bs}.w{w}"] = round(len(texts) / elapsed, 2)
+    torch.set_num_threads(original_threads)
+    return results
+
+
+def flatten(result: Dict) -> Dict[str, float]:
+    """Comparable metrics: throughputs (higher is better) and peak RSS (lower is better)."""
+    metrics = {
+        "extract.pages_per_s": result["extract"]["pages_per_s"],
+        "clean.mb_per_s": result["clean"]["mb_per_s"],
+        "split.chunks_per_s": result["split"]["chunks_per_s"],
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+    if result.get("scaled"):
+        metrics["scaled.clean.mb_per_s"] = result["scaled"]["clean_mb_per_s"]
+        metrics["scaled.split.chunks_per_s"] = result["scaled"]["chunks_per_s"]
+    for key, value in (result.get("embed") or {}).items():
+        metrics[f"embed.{key}.texts_per_s"] = value
+    return metrics
+
+
+def find_regressions(current: Dict[str, float], baseline: Dict[str, float], threshold_pct: float) -> List[Dict]:
+    flagged = []
+    for key, value in current.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        lower_is_better = key == "peak_rss_mb"
+        change_pct = (value - old) / old * 100
+        worse = change_pct > threshold_pct if lower_is_better else change_pct < -threshold_pct
+        if worse:
+            flagged.append({"metric": key, "baseline": old, "current": value, "change_pct": round(change_pct, 1)})
+    return flagged
+
+
+def baseline_run(config: Dict, out: Optional[Path]) -> Optional[Dict]:
+    """Latest earlier run with the same configuration; other runs time different work."""
+    for record in reversed(load_history(BENCH_NAME, out)):
+        if record.get("config") == config and "metrics" in record:
+            return record
+    return None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Ingestion and embedding throughput benchmark")
+    p.add_argument("--pdf-dir", type=Path, default=PDF_DIR)
+    p.add_argument("--scale", type=int, default=10, help="synthetic corpus = Data/ PDFs repeated this many times")
+    p.add_argument("--no-embed", action="store_true", help="skip the embedding timings (no torch needed)")
+    p.add_argument("--embed-sample", type=int, default=512, help="chunks to embed per configuration")
+    p.add_argument("--batch-sizes", default="1,16,32,64,128")
+    p.add_argument("--workers", default="1,2,4", help="torch intra-op thread counts")
+    p.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    p.add_argument("--fail-on-regression", action="store_true")
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print("📖 Extracting pages...")
+    extracted = extract_pages(args.pdf_dir)
+    pages = extracted["pages"]
+    raw_mb = sum(len(p.encode("utf-8")) for p in pages) / (1024 * 1024)
+
+    print("🧹 Timing clean_text steps...")
+    cleaned = time_clean(pages)
+    documents = join_documents(cleaned["texts"], extracted["page_counts"])
+
+    print("✂️  Splitting...")
+    split = time_split(documents)
+
+    result = {
+        "config": {
+            "scale": args.scale,
+            "pdf_dir": str(args.pdf_dir),
+            "embed": not args.no_embed,
+            "embed_sample": args.embed_sample,
+            "batch_sizes": args.batch_sizes,
+            "workers": args.workers,
+        },
+        "extract": {
+            "pages": len(pages),
+            "seconds": round(extracted["seconds"], 3),
+            "pages_per_s": round(len(pages) / extracted["seconds"], 2) if extracted["seconds"] else 0.0,
+        },
+        "clean": {
+            "seconds": round(cleaned["total_s"], 4),
+            "mb_per_s": round(raw_mb / cleaned["total_s"], 2) if cleaned["total_s"] else 0.0,
+            "share_of_extract_and_clean": round(cleaned["total_s"] / (cleaned["total_s"] + extracted["seconds"]), 3),
+            "steps": cleaned["steps"],
+        },
+        "split": {
+            "chunks": len(split["chunks"]),
+            "seconds": round(split["seconds"], 3),
+            "chunks_per_s": round(len(split["chunks"]) / split["seconds"], 2) if split["seconds"] else 0.0,
+        },
+    }
+
+    if args.scale > 1:
+        print(f"📈 Synthetic corpus × {args.scale}...")
+        scaled_clean = time_clean(pages * args.scale)
+        scaled_split = time_split(join_documents(scaled_clean["texts"], extracted["page_counts"] * args.scale))
+        result["scaled"] = {
+            "pages": len(pages) * args.scale,
+            "clean_seconds": round(scaled_clean["total_s"], 3),
+            "clean_mb_per_s": round(raw_mb * args.scale / scaled_clean["total_s"], 2),
+            "chunks": len(scaled_split["chunks"]),
+            "split_seconds": round(scaled_split["seconds"], 3),
+            "chunks_per_s": round(len(scaled_split["chunks"]) / scaled_split["seconds"], 2),
+        }
+
+    if not args.no_embed:
+        print("🧠 Timing embeddings...")
+        result["embed"] = time_embeddings(
+            split["chunks"],
+            [int(b) for b in args.batch_sizes.split(",")],
+            [int(w) for w in args.workers.split(",")],
+            args.embed_sample,
+        )
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["metrics"] = flatten(result)
+
+    baseline = baseline_run(result["config"], args.out)
+    result["baseline"] = {"git_rev": baseline.get("git_rev"), "timestamp": baseline.get("timestamp")} if baseline else None
+    result["regressions"] = find_regressions(result["metrics"], baseline["metrics"], args.threshold) if baseline else []
+
+    write_result(BENCH_NAME, result, args.out)
+    for r in result["regressions"]:
+        print(f"⚠️ Regression: {r['metric']} {r['baseline']} → {r['current']} ({r['change_pct']:+.1f}%)")
+    if result["regressions"] and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
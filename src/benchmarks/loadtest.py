@@ -0,0 +1,176 @@
+# 📁 File: src/benchmarks/loadtest.py
+# Offline end-to-end load test for get_legal_answer
+
+"""
+Drives N concurrent simulated users through the real RAG pipeline with the
+remote services swapped for local fakes (see fakes.py), then reports
+p50/p95/p99 latency, requests per second and peak memory.
+
+    python -m src.benchmarks.loadtest --users 50 --requests 10
+    python -m src.benchmarks.loadtest --mode async --llm-ttft-ms 800 --repeat-ratio 0.5
+
+`--mode thread` calls get_legal_answer from worker threads, as an HTTP front
+end would; `--mode async` awaits aget_legal_answer from one event loop, which
+is what the Chainlit message and example handlers do. Nothing leaves the
+machine: vectors come from Data/legal_embeddings.npy, and the chat model is
+simulated. Use --embedder minilm to include real query encoding; the model
+has to be in the local Hugging Face cache.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.benchmarks.common import latency_summary, peak_rss_mb, write_result
+from src.benchmarks.fakes import FakeChatModel, FakeEmbedder, FakeVectorIndex
+from src.retrieval.local_index import get_local_index
+
+# Mirrors the example buttons in the Chainlit and Streamlit UIs
+POPULAR_QUESTIONS = [
+    "What constitutes theft under IPC Section 378?",
+    "Explain the punishment for murder under IPC",
+    "What are the bail provisions in CrPC?",
+    "What are fundamental rights under the Constitution?",
+]
+
+
+def make_question(rng: random.Random, repeat_ratio: float) -> str:
+    """A popular example with probability `repeat_ratio`, otherwise a unique question."""
+    if rng.random() < repeat_ratio:
+        return rng.choice(POPULAR_QUESTIONS)
+    section = rng.randint(1, 511)
+    topic = rng.choice(["punishment", "ingredients", "exceptions", "bail", "evidence required"])
+    return f"What are the {topic} under IPC Section {section}? (case {rng.randrange(10 ** 6)})"
+
+
+def setup_pipeline(args):
+    """Import the pipeline and swap in the offline fakes."""
+    from src.llm import rag_pipeline
+
+    local = get_local_index()
+    embedder = None
+    if args.embedder == "fake":
+        embedder = FakeEmbedder(corpus=local.embeddings, ms_per_text=args.embed_ms)
+    vector = FakeVectorIndex(local, latency_ms=args.vector_latency_ms,
+                             jitter_ms=args.vector_jitter_ms, error_rate=args.vector_error_rate)
+    chat = FakeChatModel(ttft_ms=args.llm_ttft_ms, tokens_per_second=args.llm_tps,
+                         answer_tokens=args.answer_tokens, error_rate=args.llm_error_rate)
+    rag_pipeline.configure(vector_index=vector, embedder=embedder, chat_model=chat)
+    return rag_pipeline, vector, chat
+
+
+def classify(answer: str) -> str:
+    if answer.startswith("⏳"):
+        return "busy"
+    if answer.startswith("⚠️ Error"):
+        return "error"
+    if answer.startswith("⚠️"):
+        return "degraded"
+    return "ok"
+
+
+def run_threads(pipeline, args) -> List[tuple]:
+    results: List[tuple] = []
+    lock = threading.Lock()
+
+    def user(uid: int):
+        rng = random.Random(args.seed + uid)
+        for _ in range(args.requests):
+            q = make_question(rng, args.repeat_ratio)
+            start = time.perf_counter()
+            answer = pipeline.get_legal_answer(q, user_id=f"user-{uid}")
+            with lock:
+                results.append((time.perf_counter() - start, classify(answer)))
+            if args.think_ms:
+                time.sleep(rng.expovariate(1000 / args.think_ms))
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_async(pipeline, args) -> List[tuple]:
+    results: List[tuple] = []
+
+    async def user(uid: int):
+        rng = random.Random(args.seed + uid)
+        for _ in range(args.requests):
+            q = make_question(rng, args.repeat_ratio)
+            start = time.perf_counter()
+            answer = await pipeline.aget_legal_answer(q, user_id=f"user-{uid}")
+            results.append((time.perf_counter() - start, classify(answer)))
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+    async def main():
+        # asyncio.to_thread uses the default executor; size it for the simulated users
+        from concurrent.futures import ThreadPoolExecutor
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.users + 4))
+        await asyncio.gather(*(user(i) for i in range(args.users)))
+
+    asyncio.run(main())
+    return results
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline load test for the LegaBot RAG pipeline")
+    p.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    p.add_argument("--requests", type=int, default=5, help="questions per user")
+    p.add_argument("--mode", choices=["thread", "async"], default="thread")
+    p.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's questions")
+    p.add_argument("--repeat-ratio", type=float, default=0.2, help="share of questions that are popular examples")
+    p.add_argument("--embedder", choices=["fake", "minilm"], default="fake")
+    p.add_argument("--embed-ms", type=float, default=2.0, help="fake embedder cost per text")
+    p.add_argument("--vector-latency-ms", type=float, default=40.0)
+    p.add_argument("--vector-jitter-ms", type=float, default=20.0)
+    p.add_argument("--vector-error-rate", type=float, default=0.0)
+    p.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    p.add_argument("--llm-tps", type=float, default=60.0, help="streamed tokens per second")
+    p.add_argument("--answer-tokens", type=int, default=150)
+    p.add_argument("--llm-error-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", type=Path, default=None, help="append the JSON result here")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline, vector, chat = setup_pipeline(args)
+    print(f"🚦 {args.users} users × {args.requests} questions ({args.mode} mode)...")
+
+    start = time.perf_counter()
+    results = run_async(pipeline, args) if args.mode == "async" else run_threads(pipeline, args)
+    elapsed = time.perf_counter() - start
+
+    outcomes = {}
+    for _, kind in results:
+        outcomes[kind] = outcomes.get(kind, 0) + 1
+    result = {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "latency": latency_summary([lat for lat, _ in results]),
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "peak_rss_mb": peak_rss_mb(),
+        "backend_calls": {"vector": vector.calls, "llm": chat.calls},
+        "coalescing": pipeline.coalescing_stats(),
+        "scheduler": pipeline.get_scheduler().snapshot(),
+    }
+    write_result("loadtest", result, args.out)
+
+
+if __name__ == "__main__":
+    main()
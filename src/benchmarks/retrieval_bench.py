@@ -0,0 +1,241 @@
+# 📁 File: src/benchmarks/retrieval_bench.py
+# Retrieval quality + latency benchmark across index types
+
+"""
+Builds a labelled query set from the corpus itself: every statute section
+heading found in Data/legal_text.csv ("378. Theft.—Whoever ...") becomes a
+query ("Theft") whose target is the chunk that contains that heading. Each
+available backend/configuration is then built over Data/legal_embeddings.npy
+and scored on:
+
+    recall@1/5/10, MRR@10, build time, index size, RSS growth during build,
+    and single-query latency p50/p95/p99
+
+    python -m src.benchmarks.retrieval_bench
+    python -m src.benchmarks.retrieval_bench --backends flat-numpy,hnsw --max-queries 200
+    python -m src.benchmarks.retrieval_bench --pinecone      # also query the live index
+
+FAISS backends are skipped if faiss is not installed. Results are appended to
+bench_results/retrieval.jsonl together with the git revision and a hash of
+the corpus, so runs from different commits can be compared directly.
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.benchmarks.common import current_rss_mb, latency_summary, write_result
+from src.retrieval.local_index import EMBED_FILE, TEXT_FILE
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# "205. False personation for purpose of ... prosecution.--Whoever ..."
+HEADING = re.compile(r"(?:^|[.\s])(\d{1,3}[A-Z]?)\.\s+([A-Z][^.]{3,150}?)\.\s?(?:--|—|–)")
+K_VALUES = (1, 5, 10)
+
+SearchFn = Callable[[np.ndarray, int], np.ndarray]
+
+
+# --------------------------- Labelled queries ---------------------------
+
+def build_query_set(df: pd.DataFrame, max_queries: Optional[int] = None) -> List[Tuple[str, Set[int]]]:
+    """(heading title, {row ids of chunks containing that heading})"""
+    targets: Dict[str, Set[int]] = {}
+    for row_id, text in enumerate(df["text"].astype(str)):
+        for m in HEADING.finditer(text):
+            title = " ".join(m.group(2).split())
+            if len(title.split()) < 2:
+                continue  # one-word titles are too ambiguous to label
+            targets.setdefault(title, set()).add(row_id)
+    queries = sorted(targets.items())
+    if max_queries:
+        queries = queries[:max_queries]
+    return queries
+
+
+def corpus_fingerprint() -> str:
+    h = hashlib.sha1()
+    for path in (TEXT_FILE, EMBED_FILE):
+        h.update(path.read_bytes())
+    return h.hexdigest()[:12]
+
+
+def encode_queries(titles: Sequence[str]) -> np.ndarray:
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    return model.encode(list(titles), batch_size=64, normalize_embeddings=True).astype(np.float32)
+
+
+# --------------------------- Backends ---------------------------
+
+def _flat_numpy(xb: np.ndarray, _params: Dict):
+    def search(q, k):
+        scores = xb @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+    return search, xb.nbytes
+
+
+def _int8_numpy(xb: np.ndarray, _params: Dict):
+    scale = np.abs(xb).max(axis=0) / 127.0
+    codes = np.round(xb / scale).astype(np.int8)
+
+    def search(q, k):
+        scores = codes.astype(np.float32) @ (q * scale)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+    return search, codes.nbytes + scale.nbytes
+
+
+def _faiss_search(index) -> SearchFn:
+    def search(q, k):
+        _, ids = index.search(q.reshape(1, -1), k)
+        return ids[0]
+    return search
+
+
+def _faiss_flat(xb, _params):
+    index = faiss.IndexFlatIP(xb.shape[1])
+    index.add(xb)
+    return _faiss_search(index), faiss.serialize_index(index).nbytes
+
+
+def _faiss_hnsw(xb, params):
+    index = faiss.IndexHNSWFlat(xb.shape[1], params["M"], faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = params.get("efConstruction", 80)
+    index.add(xb)
+    index.hnsw.efSearch = params["efSearch"]
+    return _faiss_search(index), faiss.serialize_index(index).nbytes
+
+
+def _faiss_ivfpq(xb, params):
+    d = xb.shape[1]
+    quantizer = faiss.IndexFlatIP(d)
+    index = faiss.IndexIVFPQ(quantizer, d, params["nlist"], params["m"], 8, faiss.METRIC_INNER_PRODUCT)
+    index.train(xb)
+    index.add(xb)
+    index.nprobe = params["nprobe"]
+    return _faiss_search(index), faiss.serialize_index(index).nbytes
+
+
+def _faiss_sq8(xb, _params):
+    index = faiss.IndexScalarQuantizer(xb.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index.train(xb)
+    index.add(xb)
+    return _faiss_search(index), faiss.serialize_index(index).nbytes
+
+
+def _pinecone(_xb, _params):
+    from src.llm.rag_pipeline import _get_index
+    remote = _get_index()
+
+    def search(q, k):
+        res = remote.query(vector=q.tolist(), top_k=k, include_metadata=False)
+        return np.array([int(m["id"]) for m in res.get("matches", [])])
+    return search, None
+
+
+def backend_configs(include_pinecone: bool) -> List[Tuple[str, Dict, Callable]]:
+    configs = [
+        ("flat-numpy", {}, _flat_numpy),
+        ("int8-numpy", {}, _int8_numpy),
+    ]
+    if faiss is not None:
+        configs.append(("flat", {}, _faiss_flat))
+        for M in (16, 32):
+            for ef in (32, 64, 128):
+                configs.append(("hnsw", {"M": M, "efSearch": ef}, _faiss_hnsw))
+        for nprobe in (4, 8, 16):
+            configs.append(("ivfpq", {"nlist": 32, "m": 48, "nprobe": nprobe}, _faiss_ivfpq))
+        configs.append(("sq8", {}, _faiss_sq8))
+    if include_pinecone:
+        configs.append(("pinecone", {}, _pinecone))
+    return configs
+
+
+# --------------------------- Evaluation ---------------------------
+
+def evaluate(search: SearchFn, queries: np.ndarray, targets: List[Set[int]]) -> Dict:
+    k_max = max(K_VALUES)
+    recalls = {k: 0.0 for k in K_VALUES}
+    rr = 0.0
+    latencies: List[float] = []
+    for q, relevant in zip(queries, targets):
+        start = time.perf_counter()
+        ids = [int(i) for i in search(q, k_max)]
+        latencies.append(time.perf_counter() - start)
+        for k in K_VALUES:
+            recalls[k] += len(relevant.intersection(ids[:k])) / len(relevant)
+        rank = next((r for r, i in enumerate(ids, 1) if i in relevant), None)
+        rr += 1.0 / rank if rank else 0.0
+    n = len(targets)
+    return {
+        **{f"recall@{k}": round(recalls[k] / n, 4) for k in K_VALUES},
+        "mrr@10": round(rr / n, 4),
+        "latency": latency_summary(latencies),
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Retrieval quality/latency benchmark")
+    p.add_argument("--backends", default="", help="comma-separated subset, e.g. flat-numpy,hnsw,ivfpq")
+    p.add_argument("--max-queries", type=int, default=None)
+    p.add_argument("--pinecone", action="store_true", help="include the live Pinecone index")
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    df = pd.read_csv(TEXT_FILE)
+    xb = np.load(EMBED_FILE).astype(np.float32)
+    xb /= np.maximum(np.linalg.norm(xb, axis=1, keepdims=True), 1e-12)
+
+    labelled = build_query_set(df, args.max_queries)
+    print(f"🏷️  {len(labelled)} labelled queries from section headings")
+    xq = encode_queries([title for title, _ in labelled])
+    targets = [rows for _, rows in labelled]
+
+    wanted = {b for b in args.backends.split(",") if b}
+    runs = []
+    for name, params, build in backend_configs(args.pinecone):
+        if wanted and name not in wanted:
+            continue
+        print(f"⚙️  {name} {params or ''}")
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        search, size_bytes = build(xb, params)
+        build_s = time.perf_counter() - start
+        runs.append({
+            "backend": name,
+            "params": params,
+            "build_s": round(build_s, 4),
+            "index_bytes": size_bytes,
+            "rss_growth_mb": round(current_rss_mb() - rss_before, 1),
+            **evaluate(search, xq, targets),
+        })
+
+    write_result("retrieval", {
+        "corpus": {"fingerprint": corpus_fingerprint(), "vectors": len(xb), "dim": xb.shape[1]},
+        "queries": len(labelled),
+        "faiss_available": faiss is not None,
+        "runs": runs,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# 📁 File: src/benchmarks/search_bench.py
+# Full-text message search benchmark against a local Postgres
+
+"""
+Builds a synthetic chat history in a scratch schema of a local Postgres
+(default 2M messages over 500 users), with the same tables and indexes as
+migrations/create_chat_history_tables.sql and the search_messages function
+from migrations/search_messages.sql. It then times ranked searches for a
+sample of users and several result pages.
+
+Assistant messages are real chunks from Data/legal_text.csv and questions
+are templated, so term frequencies look like the real thing. For each query
+it reports latency p50/p95/p99 per page, and whether the planner used
+idx_messages_content_search. --baseline also times an ILIKE scan.
+
+    python -m src.benchmarks.search_bench --dsn postgresql://postgres@localhost/postgres
+    python -m src.benchmarks.search_bench --messages 5000000 --reuse --baseline
+
+Everything lives in --schema (default legabot_bench), which is dropped
+first unless --reuse finds it already populated. The function's GRANT
+needs an `authenticated` role, which is created if missing, as Supabase has.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pandas as pd
+import psycopg2
+
+from src.benchmarks.common import latency_summary, write_result
+from src.retrieval.local_index import TEXT_FILE
+
+SEARCH_MIGRATION = PROJECT_ROOT / "migrations" / "search_messages.sql"
+
+QUERIES = [
+    "Section 498A",
+    "anticipatory bail",
+    "dowry cruelty",
+    '"criminal breach of trust"',
+    "culpable homicide -murder",
+    "theft",
+]
+
+QUESTION_TEMPLATES = [
+    "What does Section {n} of the IPC say?",
+    "Is anticipatory bail available for an offence under Section {n}?",
+    "What is the punishment for cruelty and dowry harassment under Section 498A?",
+    "Explain criminal breach of trust with an example",
+    "Difference between culpable homicide and murder",
+    "What are the ingredients of theft under Section 378?",
+    "Can the police arrest without a warrant under Section {n}?",
+]
+
+SCHEMA_SQL = """
+    CREATE TABLE conversations (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        user_id UUID NOT NULL,
+        title TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        metadata JSONB DEFAULT '{}'::jsonb
+    );
+    CREATE TABLE messages (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+        user_id UUID NOT NULL,
+        role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
+        content TEXT NOT NULL,
+        metadata JSONB DEFAULT '{}'::jsonb,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    CREATE TABLE corpus (n INTEGER PRIMARY KEY, text TEXT NOT NULL);
+    CREATE TABLE questions (n INTEGER PRIMARY KEY, text TEXT NOT NULL);
+"""
+
+# Same definitions as the migration, built after the bulk load
+INDEX_SQL = [
+    ("idx_conversations_user_updated", "CREATE INDEX idx_conversations_user_updated ON conversations(user_id, updated_at DESC)"),
+    ("idx_messages_user_id", "CREATE INDEX idx_messages_user_id ON messages(user_id)"),
+    ("idx_messages_conv_created", "CREATE INDEX idx_messages_conv_created ON messages(conversation_id, created_at)"),
+    ("idx_messages_content_search",
+     "CREATE INDEX idx_messages_content_search ON messages USING gin(to_tsvector('english', content))"),
+]
+
+# Message n (1-based) goes to conversation (n - 1) / per_conv; odd n are questions
+LOAD_SQL = """
+    INSERT INTO messages (conversation_id, user_id, role, content, created_at)
+    SELECT c.id, c.user_id,
+           CASE WHEN g %% 2 = 1 THEN 'user' ELSE 'assistant' END,
+           CASE WHEN g %% 2 = 1
+                THEN replace(q.text, '{n}', (1 + (g * 7919) %% 511)::text)
+                ELSE k.text END,
+           c.created_at + ((g - 1) %% %(per_conv)s) * INTERVAL '30 seconds'
+    FROM generate_series(%(start)s::bigint, %(stop)s::bigint) AS g
+    JOIN conv_seq c ON c.seq = (g - 1) / %(per_conv)s
+    JOIN questions q ON q.n = (g / 2) %% %(n_questions)s
+    JOIN corpus k ON k.n = (g * 2654435761) %% %(n_corpus)s
+"""
+
+
+def setup(conn, args) -> Dict:
+    timings: Dict[str, float] = {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (f"{args.schema}.messages",))
+        exists = cur.fetchone()[0] is not None
+        if args.reuse and exists:
+            cur.execute(f"SET search_path TO {args.schema}, public")
+            cur.execute("SELECT count(*) FROM messages")
+            if cur.fetchone()[0] >= args.messages:
+                print(f"♻️  Reusing {args.schema}")
+                return {"reused": True}
+
+        print(f"🏗️  Creating {args.schema} with {args.messages:,} messages for {args.users} users")
+        cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {args.schema}")
+        cur.execute(f"SET search_path TO {args.schema}, public")
+        cur.execute(SCHEMA_SQL)
+
+        chunks = pd.read_csv(TEXT_FILE)["text"].astype(str).tolist()
+        buf = io.StringIO()
+        pd.DataFrame({"n": range(len(chunks)), "text": chunks}).to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        cur.copy_expert("COPY corpus (n, text) FROM STDIN WITH CSV", buf)
+        cur.executemany("INSERT INTO questions VALUES (%s, %s)", list(enumerate(QUESTION_TEMPLATES)))
+
+        per_conv = args.messages_per_conversation
+        n_convs = max(1, args.messages // per_conv)
+        cur.execute("""
+            CREATE TABLE conv_seq AS
+            SELECT g - 1 AS seq, gen_random_uuid() AS id,
+                   ('00000000-0000-0000-0000-' || lpad(((g - 1) %% %s)::text, 12, '0'))::uuid AS user_id,
+                   NOW() - (g %% 720) * INTERVAL '1 hour' AS created_at
+            FROM generate_series(1, %s) AS g
+        """, (args.users, n_convs))
+        cur.execute("""
+            INSERT INTO conversations (id, user_id, title, created_at, updated_at)
+            SELECT id, user_id, 'Conversation ' || seq, created_at, created_at FROM conv_seq
+        """)
+        cur.execute("CREATE UNIQUE INDEX ON conv_seq (seq)")
+        conn.commit()
+
+        start = time.perf_counter()
+        step = 500_000
+        for lo in range(1, args.messages + 1, step):
+            hi = min(lo + step - 1, args.messages)
+            cur.execute(LOAD_SQL, {
+                "start": lo, "stop": hi, "per_conv": per_conv,
+                "n_questions": len(QUESTION_TEMPLATES), "n_corpus": len(chunks),
+            })
+            conn.commit()
+            print(f"   {hi:,} messages loaded")
+        timings["load_s"] = time.perf_counter() - start
+
+        for name, sql in INDEX_SQL:
+            start = time.perf_counter()
+            cur.execute(sql)
+            conn.commit()
+            timings[f"{name}_s"] = time.perf_counter() - start
+            print(f"   {name}: {timings[f'{name}_s']:.1f}s")
+
+        cur.execute("DO $$ BEGIN CREATE ROLE authenticated NOLOGIN; EXCEPTION WHEN duplicate_object THEN NULL; END $$")
+        cur.execute(SEARCH_MIGRATION.read_text())
+        cur.execute("ANALYZE")
+        conn.commit()
+    return {"reused": False, **{k: round(v, 2) for k, v in timings.items()}}
+
+
+def uses_search_index(cur, user_id: str, query: str) -> bool:
+    cur.execute("""
+        EXPLAIN SELECT m.id FROM messages m
+        WHERE to_tsvector('english', m.content) @@ websearch_to_tsquery('english', %s)
+          AND m.user_id = %s
+    """, (query, user_id))
+    return any("idx_messages_content_search" in row[0] for row in cur.fetchall())
+
+
+def time_query(cur, sql: str, params, repeats: int) -> List[float]:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Full-text chat-history search benchmark (local Postgres)")
+    p.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="defaults to DATABASE_URL")
+    p.add_argument("--schema", default="legabot_bench")
+    p.add_argument("--messages", type=int, default=2_000_000)
+    p.add_argument("--users", type=int, default=500)
+    p.add_argument("--messages-per-conversation", type=int, default=20)
+    p.add_argument("--sample-users", type=int, default=5)
+    p.add_argument("--pages", type=int, default=3)
+    p.add_argument("--page-size", type=int, default=10)
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--baseline", action="store_true", help="also time an ILIKE scan")
+    p.add_argument("--reuse", action="store_true", help="keep an already populated schema")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", type=Path, default=None)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.dsn:
+        raise SystemExit("Set --dsn or DATABASE_URL to a local Postgres")
+
+    conn = psycopg2.connect(args.dsn)
+    setup_info = setup(conn, args)
+    rng = random.Random(args.seed)
+    users = [f"00000000-0000-0000-0000-{u:012d}" for u in rng.sample(range(args.users), min(args.sample_users, args.users))]
+
+    runs = []
+    with conn.cursor() as cur:
+        cur.execute(f"SET search_path TO {args.schema}, public")
+        cur.execute("SELECT count(*) FROM messages")
+        total = cur.fetchone()[0]
+        for query in QUERIES:
+            print(f"🔎 {query}")
+            run = {"query": query, "uses_gin_index": uses_search_index(cur, users[0], query), "pages": []}
+            for page in range(args.pages):
+                latencies, hits = [], 0
+                for user_id in users:
+                    latencies += time_query(
+                        cur, "SELECT * FROM search_messages(%s, %s, %s, %s)",
+                        (user_id, query, args.page_size, page * args.page_size), args.repeats,
+                    )
+                    hits += cur.rowcount
+                run["pages"].append({"page": page, "avg_hits": round(hits / len(users), 1), "latency": latency_summary(latencies)})
+            if args.baseline:
+                term = query.strip('"').split(" -")[0]
+                latencies = []
+                for user_id in users:
+                    latencies += time_query(
+                        cur, "SELECT id FROM messages WHERE user_id = %s AND content ILIKE %s ORDER BY created_at DESC LIMIT %s",
+                        (user_id, f"%{term}%", args.page_size), args.repeats,
+                    )
+                run["ilike_latency"] = latency_summary(latencies)
+            runs.append(run)
+    conn.close()
+
+    write_result("search", {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "dsn"},
+        "messages": total,
+        "setup": setup_info,
+        "runs": runs,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
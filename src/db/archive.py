@@ -0,0 +1,62 @@
+"""
+NDJSON archives of chat history, optionally gzip-compressed (by ".gz" suffix).
+
+One JSON object per line, tagged with its kind, and each conversation is
+followed by its messages:
+
+    {"type": "conversation", "id": ..., "user_id": ..., "title": ..., ...}
+    {"type": "message", "id": ..., "conversation_id": ..., "role": ..., ...}
+
+Lines are written as they are produced, so archives of any size can be
+streamed in and out in constant memory.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator
+
+
+def _open(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+class NDJSONWriter:
+    def __init__(self, path, append: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = _open(self.path, "a" if append else "w")
+        self.counts = {"conversation": 0, "message": 0}
+
+    def write(self, kind: str, row: Dict):
+        self._f.write(json.dumps({"type": kind, **row}, default=str, ensure_ascii=False) + "\n")
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def sync(self):
+        """Flush through to disk, e.g. before deleting what was just archived."""
+        self._f.flush()
+        self._f.buffer.flush()  # for gzip this also emits a sync-flushed block
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self.sync()
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_ndjson(path) -> Iterator[Dict]:
+    """Yield records one at a time; blank lines are skipped."""
+    with _open(Path(path), "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
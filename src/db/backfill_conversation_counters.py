@@ -0,0 +1,85 @@
+"""
+Backfill conversations.message_count / last_message_at / last_message_preview
+after running migrations/conversation_counters.sql.
+
+Walks conversations in id order, BATCH_SIZE at a time, and commits after each
+batch so locks stay short and the run can be interrupted and resumed
+(--after <last id printed>). Needs a direct Postgres connection string in
+DATABASE_URL (Supabase: Project Settings → Database), since it has to bypass
+RLS for every user.
+
+    python -m src.db.backfill_conversation_counters
+    python -m src.db.backfill_conversation_counters --batch-size 200 --after <uuid>
+"""
+
+import argparse
+import os
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+
+NEXT_BATCH_SQL = """
+    SELECT id FROM conversations
+    WHERE %(after)s::uuid IS NULL OR id > %(after)s::uuid
+    ORDER BY id
+    LIMIT %(limit)s
+"""
+
+BACKFILL_SQL = """
+    UPDATE conversations c
+    SET message_count = COALESCE(stats.message_count, 0),
+        last_message_at = stats.last_message_at,
+        last_message_preview = last_msg.preview
+    FROM unnest(%(ids)s::uuid[]) AS batch(id)
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS message_count, MAX(m.created_at) AS last_message_at
+        FROM messages m WHERE m.conversation_id = batch.id
+    ) stats ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT LEFT(m.content, 200) AS preview
+        FROM messages m WHERE m.conversation_id = batch.id
+        ORDER BY m.created_at DESC LIMIT 1
+    ) last_msg ON TRUE
+    WHERE c.id = batch.id
+"""
+
+
+def backfill(dsn: str, batch_size: int = BATCH_SIZE, after: str = None) -> int:
+    total = 0
+    started = time.perf_counter()
+    # psycopg2's `with conn` only ends the transaction; the connection is closed here
+    conn = psycopg2.connect(dsn)
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(NEXT_BATCH_SQL, {"after": after, "limit": batch_size})
+                ids = [row[0] for row in cur.fetchall()]
+                if not ids:
+                    break
+                cur.execute(BACKFILL_SQL, {"ids": ids})
+            conn.commit()
+            total += len(ids)
+            after = ids[-1]
+            print(f"✅ {total} conversations backfilled ({total / (time.perf_counter() - started):.0f}/s), last id {after}")
+    finally:
+        conn.close()
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill denormalised conversation counters")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--after", default=None, help="resume after this conversation id")
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        raise RuntimeError("Missing DATABASE_URL in .env")
+    print("🚀 Backfilling conversation counters...")
+    count = backfill(DATABASE_URL, args.batch_size, args.after)
+    print(f"🎉 Done: {count} conversations")
@@ -3,30 +3,104 @@ Chat history management with Supabase (RLS-safe)
 All functions take a user-scoped Supabase Client (with JWT) to satisfy RLS.
 """
 
-from datetime import datetime
-from typing import List, Dict, Optional
+import base64
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import uuid
+from postgrest.exceptions import APIError
 from supabase import Client
 
+from src.observability.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+# Message columns the UIs render; user_id is implied by RLS
+MESSAGE_COLUMNS = 'id,conversation_id,role,content,metadata,created_at'
+
+# Postgres/PostgREST codes for a column or function a migration has not created yet
+_MISSING_SCHEMA_CODES = {'42703', '42883', 'PGRST202', 'PGRST204'}
+
+
+def _schema_missing(e: APIError) -> bool:
+    """True when the error only says the database predates a migration."""
+    return e.code in _MISSING_SCHEMA_CODES
+
 # --------------------------- Conversation Management ---------------------------
 
+@traced("chat_history.create_new_conversation")
 def create_new_conversation(sb: Client, user_id: str, title: Optional[str] = None) -> str:
     """Create a new conversation for a user."""
     conversation_id = str(uuid.uuid4())
     if not title:
         title = f"Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    now = datetime.now(timezone.utc).isoformat()
     sb.table('conversations').insert({
         'id': conversation_id,
         'user_id': user_id,  # must match auth.uid() in JWT
         'title': title,
-        'created_at': datetime.utcnow().isoformat(),
-        'updated_at': datetime.utcnow().isoformat()
+        'created_at': now,
+        'updated_at': now
     }).execute()
     return conversation_id
 
 
+@traced("chat_history.get_user_conversations")
 def get_user_conversations(sb: Client, user_id: str, limit: int = 20) -> List[Dict]:
     """Get all conversations for a user, sorted by most recent."""
+    try:
+        # Counters are kept on the row by triggers: see migrations/conversation_counters.sql
+        result = sb.table('conversations')\
+            .select('id,title,created_at,updated_at,message_count,last_message_preview')\
+            .eq('user_id', user_id)\
+            .order('updated_at', desc=True)\
+            .limit(limit)\
+            .execute()
+    except APIError as e:
+        if not _schema_missing(e):
+            raise
+        logger.warning("conversation counters unavailable (%s); falling back to list_user_conversations", e)
+        return _get_user_conversations_rpc(sb, user_id, limit)
+
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'message_count': row['message_count'] or 0,
+            'last_message': row['last_message_preview'] if row['last_message_preview'] is not None else 'No messages'
+        }
+        for row in (result.data or [])
+    ]
+
+
+def _get_user_conversations_rpc(sb: Client, user_id: str, limit: int = 20) -> List[Dict]:
+    """Listing for databases without the counter columns: one RPC round trip."""
+    try:
+        # See migrations/list_user_conversations.sql
+        result = sb.rpc('list_user_conversations', {'p_user_id': user_id, 'p_limit': limit}).execute()
+    except APIError as e:
+        if not _schema_missing(e):
+            raise
+        logger.warning("list_user_conversations RPC unavailable (%s); using per-conversation queries", e)
+        return _get_user_conversations_per_row(sb, user_id, limit)
+
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'message_count': row['message_count'] or 0,
+            'last_message': row['last_message'] if row['last_message'] is not None else 'No messages'
+        }
+        for row in (result.data or [])
+    ]
+
+
+def _get_user_conversations_per_row(sb: Client, user_id: str, limit: int = 20) -> List[Dict]:
+    """Listing for databases without the RPC: 1 + 2 round trips per conversation."""
     result = sb.table('conversations')\
         .select('id,title,created_at,updated_at')\
         .eq('user_id', user_id)\
@@ -35,40 +109,38 @@ def get_user_conversations(sb: Client, user_id: str, limit: int = 20) -> List[Di
         .execute()
 
     conversations = []
-    ids = [c['id'] for c in result.data] if result.data else []
-
-    # last message & counts in a second pass (keeps select simple)
-    for conv_id in ids:
+    for conv in result.data or []:
         last = sb.table('messages')\
             .select('content')\
-            .eq('conversation_id', conv_id)\
+            .eq('conversation_id', conv['id'])\
             .order('created_at', desc=True)\
             .limit(1)\
             .execute()
         count = sb.table('messages').select('id', count='exact')\
-            .eq('conversation_id', conv_id).execute()
+            .eq('conversation_id', conv['id']).execute()
         conversations.append({
-            'id': conv_id,
-            'title': next((c['title'] for c in result.data if c['id'] == conv_id), ''),
-            'created_at': next((c['created_at'] for c in result.data if c['id'] == conv_id), None),
-            'updated_at': next((c['updated_at'] for c in result.data if c['id'] == conv_id), None),
+            'id': conv['id'],
+            'title': conv['title'],
+            'created_at': conv['created_at'],
+            'updated_at': conv['updated_at'],
             'message_count': count.count if hasattr(count, 'count') else 0,
             'last_message': (last.data[0]['content'] if last.data else 'No messages')
         })
     return conversations
 
 
+@traced("chat_history.update_conversation_timestamp")
 def update_conversation_timestamp(sb: Client, conversation_id: str):
     """Update the conversation's last updated timestamp."""
     sb.table('conversations').update({
-        'updated_at': datetime.utcnow().isoformat()
+        'updated_at': datetime.now(timezone.utc).isoformat()
     }).eq('id', conversation_id).execute()
 
 
+@traced("chat_history.delete_conversation")
 def delete_conversation(sb: Client, conversation_id: str, user_id: str) -> bool:
-    """Delete a conversation and all its messages."""
+    """Delete a conversation; its messages go with it (ON DELETE CASCADE)."""
     try:
-        sb.table('messages').delete().eq('conversation_id', conversation_id).execute()
         sb.table('conversations').delete().eq('id', conversation_id).eq('user_id', user_id).execute()
         return True
     except Exception:
@@ -77,48 +149,223 @@ def delete_conversation(sb: Client, conversation_id: str, user_id: str) -> bool:
 
 # --------------------------- Message Management ---------------------------
 
-def save_message(
-    sb: Client,
+def parse_timestamp(value) -> datetime:
+    """ISO string or datetime -> aware datetime; naive values are taken as UTC."""
+    dt = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def message_row(
     conversation_id: str,
     user_id: str,
     role: str,
     content: str,
-    metadata: Optional[Dict] = None
-) -> str:
-    """Save a message to the database."""
-    message_id = str(uuid.uuid4())
-    sb.table('messages').insert({
-        'id': message_id,
+    metadata: Optional[Dict] = None,
+    created_at: Optional[datetime] = None
+) -> Dict:
+    """A messages row with a client-generated id, ready to insert."""
+    return {
+        'id': str(uuid.uuid4()),
         'conversation_id': conversation_id,
         'user_id': user_id,  # must match auth.uid() in JWT
         'role': role,
         'content': content,
         'metadata': metadata or {},
-        'created_at': datetime.utcnow().isoformat()
-    }).execute()
+        # Explicit offset: timestamptz would otherwise read a naive value in the server's zone
+        'created_at': parse_timestamp(created_at or datetime.now(timezone.utc)).isoformat()
+    }
+
+
+def turn_rows(
+    conversation_id: str,
+    user_id: str,
+    question: str,
+    answer: str,
+    metadata: Optional[Dict] = None,
+    asked_at: Optional[datetime] = None
+) -> List[Dict]:
+    """The question and answer rows for one turn."""
+    answered_at = datetime.now(timezone.utc)
+    # Keep the question strictly older so history ordering by created_at is stable
+    asked_at = min(parse_timestamp(asked_at or answered_at), answered_at - timedelta(microseconds=1))
+    return [
+        message_row(conversation_id, user_id, 'user', question, created_at=asked_at),
+        message_row(conversation_id, user_id, 'assistant', answer, metadata, created_at=answered_at),
+    ]
+
+
+@traced("chat_history.save_message")
+def save_message(
+    sb: Client,
+    conversation_id: str,
+    user_id: str,
+    role: str,
+    content: str,
+    metadata: Optional[Dict] = None
+) -> str:
+    """Save a message to the database."""
+    row = message_row(conversation_id, user_id, role, content, metadata)
+    sb.table('messages').insert(row).execute()
+    # conversations.updated_at is bumped by trigger_update_conversation_timestamp
+    return row['id']
+
+
+@traced("chat_history.save_turn")
+def save_turn(
+    sb: Client,
+    conversation_id: str,
+    user_id: str,
+    question: str,
+    answer: str,
+    metadata: Optional[Dict] = None,
+    asked_at: Optional[datetime] = None
+) -> List[str]:
+    """Save a question and its answer in one request. Returns [question_id, answer_id]."""
+    rows = turn_rows(conversation_id, user_id, question, answer, metadata, asked_at)
+    sb.table('messages').insert(rows).execute()
+    return [r['id'] for r in rows]
+
 
-    update_conversation_timestamp(sb, conversation_id)
-    return message_id
+@traced("chat_history.insert_messages")
+def insert_messages(sb: Client, rows: List[Dict]):
+    """Insert prepared rows in one request; rows whose id already exists are skipped."""
+    sb.table('messages').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
 
 
+@traced("chat_history.get_conversation_history")
 def get_conversation_history(sb: Client, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
-    """Get all messages for a conversation."""
+    """Get all messages for a conversation (use get_conversation_page for long threads)."""
     query = sb.table('messages')\
-        .select('*')\
+        .select(MESSAGE_COLUMNS)\
         .eq('conversation_id', conversation_id)\
-        .order('created_at', desc=False)
+        .order('created_at', desc=False)\
+        .order('id', desc=False)
     if limit:
         query = query.limit(limit)
     res = query.execute()
     return res.data or []
 
 
-def get_user_chat_history(sb: Client, user_id: str, limit: int = 50) -> List[Dict]:
-    """Get recent chat history for a user across all conversations."""
-    res = sb.table('messages')\
-        .select('*')\
-        .eq('user_id', user_id)\
+# --------------------------- Pagination ---------------------------
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque (created_at, id) position of a message."""
+    return base64.urlsafe_b64encode(f"{row['created_at']}|{row['id']}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    return created_at, message_id
+
+
+def _keyset(query, cursor: str, older: bool):
+    """Rows strictly before/after `cursor` in (created_at, id) order.
+
+    The plain created_at bound is what lets Postgres range-scan
+    idx_messages_conv_created; the OR only breaks ties on the same timestamp.
+    """
+    created_at, message_id = decode_cursor(cursor)
+    op = 'lt' if older else 'gt'
+    query = query.lte('created_at', created_at) if older else query.gte('created_at', created_at)
+    return query.or_(f'created_at.{op}."{created_at}",id.{op}.{message_id}')
+
+
+@traced("chat_history.get_conversation_page")
+def get_conversation_page(
+    sb: Client,
+    conversation_id: str,
+    limit: int = 30,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    columns: str = MESSAGE_COLUMNS
+) -> Dict:
+    """
+    One page of a conversation, oldest first.
+
+    No cursor gives the newest page; `before` pages back towards the start
+    and `after` fetches messages newer than a previous page. Returns
+    {'messages', 'older', 'newer', 'has_more'}: pass `older` as `before` to
+    load the previous page (None at the start of the conversation) and
+    `newer` as `after` to pick up new messages. `has_more` says whether more
+    rows exist in the direction just read.
+    """
+    forward = after is not None
+    query = sb.table('messages').select(columns).eq('conversation_id', conversation_id)
+    if forward:
+        query = _keyset(query, after, older=False)
+    elif before is not None:
+        query = _keyset(query, before, older=True)
+    res = query\
+        .order('created_at', desc=not forward)\
+        .order('id', desc=not forward)\
+        .limit(limit + 1)\
+        .execute()
+
+    return _page_result(res.data or [], limit, forward, after)
+
+
+def _page_result(rows: List[Dict], limit: int, forward: bool, after: Optional[str]) -> Dict:
+    """Shape limit + 1 rows read in query order into a get_conversation_page result."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    return {
+        'messages': rows,
+        'older': encode_cursor(rows[0]) if rows and (forward or has_more) else None,
+        'newer': encode_cursor(rows[-1]) if rows else after,
+        'has_more': has_more,
+    }
+
+
+@traced("chat_history.get_user_chat_history")
+def get_user_chat_history(sb: Client, user_id: str, limit: int = 50, before: Optional[str] = None) -> List[Dict]:
+    """Get recent chat history for a user across all conversations, newest first.
+
+    Pass encode_cursor(last row) as `before` to continue further back.
+    """
+    query = sb.table('messages')\
+        .select(MESSAGE_COLUMNS)\
+        .eq('user_id', user_id)
+    if before is not None:
+        query = _keyset(query, before, older=True)
+    res = query\
         .order('created_at', desc=True)\
+        .order('id', desc=True)\
         .limit(limit)\
         .execute()
     return res.data or []
+
+
+# --------------------------- Search ---------------------------
+
+SEARCH_PAGE_MAX = 50
+
+
+@traced("chat_history.search_messages")
+def search_messages(sb: Client, user_id: str, query: str, limit: int = 10, offset: int = 0) -> Dict:
+    """
+    Full-text search over the user's messages, best match first.
+
+    `query` accepts web-search syntax ("quoted phrase", -exclude, or).
+    Returns {'results', 'next_offset'}; each result has message_id,
+    conversation_id, conversation_title, role, created_at, rank, a snippet
+    with matches in **bold**, and `context` (the question for an answer hit,
+    the start of the answer for a question hit). `next_offset` is None on
+    the last page. See migrations/search_messages.sql.
+    """
+    query = (query or '').strip()
+    if not query:
+        return {'results': [], 'next_offset': None}
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    res = sb.rpc('search_messages', {
+        'p_user_id': user_id,
+        'p_query': query,
+        'p_limit': limit + 1,  # one extra row tells us whether there is another page
+        'p_offset': offset,
+    }).execute()
+    rows = res.data or []
+    return {
+        'results': rows[:limit],
+        'next_offset': offset + limit if len(rows) > limit else None,
+    }
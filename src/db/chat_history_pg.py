@@ -0,0 +1,373 @@
+"""
+Chat history straight over Postgres (asyncpg) instead of PostgREST.
+
+Same functions, arguments and return shapes as chat_history.py (ids and
+timestamps as strings, interchangeable page cursors), but async and with a
+PgClient in place of the Supabase client:
+
+    db = PgClient(user_id)
+    page = await get_conversation_page(db, conversation_id)
+
+Each event loop gets its own connection pool (CHAT_DATABASE_URL, falling
+back to DATABASE_URL). asyncpg prepares every statement once per connection
+and reuses it; set CHAT_PG_STATEMENT_CACHE_SIZE=0 behind a transaction-mode
+pooler (PgBouncer / Supavisor port 6543), which cannot keep them.
+
+The connection's role normally bypasses RLS, so every statement is scoped to
+db.user_id and writes for another user raise PermissionError, which is what
+the RLS policies enforce on the PostgREST path.
+
+`sync` holds blocking versions of every function for code without an event
+loop (the write-behind worker, Streamlit); they run on a private loop thread.
+Requires migrations/conversation_counters.sql and search_messages.sql.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import uuid
+import weakref
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from src.db.chat_history import (
+    MESSAGE_COLUMNS, SEARCH_PAGE_MAX, _page_result, decode_cursor, message_row, parse_timestamp, turn_rows,
+)
+from src.observability.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("CHAT_DATABASE_URL") or os.getenv("DATABASE_URL")
+POOL_MIN_SIZE = int(os.getenv("CHAT_PG_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("CHAT_PG_POOL_MAX", "10"))
+STATEMENT_CACHE_SIZE = int(os.getenv("CHAT_PG_STATEMENT_CACHE_SIZE", "256"))
+COMMAND_TIMEOUT = float(os.getenv("CHAT_PG_COMMAND_TIMEOUT", "30"))
+
+_MESSAGE_FIELDS = set(MESSAGE_COLUMNS.split(',')) | {'user_id'}
+
+
+class PgClient:
+    """Stands in for the user-scoped Supabase client: whose rows may be touched."""
+
+    def __init__(self, user_id: str):
+        self.user_id = str(user_id)
+
+    def check(self, user_id: str):
+        if str(user_id) != self.user_id:
+            raise PermissionError("row belongs to another user")
+
+    def __repr__(self):
+        return f"PgClient(user_id={self.user_id!r})"
+
+
+# --------------------------- Pool ---------------------------
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncpg.Pool]" = weakref.WeakKeyDictionary()
+_pool_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+
+async def _init_connection(conn):
+    for typ in ('json', 'jsonb'):
+        await conn.set_type_codec(typ, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+
+async def get_pool() -> asyncpg.Pool:
+    """The running loop's pool, created on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None:
+        return pool
+    lock = _pool_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        if loop not in _pools:
+            if not DATABASE_URL:
+                raise RuntimeError("Missing CHAT_DATABASE_URL / DATABASE_URL for the postgres chat-history backend")
+            _pools[loop] = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+                statement_cache_size=STATEMENT_CACHE_SIZE,
+                command_timeout=COMMAND_TIMEOUT,
+                init=_init_connection,
+            )
+        return _pools[loop]
+
+
+async def close_pool():
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+# --------------------------- Values ---------------------------
+
+def _value(v):
+    if isinstance(v, uuid.UUID):
+        return str(v)
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def _row(record) -> Dict:
+    """asyncpg Record -> the dict PostgREST would have returned."""
+    return {k: _value(v) for k, v in record.items()}
+
+
+def _columns(columns: str) -> str:
+    names = [c.strip() for c in columns.split(',')]
+    unknown = set(names) - _MESSAGE_FIELDS
+    if unknown:
+        raise ValueError(f"unknown message columns: {sorted(unknown)}")
+    return ', '.join(names)
+
+
+# --------------------------- Conversation Management ---------------------------
+
+@traced("chat_history_pg.create_new_conversation")
+async def create_new_conversation(db: PgClient, user_id: str, title: Optional[str] = None) -> str:
+    """Create a new conversation for a user."""
+    db.check(user_id)
+    conversation_id = str(uuid.uuid4())
+    if not title:
+        title = f"Conversation {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    now = datetime.now(timezone.utc)
+    pool = await get_pool()
+    await pool.execute(
+        "INSERT INTO conversations (id, user_id, title, created_at, updated_at) VALUES ($1, $2, $3, $4, $4)",
+        conversation_id, db.user_id, title, now,
+    )
+    return conversation_id
+
+
+@traced("chat_history_pg.get_user_conversations")
+async def get_user_conversations(db: PgClient, user_id: str, limit: int = 20) -> List[Dict]:
+    """Get all conversations for a user, sorted by most recent."""
+    db.check(user_id)
+    pool = await get_pool()
+    rows = await pool.fetch("""
+        SELECT id, title, created_at, updated_at, message_count, last_message_preview
+        FROM conversations
+        WHERE user_id = $1
+        ORDER BY updated_at DESC
+        LIMIT $2
+    """, db.user_id, limit)
+    return [
+        {
+            'id': str(row['id']),
+            'title': row['title'],
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+            'message_count': row['message_count'] or 0,
+            'last_message': row['last_message_preview'] if row['last_message_preview'] is not None else 'No messages'
+        }
+        for row in rows
+    ]
+
+
+@traced("chat_history_pg.update_conversation_timestamp")
+async def update_conversation_timestamp(db: PgClient, conversation_id: str):
+    """Update the conversation's last updated timestamp."""
+    pool = await get_pool()
+    await pool.execute(
+        "UPDATE conversations SET updated_at = NOW() WHERE id = $1 AND user_id = $2",
+        conversation_id, db.user_id,
+    )
+
+
+@traced("chat_history_pg.delete_conversation")
+async def delete_conversation(db: PgClient, conversation_id: str, user_id: str) -> bool:
+    """Delete a conversation; its messages go with it (ON DELETE CASCADE)."""
+    try:
+        db.check(user_id)
+        pool = await get_pool()
+        await pool.execute("DELETE FROM conversations WHERE id = $1 AND user_id = $2", conversation_id, db.user_id)
+        return True
+    except Exception:
+        return False
+
+
+# --------------------------- Message Management ---------------------------
+
+# One statement for any number of rows; the arrays are bound as parameters
+INSERT_MESSAGES_SQL = """
+    INSERT INTO messages (id, conversation_id, user_id, role, content, metadata, created_at)
+    SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::uuid[], $4::text[], $5::text[], $6::jsonb[], $7::timestamptz[])
+"""
+
+
+async def _insert(db: PgClient, rows: List[Dict], ignore_duplicates: bool = False):
+    for r in rows:
+        db.check(r['user_id'])
+    sql = INSERT_MESSAGES_SQL + (" ON CONFLICT (id) DO NOTHING" if ignore_duplicates else "")
+    pool = await get_pool()
+    await pool.execute(
+        sql,
+        [r['id'] for r in rows],
+        [r['conversation_id'] for r in rows],
+        [r['user_id'] for r in rows],
+        [r['role'] for r in rows],
+        [r['content'] for r in rows],
+        [r.get('metadata') or {} for r in rows],
+        [parse_timestamp(r['created_at']) for r in rows],
+    )
+
+
+@traced("chat_history_pg.save_message")
+async def save_message(
+    db: PgClient,
+    conversation_id: str,
+    user_id: str,
+    role: str,
+    content: str,
+    metadata: Optional[Dict] = None
+) -> str:
+    """Save a message to the database."""
+    row = message_row(conversation_id, user_id, role, content, metadata)
+    await _insert(db, [row])
+    return row['id']
+
+
+@traced("chat_history_pg.save_turn")
+async def save_turn(
+    db: PgClient,
+    conversation_id: str,
+    user_id: str,
+    question: str,
+    answer: str,
+    metadata: Optional[Dict] = None,
+    asked_at: Optional[datetime] = None
+) -> List[str]:
+    """Save a question and its answer in one statement. Returns [question_id, answer_id]."""
+    rows = turn_rows(conversation_id, user_id, question, answer, metadata, asked_at)
+    await _insert(db, rows)
+    return [r['id'] for r in rows]
+
+
+@traced("chat_history_pg.insert_messages")
+async def insert_messages(db: PgClient, rows: List[Dict]):
+    """Insert prepared rows in one statement; rows whose id already exists are skipped."""
+    await _insert(db, rows, ignore_duplicates=True)
+
+
+@traced("chat_history_pg.get_conversation_history")
+async def get_conversation_history(db: PgClient, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+    """Get all messages for a conversation (use get_conversation_page for long threads)."""
+    pool = await get_pool()
+    rows = await pool.fetch(f"""
+        SELECT {_columns(MESSAGE_COLUMNS)} FROM messages
+        WHERE conversation_id = $1 AND user_id = $2
+        ORDER BY created_at, id
+        LIMIT $3
+    """, conversation_id, db.user_id, limit)
+    return [_row(r) for r in rows]
+
+
+# --------------------------- Pagination ---------------------------
+
+@traced("chat_history_pg.get_conversation_page")
+async def get_conversation_page(
+    db: PgClient,
+    conversation_id: str,
+    limit: int = 30,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    columns: str = MESSAGE_COLUMNS
+) -> Dict:
+    """One page of a conversation, oldest first; see chat_history.get_conversation_page."""
+    forward = after is not None
+    cursor = after if forward else before
+    keyset, params = "", [conversation_id, db.user_id, limit + 1]
+    if cursor is not None:
+        created_at, message_id = decode_cursor(cursor)
+        keyset = f"AND (created_at, id) {'>' if forward else '<'} ($4, $5)"
+        params += [parse_timestamp(created_at), uuid.UUID(message_id)]
+    direction = "ASC" if forward else "DESC"
+    pool = await get_pool()
+    rows = await pool.fetch(f"""
+        SELECT {_columns(columns)} FROM messages
+        WHERE conversation_id = $1 AND user_id = $2 {keyset}
+        ORDER BY created_at {direction}, id {direction}
+        LIMIT $3
+    """, *params)
+    return _page_result([_row(r) for r in rows], limit, forward, after)
+
+
+@traced("chat_history_pg.get_user_chat_history")
+async def get_user_chat_history(db: PgClient, user_id: str, limit: int = 50, before: Optional[str] = None) -> List[Dict]:
+    """Get recent chat history for a user across all conversations, newest first."""
+    db.check(user_id)
+    params = [db.user_id, limit]
+    keyset = ""
+    if before is not None:
+        created_at, message_id = decode_cursor(before)
+        keyset = "AND (created_at, id) < ($3, $4)"
+        params += [parse_timestamp(created_at), uuid.UUID(message_id)]
+    pool = await get_pool()
+    rows = await pool.fetch(f"""
+        SELECT {_columns(MESSAGE_COLUMNS)} FROM messages
+        WHERE user_id = $1 {keyset}
+        ORDER BY created_at DESC, id DESC
+        LIMIT $2
+    """, *params)
+    return [_row(r) for r in rows]
+
+
+# --------------------------- Search ---------------------------
+
+@traced("chat_history_pg.search_messages")
+async def search_messages(db: PgClient, user_id: str, query: str, limit: int = 10, offset: int = 0) -> Dict:
+    """Full-text search over the user's messages; see chat_history.search_messages."""
+    db.check(user_id)
+    query = (query or '').strip()
+    if not query:
+        return {'results': [], 'next_offset': None}
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    pool = await get_pool()
+    rows = await pool.fetch("SELECT * FROM search_messages($1, $2, $3, $4)", db.user_id, query, limit + 1, offset)
+    return {
+        'results': [_row(r) for r in rows[:limit]],
+        'next_offset': offset + limit if len(rows) > limit else None,
+    }
+
+
+# --------------------------- Blocking API ---------------------------
+
+class _LoopThread:
+    """Private event loop on a daemon thread, for callers that cannot await."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="chat-history-pg", daemon=True).start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_loop_thread: Optional[_LoopThread] = None
+_loop_lock = threading.Lock()
+
+
+def _blocking(fn):
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        global _loop_thread
+        if _loop_thread is None:
+            with _loop_lock:
+                if _loop_thread is None:
+                    _loop_thread = _LoopThread()
+        return _loop_thread.run(fn(*args, **kwargs))
+    return call
+
+
+sync = SimpleNamespace(**{fn.__name__: _blocking(fn) for fn in (
+    create_new_conversation, get_user_conversations, update_conversation_timestamp, delete_conversation,
+    save_message, save_turn, insert_messages, get_conversation_history, get_conversation_page,
+    get_user_chat_history, search_messages,
+)})
@@ -0,0 +1,298 @@
+"""
+Streaming export and import of chat history as NDJSON (see archive.py for
+the format; a ".gz" suffix compresses).
+
+Exports page through conversations (keyset on id) and, alongside them,
+all of the user's messages (keyset on conversation_id, created_at, id),
+merging the two streams and writing every page as it arrives: a page of
+requests per page of rows, not one per conversation, and memory stays
+flat however long the history is. Imports stream the file
+back in batched, idempotent inserts: rows whose id already exists are
+skipped, so an interrupted import can simply be re-run.
+
+Two sources, same format:
+
+- a user-scoped Supabase client (RLS), for "download my history":
+      export_user_history(sb, user_id, "legabot-history.ndjson.gz")
+      import_user_history(sb, user_id, "legabot-history.ndjson.gz")
+- a direct Postgres connection (DATABASE_URL), for compliance exports of
+  one user or everyone, and for restoring retention archives:
+      python -m src.db.export export --user-id <uuid> --out exports/user.ndjson.gz
+      python -m src.db.export export --out exports/all.ndjson.gz
+      python -m src.db.export import exports/user.ndjson.gz
+
+Conversation counters (message_count, last_message_*) are not exported;
+the message triggers rebuild them on import. Imported conversations keep
+their original updated_at.
+"""
+
+import argparse
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from supabase import Client
+
+from src.db.archive import NDJSONWriter, read_ndjson
+from src.db.chat_history import _keyset, encode_cursor
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+CONVERSATION_FIELDS = ["id", "user_id", "title", "created_at", "updated_at", "metadata"]
+MESSAGE_FIELDS = ["id", "conversation_id", "user_id", "role", "content", "metadata", "created_at"]
+
+
+# --------------------------- Sources ---------------------------
+
+class _SupabaseStore:
+    """Reads and writes through PostgREST as the signed-in user."""
+
+    def __init__(self, sb: Client):
+        self.sb = sb
+
+    def conversations(self, user_id: Optional[str], after: Optional[str], limit: int) -> List[Dict]:
+        query = self.sb.table('conversations').select(','.join(CONVERSATION_FIELDS)).eq('user_id', user_id)
+        if after is not None:
+            query = query.gt('id', after)
+        return query.order('id').limit(limit).execute().data or []
+
+    def messages(self, user_id: Optional[str], after: Optional[Dict], limit: int) -> List[Dict]:
+        def select():
+            return self.sb.table('messages').select(','.join(MESSAGE_FIELDS)).eq('user_id', user_id)
+
+        def page(query, n: int) -> List[Dict]:
+            return query.order('conversation_id').order('created_at').order('id').limit(n).execute().data or []
+
+        if after is None:
+            return page(select(), limit)
+        # The rest of `after`'s conversation, then the next ones: two flat filters instead of a nested OR
+        conversation_id = after['conversation_id']
+        rows = page(_keyset(select().eq('conversation_id', conversation_id), encode_cursor(after), older=False), limit)
+        if len(rows) < limit:
+            rows += page(select().gt('conversation_id', conversation_id), limit - len(rows))
+        return rows
+
+    def insert_conversations(self, rows: List[Dict]) -> List[str]:
+        res = self.sb.table('conversations').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+        return [r['id'] for r in res.data or []]
+
+    def insert_messages(self, rows: List[Dict]) -> int:
+        res = self.sb.table('messages').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+        return len(res.data or [])
+
+    def restore_updated_at(self, rows: List[Dict]):
+        # The message insert trigger sets updated_at = NOW(); put the exported value back
+        for r in rows:
+            self.sb.table('conversations').update({'updated_at': r['updated_at']}).eq('id', r['id']).execute()
+
+    def commit(self):
+        pass
+
+
+class _PostgresStore:
+    """Same operations over a direct psycopg2 connection (bypasses RLS)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _fetch(self, sql: str, params) -> List[Dict]:
+        with self.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        self.conn.commit()  # no snapshot held open between pages
+        return rows
+
+    def conversations(self, user_id: Optional[str], after: Optional[str], limit: int) -> List[Dict]:
+        return self._fetch(f"""
+            SELECT {', '.join(CONVERSATION_FIELDS)} FROM conversations
+            WHERE (%(user_id)s::uuid IS NULL OR user_id = %(user_id)s::uuid)
+              AND (%(after)s::uuid IS NULL OR id > %(after)s::uuid)
+            ORDER BY id
+            LIMIT %(limit)s
+        """, {"user_id": user_id, "after": after, "limit": limit})
+
+    def messages(self, user_id: Optional[str], after: Optional[Dict], limit: int) -> List[Dict]:
+        return self._fetch(f"""
+            SELECT {', '.join(MESSAGE_FIELDS)} FROM messages
+            WHERE (%(user_id)s::uuid IS NULL OR user_id = %(user_id)s::uuid)
+              AND (%(id)s::uuid IS NULL OR (conversation_id, created_at, id)
+                   > (%(conversation_id)s::uuid, %(created_at)s::timestamptz, %(id)s::uuid))
+            ORDER BY conversation_id, created_at, id
+            LIMIT %(limit)s
+        """, {
+            "user_id": user_id, "limit": limit,
+            **{k: after[k] if after else None for k in ("conversation_id", "created_at", "id")},
+        })
+
+    def _insert(self, table: str, fields: List[str], rows: List[Dict]) -> List[str]:
+        """Multi-row INSERT ... ON CONFLICT DO NOTHING; returns the ids actually inserted."""
+        sql = f"INSERT INTO {table} ({', '.join(fields)}) VALUES %s ON CONFLICT (id) DO NOTHING RETURNING id"
+        values = [tuple(psycopg2.extras.Json(r[f]) if f == "metadata" else r[f] for f in fields) for r in rows]
+        with self.conn.cursor() as cur:
+            inserted = psycopg2.extras.execute_values(cur, sql, values, page_size=len(values), fetch=True)
+        return [str(row[0]) for row in inserted]
+
+    def insert_conversations(self, rows: List[Dict]) -> List[str]:
+        return self._insert("conversations", CONVERSATION_FIELDS, rows)
+
+    def insert_messages(self, rows: List[Dict]) -> int:
+        return len(self._insert("messages", MESSAGE_FIELDS, rows))
+
+    def restore_updated_at(self, rows: List[Dict]):
+        with self.conn.cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                UPDATE conversations c SET updated_at = v.updated_at::timestamptz
+                FROM (VALUES %s) AS v(id, updated_at) WHERE c.id = v.id::uuid
+            """, [(r["id"], r["updated_at"]) for r in rows])
+
+    def commit(self):
+        self.conn.commit()
+
+
+# --------------------------- Export ---------------------------
+
+def _iter_conversations(store, user_id: Optional[str], page_size: int) -> Iterator[Dict]:
+    after = None
+    while True:
+        page = store.conversations(user_id, after, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        after = page[-1]["id"]
+
+
+def _iter_messages(store, user_id: Optional[str], page_size: int) -> Iterator[Dict]:
+    after = None
+    while True:
+        page = store.messages(user_id, after, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        after = page[-1]
+
+
+def _iter_history(store, user_id: Optional[str], page_size: int) -> Iterator[tuple]:
+    """("conversation", row) followed by its ("message", row)s, one page of each in memory at a time."""
+    # Both streams are in conversation id order, so they merge like a sorted join
+    messages = _iter_messages(store, user_id, page_size)
+    msg = next(messages, None)
+    for conv in _iter_conversations(store, user_id, page_size):
+        yield "conversation", conv
+        while msg is not None and msg["conversation_id"] <= conv["id"]:
+            if msg["conversation_id"] == conv["id"]:
+                yield "message", msg
+            msg = next(messages, None)  # else its conversation is not being exported
+
+
+def _export(store, user_id: Optional[str], path, page_size: int) -> Dict:
+    started = time.perf_counter()
+    with NDJSONWriter(path) as writer:
+        for kind, row in _iter_history(store, user_id, page_size):
+            writer.write(kind, row)
+            if kind == "conversation" and writer.counts["conversation"] % 1000 == 0:
+                logger.info("exported %s conversations, %s messages", writer.counts["conversation"], writer.counts["message"])
+    return {**writer.counts, "path": str(path), "elapsed_s": round(time.perf_counter() - started, 2)}
+
+
+def export_user_history(sb: Client, user_id: str, path, page_size: int = PAGE_SIZE) -> Dict:
+    """Write all of a user's conversations and messages to `path`. Returns counts."""
+    return _export(_SupabaseStore(sb), user_id, path, page_size)
+
+
+# --------------------------- Import ---------------------------
+
+def _import(store, records: Iterable[Dict], batch_size: int, user_id: Optional[str] = None) -> Dict:
+    counts = {"conversation": 0, "message": 0, "skipped": 0}
+    conversations: List[Dict] = []
+    messages: List[Dict] = []
+    # Conversations created by this import, with the updated_at to put back.
+    # Records are grouped by conversation, so only the newest can still get
+    # messages in a later batch; older entries are dropped after each flush.
+    created: Dict[str, Dict] = {}
+
+    def flush():
+        if conversations:
+            new_ids = set(store.insert_conversations(conversations))
+            created.update({c["id"]: c for c in conversations if c["id"] in new_ids})
+            counts["conversation"] += len(new_ids)
+            counts["skipped"] += len(conversations) - len(new_ids)
+        if messages:
+            inserted = store.insert_messages(messages)
+            counts["message"] += inserted
+            counts["skipped"] += len(messages) - inserted
+        touched = [{"id": cid, "updated_at": created[cid]["updated_at"]}
+                   for cid in {m["conversation_id"] for m in messages} if cid in created]
+        if touched:
+            store.restore_updated_at(touched)
+        store.commit()
+        current = (conversations[-1]["id"] if conversations
+                   else messages[-1]["conversation_id"] if messages else None)
+        for cid in list(created):
+            if cid != current:
+                del created[cid]
+        conversations.clear()
+        messages.clear()
+
+    for record in records:
+        kind = record.pop("type", None)
+        if kind == "conversation":
+            row = {f: record.get(f) for f in CONVERSATION_FIELDS}
+            target = conversations
+        elif kind == "message":
+            row = {f: record.get(f) for f in MESSAGE_FIELDS}
+            target = messages
+        else:
+            continue
+        row["metadata"] = row.get("metadata") or {}
+        if user_id is not None:
+            row["user_id"] = user_id  # RLS only accepts the caller's own rows
+        target.append(row)
+        if len(conversations) + len(messages) >= batch_size:
+            flush()
+    flush()
+    return counts
+
+
+def import_user_history(sb: Client, user_id: str, path, batch_size: int = BATCH_SIZE) -> Dict:
+    """Load an export into the signed-in user's account. Returns counts."""
+    return _import(_SupabaseStore(sb), read_ndjson(path), batch_size, user_id)
+
+
+# --------------------------- CLI (direct Postgres) ---------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream chat history to/from NDJSON (.gz) over DATABASE_URL")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="defaults to DATABASE_URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+    exp = commands.add_parser("export", help="write conversations and messages to a file")
+    exp.add_argument("--out", required=True)
+    exp.add_argument("--user-id", default=None, help="one user (default: everyone)")
+    exp.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    imp = commands.add_parser("import", help="load an export or retention archive")
+    imp.add_argument("path")
+    imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        raise RuntimeError("Missing DATABASE_URL in .env")
+    logging.basicConfig(level=logging.INFO)
+    conn = psycopg2.connect(args.dsn)
+    try:
+        store = _PostgresStore(conn)
+        if args.command == "export":
+            result = _export(store, args.user_id, args.out, args.page_size)
+        else:
+            result = _import(store, read_ndjson(args.path), args.batch_size)
+    finally:
+        conn.close()
+    print(f"✅ Done: {result}")
@@ -0,0 +1,87 @@
+"""
+Which store chat history goes through, picked by CHAT_HISTORY_BACKEND:
+
+    supabase  (default) PostgREST with the user's token; RLS applies
+    postgres  asyncpg straight to the database (chat_history_pg), scoped
+              to the signed-in user in code; needs CHAT_DATABASE_URL or
+              DATABASE_URL
+
+Callers ask for the user's handle with user_client() and call functions on
+history(); both backends take the same arguments and return the same shapes.
+Unless CHAT_CACHE_ENABLED=0, history() reads through history_cache.
+
+Event-loop UIs use the coroutines at the bottom instead: on the postgres
+backend they await chat_history_pg on the caller's loop (no thread hop;
+reads skip the cache, a pooled query costs about what a lookup saves), on
+supabase they run history() in a worker thread.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+
+from src.db import chat_history, history_cache
+
+BACKEND = os.getenv("CHAT_HISTORY_BACKEND", "supabase").strip().lower()
+
+if BACKEND not in ("supabase", "postgres"):
+    raise RuntimeError(f"CHAT_HISTORY_BACKEND must be 'supabase' or 'postgres', not {BACKEND!r}")
+
+
+def user_client(access_token: Optional[str], user_id: Optional[str]):
+    """Handle acting as the signed-in user, or None when signed out."""
+    if BACKEND == "postgres":
+        from src.db.chat_history_pg import PgClient
+        return PgClient(user_id) if access_token and user_id else None
+    from src.auth.supabase_user_client import pooled_user_client
+    return pooled_user_client(access_token) if access_token else None
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def history():
+    """Blocking chat-history functions for the configured backend, cached if enabled."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                if BACKEND == "postgres":
+                    from src.db import chat_history_pg
+                    api = chat_history_pg.sync
+                else:
+                    api = chat_history
+                _history = history_cache.HistoryCache(api) if history_cache.CACHE_ENABLED else api
+    return _history
+
+# --------------------------- Async ---------------------------
+
+async def _invalidate(user_id: str, *groups: str):
+    """Drop cache entries a direct chat_history_pg write made stale."""
+    api = history()
+    if not isinstance(api, history_cache.HistoryCache):
+        return
+    if isinstance(api.store, history_cache.MemoryStore):
+        api.invalidate(user_id, *groups)
+    else:
+        await asyncio.to_thread(api.invalidate, user_id, *groups)
+
+
+async def acreate_new_conversation(sb, user_id: str, title: Optional[str] = None) -> str:
+    if BACKEND != "postgres":
+        return await asyncio.to_thread(history().create_new_conversation, sb, user_id, title)
+    from src.db import chat_history_pg
+    try:
+        return await chat_history_pg.create_new_conversation(sb, user_id, title)
+    finally:
+        await _invalidate(user_id, history_cache.CONVERSATIONS)
+
+
+async def aget_conversation_page(sb, conversation_id: str, limit: int = 30, before: Optional[str] = None,
+                                 after: Optional[str] = None) -> Dict:
+    if BACKEND != "postgres":
+        return await asyncio.to_thread(history().get_conversation_page, sb, conversation_id, limit, before, after)
+    from src.db import chat_history_pg
+    return await chat_history_pg.get_conversation_page(sb, conversation_id, limit, before, after)
@@ -0,0 +1,340 @@
+"""
+Read-through cache for the chat-history reads that repeat on every render:
+the conversation list (get_user_conversations), a conversation's messages
+(get_conversation_history) and its newest page (get_conversation_page with
+no cursor, what the UIs' history panels open with; pages behind a cursor
+are read once each and not cached).
+
+Entries belong to a user and are dropped by that user's writes, and only
+the entries a write can change:
+
+    create_new_conversation           the user's conversation lists
+    save_message / save_turn /
+    insert_messages                   the lists and that conversation's messages/pages
+    update_conversation_timestamp     the lists
+    delete_conversation               the lists and that conversation's messages/pages
+
+A read that raced with a write never stores its (possibly older) result:
+each lookup takes a token for its group of entries, and an invalidation in
+between makes the later store a no-op.
+
+Two stores:
+
+    MemoryStore   this process only; LRU over users (CHAT_CACHE_MAX_USERS)
+                  and over each user's entries (CHAT_CACHE_MAX_ENTRIES)
+    RedisStore    shared by every worker (CHAT_CACHE_REDIS_URL, needs the
+                  `redis` package); size it with Redis' maxmemory and
+                  maxmemory-policy allkeys-lru
+
+Entries expire after CHAT_CACHE_TTL_SECONDS either way, which bounds how
+stale a per-process cache can get when another worker writes for the user.
+
+The user is taken from the handle (PgClient.user_id, or UserClient.user_id,
+which is set only for a token that verifies locally): handles without one
+are never served from the cache.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_USERS = int(os.getenv("CHAT_CACHE_MAX_USERS", "1000"))
+CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "32"))
+CACHE_REDIS_URL = os.getenv("CHAT_CACHE_REDIS_URL")
+CACHE_REDIS_PREFIX = os.getenv("CHAT_CACHE_REDIS_PREFIX", "legabot:history:")
+
+CONVERSATIONS = "conversations"
+
+
+def _history_group(conversation_id: str) -> str:
+    return f"history:{conversation_id}"
+
+
+def _copy(rows: List[Dict]) -> List[Dict]:
+    # Callers extend and sort what they get back (write_behind overlays pending rows)
+    return [dict(r) for r in rows]
+
+
+def _copy_page(page: Dict) -> Dict:
+    return {**page, "messages": _copy(page["messages"])}
+
+# --------------------------- Stores ---------------------------
+
+class MemoryStore:
+    """Per-process store: user -> group -> field -> (expires_at, value), LRU at both levels."""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_users: int = CACHE_MAX_USERS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]]" = OrderedDict()
+        # Clock ticks on every invalidation; a store is accepted only if its group
+        # was not invalidated after the lookup took the token. Marks are bounded:
+        # dropping one (or evicting a user) raises the floor every token must reach.
+        self._clock = 0
+        self._invalidated: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._max_marks = max(1, max_users) * 4
+        self._floor = 0
+
+    def lookup(self, user: str, group: str, field: Hashable) -> Tuple[bool, Any, int]:
+        with self._lock:
+            entries = self._users.get(user)
+            if entries is not None:
+                self._users.move_to_end(user)
+                item = entries.get((group, field))
+                if item is not None:
+                    if item[0] > time.monotonic():
+                        entries.move_to_end((group, field))
+                        return True, item[1], self._clock
+                    del entries[(group, field)]
+            return False, None, self._clock
+
+    def store(self, user: str, group: str, field: Hashable, value: Any, token: int):
+        with self._lock:
+            if token < self._floor or token < self._invalidated.get((user, group), 0):
+                return False
+            entries = self._users.setdefault(user, OrderedDict())
+            self._users.move_to_end(user)
+            entries[(group, field)] = (time.monotonic() + self.ttl, value)
+            entries.move_to_end((group, field))
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self._clock += 1
+                self._floor = self._clock
+            return True
+
+    def invalidate(self, user: str, groups: Iterable[str]):
+        with self._lock:
+            self._clock += 1
+            groups = set(groups)
+            for group in groups:
+                self._invalidated[(user, group)] = self._clock
+                self._invalidated.move_to_end((user, group))
+            while len(self._invalidated) > self._max_marks:
+                _, mark = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, mark)
+            entries = self._users.get(user)
+            if entries:
+                for key in [k for k in entries if k[0] in groups]:
+                    del entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._invalidated.clear()
+            self._clock += 1
+            self._floor = self._clock
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(e) for e in self._users.values())
+
+
+class RedisStore:
+    """
+    Store shared across workers. Each group is one Redis hash (field -> JSON)
+    with the store's TTL, and a companion counter that invalidation bumps;
+    stores are WATCHed against that counter.
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL, ttl: float = CACHE_TTL_SECONDS,
+                 prefix: str = CACHE_REDIS_PREFIX, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self.redis = client
+        self.ttl = int(max(1, ttl))
+        self.prefix = prefix
+
+    def _keys(self, user: str, group: str) -> Tuple[str, str]:
+        base = f"{self.prefix}{user}:{group}"
+        return base, base + ":gen"
+
+    def lookup(self, user: str, group: str, field: Hashable) -> Tuple[bool, Any, Optional[bytes]]:
+        key, gen_key = self._keys(user, group)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hget(key, str(field))
+        pipe.get(gen_key)
+        raw, gen = pipe.execute()
+        if raw is None:
+            return False, None, gen
+        return True, json.loads(raw), gen
+
+    def store(self, user: str, group: str, field: Hashable, value: Any, token: Optional[bytes]):
+        from redis.exceptions import WatchError
+
+        key, gen_key = self._keys(user, group)
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(gen_key)
+                if pipe.get(gen_key) != token:
+                    return False
+                pipe.multi()
+                pipe.hset(key, str(field), json.dumps(value, default=str))
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def invalidate(self, user: str, groups: Iterable[str]):
+        pipe = self.redis.pipeline(transaction=False)
+        for group in set(groups):
+            key, gen_key = self._keys(user, group)
+            pipe.delete(key)
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, self.ttl * 2)  # outlives any entry stored against it
+        pipe.execute()
+
+    def clear(self):
+        for key in self.redis.scan_iter(f"{self.prefix}*"):
+            self.redis.delete(key)
+
+# --------------------------- Cached API ---------------------------
+
+class HistoryCache:
+    """
+    Wraps a chat-history API (chat_history, chat_history_pg.sync or anything
+    with the same functions) with the cache; everything not listed here is
+    passed straight through.
+    """
+
+    def __init__(self, api, store=None):
+        self._api = api
+        self.store = store if store is not None else default_store()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores_skipped": 0, "invalidations": 0, "errors": 0}
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _read(self, user: Optional[str], group: str, field: Hashable, load: Callable[[], Any],
+              copy: Callable[[Any], Any] = _copy) -> Any:
+        if user is None:
+            return load()
+        try:
+            hit, value, token = self.store.lookup(user, group, field)
+        except Exception as e:  # a cache outage must not take history down
+            logger.warning("chat-history cache lookup failed: %s", e)
+            self._count("errors")
+            return load()
+        if hit:
+            self._count("hits")
+            return copy(value)
+        self._count("misses")
+        rows = load()
+        try:
+            if not self.store.store(user, group, field, copy(rows), token):
+                self._count("stores_skipped")
+        except Exception as e:
+            logger.warning("chat-history cache store failed: %s", e)
+            self._count("errors")
+        return rows
+
+    def invalidate(self, user_id: Optional[str], *groups: str):
+        if not user_id:
+            return
+        self._count("invalidations")
+        try:
+            self.store.invalidate(str(user_id), groups)
+        except Exception as e:
+            # Entries then live out their TTL; say so loudly, this is a correctness issue
+            logger.error("chat-history cache invalidation failed for %s: %s", groups, e)
+            self._count("errors")
+
+    # ---- reads ----
+
+    def get_user_conversations(self, sb, user_id: str, limit: int = 20) -> List[Dict]:
+        user = _handle_user(sb, user_id)
+        return self._read(user, CONVERSATIONS, limit,
+                          lambda: self._api.get_user_conversations(sb, user_id, limit))
+
+    def get_conversation_history(self, sb, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+        user = _handle_user(sb)
+        return self._read(user, _history_group(conversation_id), limit or 0,
+                          lambda: self._api.get_conversation_history(sb, conversation_id, limit))
+
+    def get_conversation_page(self, sb, conversation_id: str, limit: int = 30, before: Optional[str] = None,
+                              after: Optional[str] = None, **kwargs) -> Dict:
+        def load():
+            return self._api.get_conversation_page(sb, conversation_id, limit, before, after, **kwargs)
+        if before is not None or after is not None:
+            return load()
+        columns = kwargs.get("columns", "")
+        return self._read(_handle_user(sb), _history_group(conversation_id), f"page:{limit}:{columns}", load,
+                          copy=_copy_page)
+
+    # ---- writes ----
+
+    def create_new_conversation(self, sb, user_id: str, title: Optional[str] = None) -> str:
+        try:
+            return self._api.create_new_conversation(sb, user_id, title)
+        finally:
+            self.invalidate(user_id, CONVERSATIONS)
+
+    def save_message(self, sb, conversation_id: str, user_id: str, role: str, content: str,
+                     metadata: Optional[Dict] = None) -> str:
+        try:
+            return self._api.save_message(sb, conversation_id, user_id, role, content, metadata)
+        finally:
+            self.invalidate(user_id, CONVERSATIONS, _history_group(conversation_id))
+
+    def save_turn(self, sb, conversation_id: str, user_id: str, question: str, answer: str,
+                  metadata: Optional[Dict] = None, asked_at=None) -> List[str]:
+        try:
+            return self._api.save_turn(sb, conversation_id, user_id, question, answer, metadata, asked_at)
+        finally:
+            self.invalidate(user_id, CONVERSATIONS, _history_group(conversation_id))
+
+    def insert_messages(self, sb, rows: List[Dict]):
+        try:
+            return self._api.insert_messages(sb, rows)
+        finally:
+            by_user: Dict[str, set] = {}
+            for r in rows:
+                by_user.setdefault(r["user_id"], set()).add(_history_group(r["conversation_id"]))
+            for user_id, groups in by_user.items():
+                self.invalidate(user_id, CONVERSATIONS, *groups)
+
+    def update_conversation_timestamp(self, sb, conversation_id: str):
+        try:
+            return self._api.update_conversation_timestamp(sb, conversation_id)
+        finally:
+            self.invalidate(_handle_user(sb), CONVERSATIONS)
+
+    def delete_conversation(self, sb, conversation_id: str, user_id: str) -> bool:
+        try:
+            return self._api.delete_conversation(sb, conversation_id, user_id)
+        finally:
+            self.invalidate(user_id, CONVERSATIONS, _history_group(conversation_id))
+
+
+def _handle_user(sb, user_id: Optional[str] = None) -> Optional[str]:
+    """User the handle acts as; None (no caching) if unknown or not the user asked about."""
+    user = getattr(sb, "user_id", None)
+    if not user or (user_id is not None and str(user_id) != str(user)):
+        return None
+    return str(user)
+
+
+def default_store():
+    """RedisStore when CHAT_CACHE_REDIS_URL is set, else a MemoryStore."""
+    if CACHE_REDIS_URL:
+        return RedisStore(CACHE_REDIS_URL)
+    return MemoryStore()
@@ -0,0 +1,176 @@
+"""
+Chat-history retention: delete conversations idle for more than --days, in
+small batches, optionally archiving them first.
+
+Each batch is its own short transaction:
+
+    1. lock up to --batch-size expired conversations (oldest first,
+       FOR UPDATE SKIP LOCKED so live traffic is never waited on)
+    2. with --archive-dir, stream those conversations and their messages
+       into a gzip NDJSON archive (see archive.py) and fsync it
+    3. delete the conversations; messages go with them via ON DELETE CASCADE
+    4. commit, report progress, sleep --pause seconds
+
+A crash between 2 and 4 only means the batch is archived again by the next
+run. Needs a direct Postgres connection (DATABASE_URL or --dsn), since it
+works across all users.
+
+    python -m src.db.retention --days 365 --dry-run
+    python -m src.db.retention --days 365 --archive-dir archives/ --batch-size 200 --pause 0.5
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from src.db.archive import NDJSONWriter
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.5"))
+
+COUNT_SQL = """
+    SELECT COUNT(*) FROM conversations
+    WHERE updated_at < NOW() - make_interval(days => %(days)s)
+"""
+
+LOCK_BATCH_SQL = """
+    SELECT id FROM conversations
+    WHERE updated_at < NOW() - make_interval(days => %(days)s)
+    ORDER BY updated_at, id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+"""
+
+ARCHIVE_CONVERSATIONS_SQL = "SELECT * FROM conversations WHERE id = ANY(%(ids)s::uuid[]) ORDER BY id"
+ARCHIVE_MESSAGES_SQL = """
+    SELECT * FROM messages WHERE conversation_id = ANY(%(ids)s::uuid[])
+    ORDER BY conversation_id, created_at, id
+"""
+
+DELETE_SQL = "DELETE FROM conversations WHERE id = ANY(%(ids)s::uuid[])"
+COUNT_MESSAGES_SQL = "SELECT COUNT(*) FROM messages WHERE conversation_id = ANY(%(ids)s::uuid[])"
+
+
+def _archive_batch(conn, ids, writer: NDJSONWriter) -> int:
+    """Write the batch in conversation order; returns the number of messages written."""
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(ARCHIVE_CONVERSATIONS_SQL, {"ids": ids})
+        conversations = cur.fetchall()
+    written = 0
+    # Named (server-side) cursor: messages arrive in chunks, never all at once
+    with conn.cursor(name="retention_messages", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.itersize = 2000
+        cur.execute(ARCHIVE_MESSAGES_SQL, {"ids": ids})
+        pending = iter(conversations)
+        current = None
+        for msg in cur:
+            while current is None or current["id"] != msg["conversation_id"]:
+                current = next(pending)
+                writer.write("conversation", current)
+            writer.write("message", msg)
+            written += 1
+        for conv in pending:  # conversations without messages
+            writer.write("conversation", conv)
+    writer.sync()
+    return written
+
+
+def run_retention(
+    dsn: str,
+    days: int,
+    batch_size: int = BATCH_SIZE,
+    pause: float = PAUSE_SECONDS,
+    archive_dir: Optional[Path] = None,
+    dry_run: bool = False,
+    schema: Optional[str] = None,
+    max_batches: Optional[int] = None,
+) -> Dict:
+    stats = {"conversations": 0, "messages": 0, "batches": 0, "archive": None}
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn)
+    writer = None
+    try:
+        with conn.cursor() as cur:
+            if schema:
+                cur.execute("SELECT set_config('search_path', %s, false)", (f"{schema}, public",))
+            cur.execute(COUNT_SQL, {"days": days})
+            expired = cur.fetchone()[0]
+        conn.commit()
+        print(f"🗓️  {expired} conversations idle for more than {days} days")
+        if dry_run or not expired:
+            return {**stats, "expired": expired, "dry_run": dry_run}
+
+        if archive_dir:
+            path = Path(archive_dir) / f"conversations-{time.strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+            writer = NDJSONWriter(path)
+            stats["archive"] = str(path)
+
+        while max_batches is None or stats["batches"] < max_batches:
+            with conn.cursor() as cur:
+                cur.execute(LOCK_BATCH_SQL, {"days": days, "limit": batch_size})
+                ids = [row[0] for row in cur.fetchall()]
+                if not ids:
+                    conn.rollback()
+                    break
+                if writer:
+                    messages = _archive_batch(conn, ids, writer)
+                else:
+                    cur.execute(COUNT_MESSAGES_SQL, {"ids": ids})
+                    messages = cur.fetchone()[0]
+                cur.execute(DELETE_SQL, {"ids": ids})
+            conn.commit()
+
+            stats["batches"] += 1
+            stats["conversations"] += len(ids)
+            stats["messages"] += messages
+            elapsed = time.perf_counter() - started
+            rate = stats["conversations"] / elapsed if elapsed else 0.0
+            remaining = max(expired - stats["conversations"], 0)
+            print(
+                f"🗑️  batch {stats['batches']}: {stats['conversations']}/{expired} conversations "
+                f"({100 * stats['conversations'] / expired:.0f}%), {stats['messages']} messages, "
+                f"{rate:.0f}/s, ETA {remaining / rate if rate else 0:.0f}s"
+            )
+            if pause:
+                time.sleep(pause)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if writer:
+            writer.close()
+        conn.close()
+
+    stats["elapsed_s"] = round(time.perf_counter() - started, 2)
+    stats["expired"] = expired
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete (and optionally archive) idle conversations in batches")
+    parser.add_argument("--days", type=int, default=365, help="delete conversations idle for longer than this")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="conversations per transaction")
+    parser.add_argument("--pause", type=float, default=PAUSE_SECONDS, help="seconds to sleep between batches")
+    parser.add_argument("--archive-dir", type=Path, default=None, help="write a .ndjson.gz archive here first")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be deleted")
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--schema", default=None, help="schema to run in (default: search_path)")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="defaults to DATABASE_URL")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        raise RuntimeError("Missing DATABASE_URL in .env")
+    result = run_retention(
+        args.dsn, args.days, args.batch_size, args.pause,
+        args.archive_dir, args.dry_run, args.schema, args.max_batches,
+    )
+    print(f"✅ Done: {result}")
@@ -0,0 +1,620 @@
+"""
+Write-behind persistence for chat history.
+
+Messages are accepted immediately and written to Supabase by a background
+worker in batches, so PostgREST latency stays off the answer path:
+
+- every accepted message is first appended to a local spool file (JSONL),
+  and acknowledged there once the database has it. Spool I/O has its own
+  lock, so an fsync never holds up the worker or readers
+- each writer has its own spool next to WRITE_BEHIND_SPOOL
+  (`chat_history.<pid>-<random>.jsonl`) and holds an flock on it while it
+  runs, so workers sharing the directory never rewrite each other's rows.
+  On start-up a writer adopts the spools no running writer holds (left by
+  a crash or an unclean exit): their unacknowledged rows move into its own
+  spool and are replayed
+- ids are generated client-side and batches are inserted with
+  ON CONFLICT (id) DO NOTHING, so replaying a batch that did land is a no-op
+- the in-memory queue is bounded: a full queue blocks the caller for up to
+  WRITE_BEHIND_PUT_TIMEOUT and then falls back to a synchronous insert
+- `get_conversation_history` / `get_conversation_page` overlay the caller's
+  own unflushed messages on what the database returns (read-your-writes)
+- after close() writes are made synchronously
+- a failed insert backs off only the user it was for; a message that still
+  fails after WRITE_BEHIND_MAX_ATTEMPTS inserts is moved to the dead-letter
+  file (WRITE_BEHIND_DEAD_LETTER) so it cannot hold up the queue
+
+Writes go through the user-scoped client passed with the message, so RLS
+(or, with CHAT_HISTORY_BACKEND=postgres, PgClient scoping) applies as
+before. Replayed messages are flushed with the `fallback_client` if one is
+configured, otherwise once that user's next write supplies a client; the
+same goes for a user whose token was rejected (expired or revoked). Rows
+still waiting for a client after WRITE_BEHIND_PARK_TIMEOUT are moved to the
+dead-letter file.
+"""
+
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import threading
+import uuid
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional
+
+from supabase import Client
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so any other spool in the directory is taken as abandoned
+    fcntl = None
+
+from src.db import chat_history
+from src.db.history_backend import history
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+SPOOL_PATH = Path(os.getenv("WRITE_BEHIND_SPOOL", str(PROJECT_ROOT / "spool" / "chat_history.jsonl")))
+BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "5000"))
+PUT_TIMEOUT = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", "0.5"))
+FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "1").lower() in ("1", "true", "yes")
+SPOOL_MAX_MB = float(os.getenv("WRITE_BEHIND_SPOOL_MAX_MB", "64"))
+MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+DEAD_LETTER_PATH = Path(os.getenv("WRITE_BEHIND_DEAD_LETTER", str(PROJECT_ROOT / "spool" / "chat_history.dead.jsonl")))
+PARK_TIMEOUT = float(os.getenv("WRITE_BEHIND_PARK_TIMEOUT", "3600"))
+MAX_BACKOFF = 30.0
+
+# PostgREST codes for a JWT it will not accept (expired, bad signature, ...)
+_AUTH_ERROR_CODES = {"PGRST301", "PGRST302"}
+
+
+def _auth_error(e: Exception) -> bool:
+    return getattr(e, "code", None) in _AUTH_ERROR_CODES or "JWT expired" in str(e)
+
+
+def _try_lock(f) -> bool:
+    """Exclusive, non-blocking flock on an open spool; held until the file is closed."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _read_records(f) -> List[Dict]:
+    """Unacknowledged rows in a spool, oldest first."""
+    rows: "OrderedDict[str, Dict]" = OrderedDict()
+    for line in f:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # torn last line from a crash mid-write
+        if record.get("op") == "put":
+            rows[record["row"]["id"]] = record["row"]
+        elif record.get("op") == "ack":
+            for message_id in record["ids"]:
+                rows.pop(message_id, None)
+    return list(rows.values())
+
+
+class WriteBehindWriter:
+    def __init__(
+        self,
+        spool_path: Path = SPOOL_PATH,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_MS / 1000,
+        max_queue: int = MAX_QUEUE,
+        put_timeout: float = PUT_TIMEOUT,
+        fsync: bool = FSYNC,
+        fallback_client: Optional[Client] = None,
+        insert: Optional[Callable[[Client, List[Dict]], None]] = None,
+        api=None,
+        max_attempts: int = MAX_ATTEMPTS,
+        dead_letter_path: Path = DEAD_LETTER_PATH,
+        park_timeout: float = PARK_TIMEOUT,
+    ):
+        self._api = api or history()
+        self.spool_path = Path(spool_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.fsync = fsync
+        self.fallback_client = fallback_client
+        self._insert = insert or self._api.insert_messages
+        self.max_attempts = max_attempts
+        self.dead_letter_path = Path(dead_letter_path)
+        self.park_timeout = park_timeout
+        self.spool_file: Optional[Path] = None      # this writer's own spool, next to spool_path
+
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()         # spool file; taken before _cond, never while holding it
+        self._queue: Deque[Dict] = deque()          # rows waiting for the worker
+        self._pending: "OrderedDict[str, Dict]" = OrderedDict()  # id -> row, until acknowledged
+        self._parked: Dict[str, List[Dict]] = {}    # user_id -> replayed rows with no client yet
+        self._parked_at: Dict[str, float] = {}      # user_id -> when their rows were first parked
+        self._clients: Dict[str, Client] = {}       # user_id -> latest user-scoped client
+        self._attempts: Dict[str, int] = {}         # id -> failed inserts so far
+        self._retry: Dict[str, List[Dict]] = {}     # user_id -> rows held back while the user backs off
+        self._retry_at: Dict[str, float] = {}       # user_id -> when the next insert may be tried
+        self._user_failures: Dict[str, int] = {}    # user_id -> consecutive failed inserts
+        self._in_flight = 0
+        self._reserved = 0                          # rows accepted but still being spooled
+        self._flush_waiters = 0
+        self._spool = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._closed = False
+        self.stats = {
+            "enqueued": 0, "flushed": 0, "batches": 0, "failures": 0, "dead_lettered": 0, "auth_errors": 0,
+            "replayed": 0, "inline_writes": 0, "blocked_seconds": 0.0, "max_depth": 0,
+        }
+
+    # ---- lifecycle ----
+
+    def start(self) -> "WriteBehindWriter":
+        if self._thread is not None:
+            return self
+        self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+        self._open_spool()
+        replay = self._adopt_orphans()
+        with self._cond:
+            for row in replay:
+                self._pending[row["id"]] = row
+                if self.fallback_client is not None:
+                    self._queue.append(row)
+                else:
+                    self._park(row)
+            self.stats["replayed"] = len(replay)
+        if replay:
+            logger.info("write-behind: replaying %d unacknowledged messages from abandoned spools", len(replay))
+        self._thread = threading.Thread(target=self._run, name="chat-history-write-behind", daemon=True)
+        self._thread.start()
+        return self
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is in the database (or dead-lettered)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight or self._retry or self._reserved:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def close(self, timeout: float = 10.0):
+        with self._cond:
+            self._closed = True
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._spool_lock:
+            if self._spool is not None:
+                with self._cond:
+                    drained = not self._pending
+                if drained:
+                    self.spool_file.unlink(missing_ok=True)  # still locked, so no one is adopting it
+                self._spool.close()  # anything left is adopted by the next writer to start
+                self._spool = None
+
+    # ---- writes ----
+
+    def save_message(
+        self,
+        sb: Client,
+        conversation_id: str,
+        user_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[Dict] = None
+    ) -> str:
+        row = chat_history.message_row(conversation_id, user_id, role, content, metadata)
+        self._enqueue(sb, [row])
+        return row["id"]
+
+    def save_turn(
+        self,
+        sb: Client,
+        conversation_id: str,
+        user_id: str,
+        question: str,
+        answer: str,
+        metadata: Optional[Dict] = None,
+        asked_at: Optional[datetime] = None
+    ) -> List[str]:
+        rows = chat_history.turn_rows(conversation_id, user_id, question, answer, metadata, asked_at)
+        self._enqueue(sb, rows)
+        return [r["id"] for r in rows]
+
+    def _enqueue(self, sb: Client, rows: List[Dict]):
+        if self._thread is None and not self._closed:
+            self.start()
+        user_id = rows[0]["user_id"]
+        with self._cond:
+            self._clients[user_id] = sb
+            parked = self._parked.pop(user_id, None)
+            self._parked_at.pop(user_id, None)
+            if parked:
+                self._queue.extend(parked)
+
+            waited_from = time.monotonic()
+            deadline = waited_from + self.put_timeout
+            while not self._closed and self._depth() + len(rows) > self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self.stats["blocked_seconds"] += time.monotonic() - waited_from
+
+            accepted = not self._closed and self._depth() + len(rows) <= self.max_queue
+            if accepted:
+                # Pending first, so a compaction running meanwhile keeps these rows
+                self._reserved += len(rows)
+                for r in rows:
+                    self._pending[r["id"]] = r
+
+        if accepted:
+            try:
+                self._spool_write([{"op": "put", "row": r} for r in rows])
+            except BaseException:
+                with self._cond:
+                    self._reserved -= len(rows)
+                    for r in rows:
+                        self._pending.pop(r["id"], None)
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._reserved -= len(rows)
+                self._queue.extend(rows)
+                self.stats["enqueued"] += len(rows)
+                self.stats["max_depth"] = max(self.stats["max_depth"], len(self._queue))
+                self._cond.notify_all()
+            return
+
+        # Closed, or the queue is still full because the database is falling behind: write inline
+        self.stats["inline_writes"] += len(rows)
+        self._insert(sb, rows)
+
+    def _depth(self) -> int:
+        return len(self._queue) + self._reserved
+
+    # ---- reads ----
+
+    def pending(self, conversation_id: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
+        """Unacknowledged rows, oldest first."""
+        with self._cond:
+            return [
+                dict(r) for r in self._pending.values()
+                if (conversation_id is None or r["conversation_id"] == conversation_id)
+                and (user_id is None or r["user_id"] == user_id)
+            ]
+
+    def get_conversation_history(self, sb: Client, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """chat_history.get_conversation_history plus this process's unflushed messages."""
+        rows = self._api.get_conversation_history(sb, conversation_id)
+        seen = {r["id"] for r in rows}
+        rows.extend(r for r in self.pending(conversation_id) if r["id"] not in seen)
+        rows.sort(key=lambda r: r["created_at"])
+        return rows[:limit] if limit else rows
+
+    def get_conversation_page(
+        self,
+        sb: Client,
+        conversation_id: str,
+        limit: int = 30,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Dict:
+        """chat_history.get_conversation_page; the newest page and `after` pages include unflushed messages."""
+        page = self._api.get_conversation_page(sb, conversation_id, limit, before, after)
+        return self.overlay_page(page, conversation_id, before, after)
+
+    def overlay_page(self, page: Dict, conversation_id: str, before: Optional[str] = None,
+                     after: Optional[str] = None) -> Dict:
+        """Add unflushed messages to a page read elsewhere (e.g. awaited from chat_history_pg)."""
+        if before is not None:
+            return page  # unflushed messages are newer than anything already on screen
+        seen = {r["id"] for r in page["messages"]}
+        floor = chat_history.decode_cursor(after) if after else None
+        extra = [
+            r for r in self.pending(conversation_id)
+            if r["id"] not in seen and (floor is None or (r["created_at"], r["id"]) > floor)
+        ]
+        if not extra:
+            return page
+        rows = sorted(page["messages"] + extra, key=lambda r: (r["created_at"], r["id"]))
+        return {**page, "messages": rows, "newer": chat_history.encode_cursor(rows[-1])}
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            oldest = next(iter(self._pending.values()), None)
+            return {
+                **self.stats,
+                "queue_depth": len(self._queue),
+                "pending": len(self._pending),
+                "parked": sum(len(v) for v in self._parked.values()),
+                "retrying": sum(len(v) for v in self._retry.values()),
+                "users_backing_off": len(self._retry_at),
+                "oldest_pending_s": (
+                    round((datetime.now(timezone.utc) - chat_history.parse_timestamp(oldest["created_at"])).total_seconds(), 3)
+                    if oldest else 0.0
+                ),
+                "spool_bytes": self.spool_file.stat().st_size if self.spool_file and self.spool_file.exists() else 0,
+            }
+
+    # ---- worker ----
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    self._release_retries()
+                    expired = self._expire_parked()
+                    if self._queue or self._stopping or expired:
+                        break
+                    self._cond.wait(self._next_wakeup_in())
+            if expired:
+                self._dead_letter([(r, f"no client to write with after {self.park_timeout:.0f}s") for r in expired])
+                self._compact_if_idle()
+                continue
+
+            with self._cond:
+                # Let a batch build up for at most flush_interval after the first message
+                batch_deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.batch_size and not (self._stopping or self._flush_waiters):
+                    remaining = batch_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    continue
+                batch = self._take_batch()
+                if not batch:
+                    self._cond.notify_all()
+                    continue
+                self._in_flight = len(batch)
+
+            done: List[Dict] = []
+            failed: List[tuple] = []    # (user_id, rows, error)
+            unclaimed: List[Dict] = []  # no client to write them with yet
+            for user_id, rows in self._by_user(batch).items():
+                client = self._clients.get(user_id) or self.fallback_client
+                if client is None:
+                    unclaimed.extend(rows)
+                    continue
+                try:
+                    self._insert(client, rows)
+                    done.extend(rows)
+                except Exception as e:
+                    logger.warning("write-behind: insert of %d messages for %s failed: %s", len(rows), user_id, e)
+                    if _auth_error(e) and self._drop_client(user_id, client) and self.fallback_client is None:
+                        unclaimed.extend(rows)
+                    else:
+                        failed.append((user_id, rows, e))
+
+            if done:
+                self._spool_write([{"op": "ack", "ids": [r["id"] for r in done]}])
+            with self._cond:
+                for r in done:
+                    self._pending.pop(r["id"], None)
+                    self._attempts.pop(r["id"], None)
+                    self._user_failures.pop(r["user_id"], None)
+                if done:
+                    self.stats["flushed"] += len(done)
+                    self.stats["batches"] += 1
+                dead = []
+                for user_id, rows, error in failed:
+                    self.stats["failures"] += 1
+                    dead.extend((r, error) for r in self._back_off(user_id, rows))
+                for r in unclaimed:
+                    self._park(r)
+                self._in_flight = 0
+                self._cond.notify_all()
+            if dead:
+                self._dead_letter(dead)
+            if done or dead:
+                self._compact_if_idle()
+
+    def _take_batch(self) -> List[Dict]:
+        """Up to batch_size queued rows; rows of users who are backing off join their held-back rows."""
+        batch: List[Dict] = []
+        while self._queue and len(batch) < self.batch_size:
+            row = self._queue.popleft()
+            if row["user_id"] in self._retry_at:
+                self._retry.setdefault(row["user_id"], []).append(row)
+            else:
+                batch.append(row)
+        return batch
+
+    def _back_off(self, user_id: str, rows: List[Dict]) -> List[Dict]:
+        """Hold a user's failed rows back for a while; returns the rows out of attempts."""
+        failures = self._user_failures[user_id] = self._user_failures.get(user_id, 0) + 1
+        self._retry_at[user_id] = time.monotonic() + random.uniform(0, min(MAX_BACKOFF, 0.5 * 2 ** failures))
+        keep, dead = [], []
+        for r in rows:
+            self._attempts[r["id"]] = self._attempts.get(r["id"], 0) + 1
+            (dead if self._attempts[r["id"]] >= self.max_attempts else keep).append(r)
+        keep += self._retry.pop(user_id, [])
+        if keep:
+            self._retry[user_id] = keep
+        return dead
+
+    def _release_retries(self):
+        now = time.monotonic()
+        for user_id, at in list(self._retry_at.items()):
+            if at <= now:
+                del self._retry_at[user_id]
+                self._queue.extendleft(reversed(self._retry.pop(user_id, [])))
+
+    def _park(self, row: Dict):
+        """Hold a row until its user's next write brings a client. Caller holds _cond."""
+        self._parked.setdefault(row["user_id"], []).append(row)
+        self._parked_at.setdefault(row["user_id"], time.monotonic())
+
+    def _expire_parked(self) -> List[Dict]:
+        """Parked rows that waited longer than park_timeout, for the dead-letter file."""
+        cutoff = time.monotonic() - self.park_timeout
+        expired: List[Dict] = []
+        for user_id, at in list(self._parked_at.items()):
+            if at <= cutoff:
+                del self._parked_at[user_id]
+                expired.extend(self._parked.pop(user_id, []))
+        return expired
+
+    def _next_wakeup_in(self) -> Optional[float]:
+        """Until the next backed-off user may retry or parked rows expire (None: nothing scheduled)."""
+        times = list(self._retry_at.values()) + [at + self.park_timeout for at in self._parked_at.values()]
+        if not times:
+            return None
+        return max(0.0, min(times) - time.monotonic())
+
+    def _drop_client(self, user_id: str, client: Client) -> bool:
+        """Forget a client whose token was rejected; the user's next write brings a new one."""
+        with self._cond:
+            if self._clients.get(user_id) is not client:
+                return False
+            del self._clients[user_id]
+            self.stats["auth_errors"] += 1
+            return True
+
+    @staticmethod
+    def _by_user(rows: List[Dict]) -> Dict[str, List[Dict]]:
+        groups: Dict[str, List[Dict]] = {}
+        for r in rows:
+            groups.setdefault(r["user_id"], []).append(r)
+        return groups
+
+    # ---- spool ----
+
+    def _open_spool(self):
+        """Create and lock this writer's spool; it gets its final name only once locked."""
+        name = f"{self.spool_path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp = self.spool_path.with_name(name + ".tmp")
+        self._spool = open(tmp, "a", encoding="utf-8")
+        _try_lock(self._spool)  # nobody else looks at .tmp files, so this cannot fail
+        self.spool_file = self.spool_path.with_name(name + self.spool_path.suffix)
+        os.replace(tmp, self.spool_file)
+
+    def _orphan_candidates(self) -> List[Path]:
+        pattern = re.compile(re.escape(self.spool_path.stem) + r"\.\d+-[0-9a-f]+" + re.escape(self.spool_path.suffix))
+        paths = sorted(p for p in self.spool_path.parent.iterdir() if pattern.fullmatch(p.name) and p != self.spool_file)
+        if self.spool_path.exists():
+            paths.insert(0, self.spool_path)  # the single shared spool of earlier versions
+        return paths
+
+    def _adopt_orphans(self) -> List[Dict]:
+        """Move the rows of spools no running writer holds into this writer's spool, then delete them."""
+        adopted: "OrderedDict[str, Dict]" = OrderedDict()
+        for path in self._orphan_candidates():
+            try:
+                f = open(path, encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with f:
+                # Locked: a live writer's. Unlinked: adopted by another writer, or replaced by a compaction
+                if not _try_lock(f) or os.fstat(f.fileno()).st_nlink == 0:
+                    continue
+                rows = _read_records(f)
+                if rows:
+                    with self._spool_lock:
+                        self._spool.write("".join(json.dumps({"op": "put", "row": r}, default=str) + "\n" for r in rows))
+                        self._spool.flush()
+                        os.fsync(self._spool.fileno())  # always: the rows are about to exist only here
+                path.unlink()
+                path.with_suffix(".tmp").unlink(missing_ok=True)
+            for r in rows:
+                adopted[r["id"]] = r
+        return list(adopted.values())
+
+    def _spool_write(self, records: List[Dict]):
+        data = "".join(json.dumps(r, default=str) + "\n" for r in records)
+        with self._spool_lock:
+            if self._spool is None:
+                return  # closed: unacknowledged rows are replayed next start, harmlessly
+            self._spool.write(data)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            if self._spool.tell() > SPOOL_MAX_MB * 1024 * 1024:
+                self._compact()
+
+    def _dead_letter(self, rows: List[tuple]):
+        """Move rows that keep failing to the dead-letter file, then acknowledge them."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._cond:
+            records = [
+                {"row": r, "attempts": self._attempts.get(r["id"], 0), "error": str(error), "at": now}
+                for r, error in rows
+            ]
+        self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        self._spool_write([{"op": "ack", "ids": [r["id"] for r, _ in rows]}])
+        with self._cond:
+            for r, _ in rows:
+                self._pending.pop(r["id"], None)
+                self._attempts.pop(r["id"], None)
+            self.stats["dead_lettered"] += len(rows)
+            self._cond.notify_all()
+        logger.error("write-behind: gave up on %d messages (%s); see %s",
+                     len(rows), rows[0][1], self.dead_letter_path)
+
+    def _compact_if_idle(self):
+        """Compact once nothing is in flight; rows parked for a client that has not come back don't count."""
+        with self._spool_lock:
+            with self._cond:
+                idle = len(self._pending) == sum(len(v) for v in self._parked.values())
+            if idle and self._spool is not None:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the spool with only the unacknowledged rows (empty if none). Caller holds _spool_lock."""
+        with self._cond:
+            rows = list(self._pending.values())
+        tmp = self.spool_file.with_suffix(".tmp")
+        f = open(tmp, "w", encoding="utf-8")
+        _try_lock(f)  # before the rename, so the new file is never up for adoption
+        for r in rows:
+            f.write(json.dumps({"op": "put", "row": r}, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+        os.replace(tmp, self.spool_file)
+        self._spool.close()
+        self._spool = f
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteBehindWriter:
+    """Process-wide writer, started on first use and drained at exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindWriter().start()
+            atexit.register(_writer.close)
+        return _writer
@@ -0,0 +1,123 @@
+"""
+Extractive contextual compression for retrieved chunks.
+
+Each 1000-character chunk usually holds only a sentence or two that matter for
+the question. Sentences from all retrieved chunks are embedded in one batch,
+scored against the query vector, and only the best sentences of each chunk
+(plus their neighbours and any section headings) are kept for the prompt.
+"""
+
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+COMPRESSION_SENTENCES_PER_CHUNK = int(os.getenv("COMPRESSION_SENTENCES_PER_CHUNK", "2"))
+COMPRESSION_NEIGHBOURS = int(os.getenv("COMPRESSION_NEIGHBOURS", "1"))
+
+# Split after . ? ! ; when the next sentence starts with a capital, digit or quote
+_SENTENCE_END = re.compile(r"(?<=[.?!;])\s+(?=[A-Z0-9(\"“‘])")
+# Abbreviations common in statutes and judgments that end with a '.'
+_ABBREVIATIONS = re.compile(
+    r"(?:\b(?:No|Nos|Sec|Secs|Art|Arts|Cl|Ch|Ss|Sub|viz|i\.e|e\.g|Rs|Mr|Mrs|Dr|Hon|vs|v|Govt|Ltd|Co)\.)$",
+    re.IGNORECASE,
+)
+_BARE_NUMBER = re.compile(r"^\d{1,3}[A-Z]?\.$")
+# "378. Theft.—Whoever ...", "205. False personation ... .--Whoever ..."
+_SECTION_HEADING = re.compile(r"^\(?\d{1,3}[A-Z]?\)?\.\s+[A-Z][^.]{2,150}?\.\s?(?:--|—|–)")
+_PART_HEADING = re.compile(r"^(?:CHAPTER|PART|SCHEDULE)\s*[IVXLC\d]+\b")
+
+EncodeFn = Callable[[Sequence[str]], np.ndarray]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split whitespace-collapsed legal text into sentences."""
+    # Chunks start with the splitter's '.' separator
+    text = text.strip().lstrip(". ")
+    parts = [p.strip() for p in _SENTENCE_END.split(text) if p.strip()]
+    sentences: List[str] = []
+    for part in parts:
+        # Re-join splits after abbreviations ("Sec. 5") and bare section numbers ("206.")
+        if sentences and (_ABBREVIATIONS.search(sentences[-1]) or _BARE_NUMBER.match(sentences[-1])):
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def is_heading(sentence: str) -> bool:
+    s = sentence.lstrip(". ")
+    return bool(_SECTION_HEADING.match(s) or _PART_HEADING.match(s))
+
+
+def _normalise(sentence: str) -> str:
+    return " ".join(sentence.lower().lstrip(". ").split())
+
+
+def compress_matches(
+    query_vec: Sequence[float],
+    matches: List[Dict],
+    encode: EncodeFn,
+    sentences_per_chunk: Optional[int] = None,
+    neighbours: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Return copies of `matches` whose text keeps only the highest scoring
+    sentences (plus `neighbours` on each side) and all headings. Every chunk
+    with text keeps at least its best sentence, even if an overlapping chunk
+    already contributed it, so no source drops out of the citations.
+    `encode` must return L2-normalised vectors for a list of sentences.
+    """
+    top_n = COMPRESSION_SENTENCES_PER_CHUNK if sentences_per_chunk is None else sentences_per_chunk
+    window = COMPRESSION_NEIGHBOURS if neighbours is None else neighbours
+
+    per_chunk: List[List[str]] = []
+    for m in matches:
+        md = m.get("metadata", {}) or {}
+        per_chunk.append(split_sentences((md.get("text") or "").replace("\n", " ")))
+
+    flat = [s for sents in per_chunk for s in sents]
+    if not flat:
+        return matches
+
+    # One batched encode + one matrix-vector product for every sentence
+    q = np.asarray(query_vec, dtype=np.float32)
+    scores = np.asarray(encode(flat), dtype=np.float32) @ q
+
+    seen = set()
+    compressed: List[Dict] = []
+    offset = 0
+    for m, sents in zip(matches, per_chunk):
+        n = len(sents)
+        chunk_scores = scores[offset:offset + n]
+        offset += n
+        if n == 0:
+            continue
+
+        keep = set()
+        best = int(np.argmax(chunk_scores))
+        for i in np.argsort(-chunk_scores)[:max(1, top_n)]:
+            keep.update(range(max(0, i - window), min(n, i + window + 1)))
+        keep.update(i for i, s in enumerate(sents) if is_heading(s))
+
+        pieces: List[str] = []
+        prev = None
+        for i in sorted(keep):
+            key = _normalise(sents[i])
+            if key in seen and i != best:  # repeated by chunk overlap; the best one stays for the citation
+                continue
+            seen.add(key)
+            if prev is not None and i != prev + 1:
+                pieces.append("…")
+            pieces.append(sents[i])
+            prev = i
+
+        md = dict(m.get("metadata", {}) or {})
+        md["original_chars"] = len(md.get("text") or "")
+        md["text"] = " ".join(pieces)
+        out = {"id": m.get("id"), "score": m.get("score"), "metadata": md}
+        if m.get("rerank_score") is not None:
+            out["rerank_score"] = m.get("rerank_score")
+        compressed.append(out)
+    return compressed
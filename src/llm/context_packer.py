@@ -0,0 +1,181 @@
+"""
+Token-budgeted context packing for the RAG prompt.
+
+Neighbouring chunks of the same file are often retrieved together. This module
+merges those neighbours, drops weak matches and fills a fixed token budget in
+score order so every prompt has a predictable size.
+
+Chunks overlap by ~100 characters at ingestion, but the index only stores the
+first 800 characters of each 1000-character chunk, so the overlap is usually
+cut off and neighbouring snippets are ~200 characters apart. Merged snippets
+are only joined seamlessly where their overlap is actually found; elsewhere
+the missing text is marked with GAP_MARKER.
+"""
+
+import os
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+import tiktoken
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MIN_SCORE = float(os.getenv("CONTEXT_MIN_SCORE", "0.3"))
+
+# Overlap search window (characters) when stitching adjacent chunks
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 300
+# Don't bother truncating a block into less room than this
+MIN_TRUNCATED_TOKENS = 64
+# Stands for the text between two neighbouring snippets that was never stored
+GAP_MARKER = " […] "
+
+
+class _ApproxEncoding:
+    """~4 characters per token; used when tiktoken's BPE files can't be fetched (offline boxes)."""
+
+    def encode(self, text: str) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return _ApproxEncoding()
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Number of tokens `text` costs for `model`."""
+    return len(_encoding(model).encode(text))
+
+
+def _source(m: Dict) -> str:
+    md = m.get("metadata", {}) or {}
+    return md.get("file_name", md.get("source", "Unknown Source"))
+
+
+def _text(m: Dict) -> str:
+    md = m.get("metadata", {}) or {}
+    return (md.get("text") or "").strip().replace("\n", " ")
+
+
+def _priority(m: Dict) -> float:
+    # Reranked matches are ordered by the reranker, otherwise by vector score
+    score = m.get("rerank_score", m.get("score"))
+    return float(score) if score is not None else 0.0
+
+
+def _chunk_index(m: Dict) -> Optional[int]:
+    """Vector ids are the row number in legal_text.csv, so consecutive ids are neighbours."""
+    try:
+        return int(m.get("id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _strip_overlap(prev: str, nxt: str) -> Tuple[str, bool]:
+    """Drop the prefix of `nxt` that repeats the tail of `prev`; also says whether one was found."""
+    # The splitter keeps the '.' separator at the start of the next chunk
+    body = nxt.lstrip(". ").strip()
+    tail = prev[-MAX_OVERLAP_CHARS:]
+    for i in range(len(tail) - MIN_OVERLAP_CHARS + 1):
+        if body.startswith(tail[i:]):
+            return body[len(tail) - i:].lstrip(), True
+    return body, False
+
+
+def merge_adjacent(matches: List[Dict]) -> List[Dict]:
+    """
+    Merge matches that are consecutive chunks of the same file into one match,
+    removing the text they share. Where no shared text is found (the stored
+    snippets are truncated) the pieces are joined with GAP_MARKER, so the
+    model never reads two snippets as one continuous passage. The merged
+    match keeps the best score.
+    """
+    by_source: Dict[str, List[Dict]] = {}
+    loose: List[Dict] = []
+    for m in matches:
+        if _chunk_index(m) is None:
+            loose.append(m)
+        else:
+            by_source.setdefault(_source(m), []).append(m)
+
+    merged: List[Dict] = []
+    for src, group in by_source.items():
+        group.sort(key=_chunk_index)
+        run: List[Dict] = []
+        for m in group:
+            if run and _chunk_index(m) == _chunk_index(run[-1]):
+                continue  # duplicate id
+            if run and _chunk_index(m) != _chunk_index(run[-1]) + 1:
+                merged.append(_merge_run(src, run))
+                run = []
+            run.append(m)
+        if run:
+            merged.append(_merge_run(src, run))
+    return merged + loose
+
+
+def _merge_run(src: str, run: List[Dict]) -> Dict:
+    if len(run) == 1:
+        return run[0]
+    text = _text(run[0])
+    for m in run[1:]:
+        body, overlapped = _strip_overlap(text, _text(m))
+        text = f"{text}{' ' if overlapped else GAP_MARKER}{body}".strip()
+    best = max(run, key=_priority)
+    merged = {
+        "id": run[0].get("id"),
+        "score": best.get("score"),
+        "merged_ids": [m.get("id") for m in run],
+        "metadata": {**(best.get("metadata") or {}), "text": text, "file_name": src},
+    }
+    if best.get("rerank_score") is not None:
+        merged["rerank_score"] = best.get("rerank_score")
+    return merged
+
+
+def pack_context(
+    matches: List[Dict],
+    token_budget: Optional[int] = None,
+    min_score: Optional[float] = None,
+    model: str = "gpt-3.5-turbo",
+) -> str:
+    """
+    Build the prompt context: filter by score, merge neighbours, then add
+    blocks in score order until the token budget is spent. The last block
+    that does not fit is truncated if there is reasonable room left.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    threshold = CONTEXT_MIN_SCORE if min_score is None else min_score
+    enc = _encoding(model)
+
+    kept = [m for m in matches if m.get("score") is None or m["score"] >= threshold]
+    blocks = sorted(merge_adjacent(kept), key=_priority, reverse=True)
+
+    sep_tokens = len(enc.encode("\n\n"))
+    combined: List[str] = []
+    used = 0
+    for m in blocks:
+        text = _text(m)
+        if not text:
+            continue
+        header = f"[{_source(m)}]\n"
+        cost = (sep_tokens if combined else 0) + len(enc.encode(header))
+        text_tokens = enc.encode(text)
+        room = budget - used - cost
+        if len(text_tokens) <= room:
+            combined.append(header + text)
+            used += cost + len(text_tokens)
+            continue
+        if room >= MIN_TRUNCATED_TOKENS:
+            combined.append(header + enc.decode(text_tokens[:room - 2]).rstrip() + " …")
+        break
+    return "\n\n".join(combined)
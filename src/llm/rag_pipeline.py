@@ -1,60 +1,161 @@
+import asyncio
+import logging
 import os
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import numpy as np
 from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 
 # 1️⃣ Load environment variables
 project_root = Path(__file__).resolve().parents[2]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
 load_dotenv(dotenv_path=project_root / ".env")
 
+from src.llm.context_packer import count_tokens, pack_context
+from src.llm.compression import compress_matches
+from src.llm.singleflight import SingleFlight, AsyncSingleFlight
+from src.llm.scheduler import BUSY_MESSAGE, SchedulerBusy, get_scheduler, queue_wait
+from src.llm.resilience import Deadline, LatencyTracker, hedged, retry
+from src.retrieval.rerank import RERANK_ENABLED, RERANK_CANDIDATES, get_reranker
+from src.retrieval.local_index import get_local_index
+from src.observability.telemetry import record_cache, record_tokens, record_ttft, stage
+from src.observability.profiling import profile_call
+
+logger = logging.getLogger(__name__)
+
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENVIRONMENT") or os.getenv("PINECONE_ENV")
 INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Bump when the index is rebuilt so in-flight answers for the old data are not shared
+INDEX_VERSION = os.getenv("PINECONE_INDEX_VERSION", "")
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "0").lower() in ("1", "true", "yes")
 
-missing_env = [
-    name for name, val in [
-        ("PINECONE_API_KEY", PINECONE_API_KEY),
-        ("PINECONE_ENVIRONMENT", PINECONE_ENV),
-        ("PINECONE_INDEX_NAME", INDEX_NAME),
-        ("OPENAI_API_KEY", OPENAI_API_KEY),
-    ]
-    if not val
-]
-if missing_env:
-    raise RuntimeError(
-        "Missing required environment variables: " + ", ".join(missing_env) +
-        ". Please add them to your .env at project root."
-    )
+# Time budgets (seconds) and retry policy for remote calls
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+RETRIEVAL_BUDGET_SECONDS = float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "4"))
+VECTOR_HEDGE_PERCENTILE = float(os.getenv("VECTOR_HEDGE_PERCENTILE", "95"))
+VECTOR_ATTEMPTS = int(os.getenv("VECTOR_ATTEMPTS", "2"))
+LLM_ATTEMPTS = int(os.getenv("LLM_ATTEMPTS", "2"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
 
-# 2️⃣ Initialize Pinecone (v3 client)
-pc = Pinecone(api_key=PINECONE_API_KEY)
-try:
-    index = pc.Index(INDEX_NAME)
-except Exception as e:
-    raise RuntimeError(
-        f"Failed to connect to Pinecone index '{INDEX_NAME}'. Ensure it exists and API key/env are correct. Error: {e}"
-    )
+# 2️⃣ Backends are created on first use; `configure` swaps in alternatives
+#    (e.g. the offline fakes used by src/benchmarks/loadtest.py)
+index = None
+embedding_model = None
+llm = None
+_backend_lock = threading.Lock()
+
+def _require_env(*pairs):
+    missing_env = [name for name, val in pairs if not val]
+    if missing_env:
+        raise RuntimeError(
+            "Missing required environment variables: " + ", ".join(missing_env) +
+            ". Please add them to your .env at project root."
+        )
+
+def configure(vector_index=None, embedder=None, chat_model=None):
+    """Use the given vector index / sentence embedder / chat model instead of the defaults."""
+    global index, embedding_model, llm
+    with _backend_lock:
+        if vector_index is not None:
+            index = vector_index
+        if embedder is not None:
+            embedding_model = embedder
+        if chat_model is not None:
+            llm = chat_model
+
+def _get_index():
+    global index
+    if index is None:
+        with _backend_lock:
+            if index is None:
+                _require_env(
+                    ("PINECONE_API_KEY", PINECONE_API_KEY),
+                    ("PINECONE_ENVIRONMENT", PINECONE_ENV),
+                    ("PINECONE_INDEX_NAME", INDEX_NAME),
+                )
+                # Initialize Pinecone (v3 client)
+                pc = Pinecone(api_key=PINECONE_API_KEY)
+                try:
+                    index = pc.Index(INDEX_NAME)
+                except Exception as e:
+                    raise RuntimeError(
+                        f"Failed to connect to Pinecone index '{INDEX_NAME}'. Ensure it exists and API key/env are correct. Error: {e}"
+                    )
+    return index
 
 # 3️⃣ Create embedding model for queries
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+def _get_embedder():
+    global embedding_model
+    if embedding_model is None:
+        with _backend_lock:
+            if embedding_model is None:
+                embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    return embedding_model
 
 def embed_query(text: str) -> List[float]:
-    vec = embedding_model.encode([text], normalize_embeddings=True)
+    with stage("embed"):
+        vec = _get_embedder().encode([text], normalize_embeddings=True)
     return vec.astype(np.float32)[0].tolist()
 
-def retrieve_context(query: str, top_k: int = 5) -> List[Dict]:
-    query_vec = embed_query(query)
-    results = index.query(vector=query_vec, top_k=top_k, include_metadata=True)
-    matches = results.get("matches", []) or []
-    return matches
+def embed_sentences(texts: List[str]) -> np.ndarray:
+    with stage("embed", sentences=len(texts)):
+        return _get_embedder().encode(texts, batch_size=64, normalize_embeddings=True).astype(np.float32)
+
+_vector_latency = LatencyTracker()
+
+def _query_index(query_vec: List[float], top_k: int, deadline: Deadline) -> List[Dict]:
+    """Pinecone query with hedging and retries; falls back to the local index."""
+    def once():
+        start = time.perf_counter()
+        results = _get_index().query(vector=query_vec, top_k=top_k, include_metadata=True)
+        _vector_latency.record(time.perf_counter() - start)
+        return results.get("matches", []) or []
+
+    budget = deadline.sub(RETRIEVAL_BUDGET_SECONDS)
+    # Send a duplicate request once the first is slower than p95 of recent queries
+    hedge_after = _vector_latency.percentile(VECTOR_HEDGE_PERCENTILE)
+    with stage("vector_query", top_k=top_k, backend="pinecone") as span:
+        try:
+            return retry(lambda: hedged(once, budget, hedge_after), budget, attempts=VECTOR_ATTEMPTS)
+        except Exception as e:
+            logger.warning("Pinecone query failed (%s); using local index", e)
+            span.set_attribute("legabot.fallback", True)
+    with stage("vector_query", top_k=top_k, backend="local"):
+        return get_local_index().search(query_vec, top_k)
+
+def retrieve_context(
+    query: str,
+    top_k: int = 5,
+    query_vec: Optional[List[float]] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict]:
+    if query_vec is None:
+        query_vec = embed_query(query)
+    if deadline is None:
+        deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+    if not RERANK_ENABLED:
+        return _query_index(query_vec, top_k, deadline)
+
+    # Over-fetch, then keep the reranker's best few (vector order if it was skipped)
+    candidates = _query_index(query_vec, max(top_k, RERANK_CANDIDATES), deadline)
+    counts = {"hits": 0, "misses": 0}
+    with stage("rerank", candidates=len(candidates)) as span:
+        reranked = get_reranker().rerank(query, candidates, top_n=top_k, counts=counts)
+        span.set_attribute("legabot.skipped", reranked is None)
+    record_cache("rerank", **counts)
+    return reranked if reranked is not None else candidates[:top_k]
 
 # 4️⃣ Define system prompt
 prompt = PromptTemplate(
@@ -71,36 +172,137 @@ prompt = PromptTemplate(
 )
 
 # 5️⃣ Create LLM
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.2)
+def _get_llm():
+    global llm
+    if llm is None:
+        with _backend_lock:
+            if llm is None:
+                _require_env(("OPENAI_API_KEY", OPENAI_API_KEY))
+                # Retries are ours (deadline-aware), so the client's own retries are off
+                llm = ChatOpenAI(model=LLM_MODEL, temperature=0.2, timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+    return llm
 
-# 6️⃣ Format retrieved docs to show sources
+# 6️⃣ Format retrieved docs to show sources (token-budgeted, overlaps merged)
 def format_matches(matches: List[Dict]) -> str:
-    combined: List[str] = []
-    for m in matches:
-        md = m.get("metadata", {}) or {}
-        text = (md.get("text") or "").strip().replace("\n", " ")
-        src = md.get("file_name", md.get("source", "Unknown Source"))
-        if not text:
-            continue
-        combined.append(f"[{src}]\n{text}")
-    return "\n\n".join(combined)
+    with stage("context_pack", matches=len(matches)):
+        return pack_context(matches, model=LLM_MODEL)
 
 # 7️⃣ Build Retrieval-Augmented Generation (RAG) chain (manual retrieval)
-def run_rag(query: str) -> str:
-    matches = retrieve_context(query, top_k=5)
+def _stream_completion(prompt_text: str, timeout: float) -> str:
+    """Stream the completion so time-to-first-token can be measured."""
+    start = time.perf_counter()
+    parts: List[str] = []
+    for chunk in _get_llm().stream(prompt_text, timeout=timeout):
+        if not parts:
+            record_ttft(time.perf_counter() - start, model=LLM_MODEL)
+        parts.append(chunk.content or "")
+    return "".join(parts)
+
+def generate(prompt_text: str, deadline: Deadline, user_id: Optional[str] = None) -> str:
+    def attempt():
+        # Bounded, per-user fair admission to the LLM; the HTTP call gets what is left
+        return get_scheduler().run(
+            lambda: _stream_completion(prompt_text, deadline.remaining()),
+            user_id=user_id,
+            timeout=deadline.remaining(),
+        )
+    prompt_tokens = count_tokens(prompt_text, LLM_MODEL)
+    with stage("llm", model=LLM_MODEL, prompt_tokens=prompt_tokens) as span:
+        answer = retry(attempt, deadline, attempts=LLM_ATTEMPTS, give_up_on=(SchedulerBusy,))
+        span.set_attribute("legabot.queue_wait_ms", queue_wait.get() * 1000)
+        completion_tokens = count_tokens(answer, LLM_MODEL)
+        span.set_attribute("legabot.completion_tokens", completion_tokens)
+    record_tokens("prompt", prompt_tokens, LLM_MODEL)
+    record_tokens("completion", completion_tokens, LLM_MODEL)
+    return answer
+
+def degraded_answer(context: str) -> str:
+    return (
+        "⚠️ The answer service is not responding right now, so here are the most "
+        "relevant passages I found. Please try again shortly for a full answer.\n\n"
+        + context
+    )
+
+def run_rag(query: str, user_id: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
+    deadline = deadline or Deadline(REQUEST_DEADLINE_SECONDS)
+    # Shed before embedding and retrieval rather than after, when the LLM queue is full
+    get_scheduler().check_admission(user_id)
+    query_vec = embed_query(query)
+    matches = retrieve_context(query, top_k=5, query_vec=query_vec, deadline=deadline)
+    if CONTEXT_COMPRESSION:
+        with stage("compress", matches=len(matches)):
+            matches = compress_matches(query_vec, matches, embed_sentences)
     context = format_matches(matches)
     prompt_text = prompt.format(context=context, question=query)
-    result = llm.invoke(prompt_text)
-    return StrOutputParser().invoke(result)
+    try:
+        return generate(prompt_text, deadline, user_id=user_id)
+    except SchedulerBusy:
+        raise
+    except Exception as e:
+        if not context:
+            raise
+        logger.warning("LLM call failed (%s); answering with retrieved passages", e)
+        return degraded_answer(context)
 
-# 8️⃣ Function to get legal answer
-def get_legal_answer(query: str):
+# 8️⃣ Function to get legal answer (identical in-flight questions share one computation)
+_answer_flight = SingleFlight()
+_async_answer_flight = AsyncSingleFlight()
+
+def normalise_query(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+def _flight_key(query: str):
+    return (normalise_query(query), INDEX_NAME, INDEX_VERSION)
+
+def _answer(query: str, user_id: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
     try:
-        response = run_rag(query)
+        with stage("answer", top_k=5, compression=CONTEXT_COMPRESSION, rerank=RERANK_ENABLED):
+            response = run_rag(query, user_id=user_id, deadline=deadline)
         return response
+    except SchedulerBusy:
+        return BUSY_MESSAGE
     except Exception as e:
         return f"⚠️ Error: {str(e)}"
 
+def get_legal_answer(query: str, user_id: Optional[str] = None, deadline: Optional[Deadline] = None):
+    ran = []
+
+    def lead():
+        ran.append(True)
+        return _answer(query, user_id, deadline)
+
+    with profile_call("get_legal_answer"), stage("request") as span:
+        answer = _answer_flight.do(_flight_key(query), lead)
+        span.set_attribute("legabot.coalesced", not ran)
+    record_cache("singleflight", hits=0 if ran else 1, misses=1 if ran else 0)
+    return answer
+
+async def aget_legal_answer(query: str, user_id: Optional[str] = None) -> str:
+    """Async counterpart for event-loop UIs; runs the pipeline off the loop."""
+    return await _async_answer_flight.do(
+        _flight_key(query), lambda: asyncio.to_thread(get_legal_answer, query, user_id)
+    )
+
+def warmup() -> Dict[str, str]:
+    """Load the embedder (and reranker) and connect the index and LLM now rather than on the first question.
+
+    Returns {backend: error} for any that could not be set up (they are retried on use).
+    """
+    errors = {}
+    backends = [("embedder", _get_embedder), ("index", _get_index), ("llm", _get_llm)]
+    if RERANK_ENABLED:
+        # Loads the cross-encoder and seeds its latency estimate with a warm measurement
+        backends.append(("reranker", lambda: get_reranker().warmup()))
+    for name, get in backends:
+        try:
+            get()
+        except Exception as e:
+            errors[name] = str(e)
+    return errors
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    return {"sync": dict(_answer_flight.stats), "async": dict(_async_answer_flight.stats)}
+
 # 9️⃣ Run from terminal
 if __name__ == "__main__":
     print("🔎 Ask your legal question (type 'exit' to quit)\n")
@@ -0,0 +1,143 @@
+"""
+Deadlines, bounded retries and hedged requests for remote calls.
+
+A `Deadline` is created once per question and handed down through retrieval
+and generation, so every stage knows how much time is left. Retries use full
+jitter backoff and never sleep past the deadline. `hedged` sends a duplicate
+request when the first one is slower than a latency percentile and returns
+whichever finishes first.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Any, Callable, Deque, Optional, Tuple, Type
+
+RESILIENCE_WORKERS = int(os.getenv("RESILIENCE_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=RESILIENCE_WORKERS, thread_name_prefix="legabot-remote")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage runs out of its share of the request deadline."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, cap: Optional[float] = None) -> float:
+        """Time a stage may use: what is left, capped at the stage's own budget."""
+        left = self.remaining()
+        return left if cap is None else min(left, cap)
+
+    def sub(self, cap: float) -> "Deadline":
+        """A child deadline for one stage that never outlives this one."""
+        return Deadline(self.budget(cap))
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for percentile-based hedging."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+def call_with_timeout(fn: Callable[[], Any], timeout: float) -> Any:
+    """
+    Run `fn` on the shared pool and stop waiting after `timeout` seconds. The
+    call itself cannot be interrupted, so prefer a client-side timeout when
+    the library offers one.
+    """
+    if timeout <= 0:
+        raise DeadlineExceeded("no time left")
+    future = _executor.submit(fn)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"timed out after {timeout:.2f}s")
+
+
+def retry(
+    fn: Callable[[], Any],
+    deadline: Deadline,
+    attempts: int = 3,
+    base_delay: float = 0.2,
+    max_delay: float = 2.0,
+    give_up_on: Tuple[Type[BaseException], ...] = (),
+) -> Any:
+    """Call `fn` up to `attempts` times with full-jitter exponential backoff."""
+    last_error: Optional[BaseException] = None
+    for attempt in range(attempts):
+        if deadline.expired:
+            break
+        try:
+            return fn()
+        except give_up_on:
+            raise
+        except Exception as e:
+            last_error = e
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+        if attempt == attempts - 1 or delay >= deadline.remaining():
+            break
+        time.sleep(delay)
+    if last_error is not None:
+        raise last_error
+    raise DeadlineExceeded("deadline expired before the call could start")
+
+
+def hedged(fn: Callable[[], Any], deadline: Deadline, hedge_after: Optional[float]) -> Any:
+    """
+    Run `fn`; if it has not finished after `hedge_after` seconds, start a
+    duplicate and return the first successful result. With `hedge_after`
+    None this is just a call bounded by the deadline.
+    """
+    first = _executor.submit(fn)
+    pending = {first}
+    if hedge_after is not None and hedge_after < deadline.remaining():
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            pending.add(_executor.submit(fn))
+
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            if f.exception() is None:
+                for p in pending:
+                    p.cancel()
+                return f.result()
+            error = f.exception()
+    for p in pending:
+        p.cancel()
+    if error is not None and not pending:
+        raise error
+    raise DeadlineExceeded("hedged call missed its deadline")
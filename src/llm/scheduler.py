@@ -0,0 +1,196 @@
+"""
+Bounded-concurrency scheduler in front of the LLM client.
+
+- A global cap limits how many LLM calls a worker has in flight at once, so a
+  burst of users cannot trip the provider's rate limits for everyone.
+- Waiting calls sit in one FIFO queue per user and free slots are handed out
+  round-robin across users, so one heavy user cannot starve the others.
+- When the queue is full (globally or for one user) new calls are rejected
+  straight away with `SchedulerBusy` instead of timing out later;
+  `check_admission` lets a caller find that out before doing the work that
+  leads up to the call.
+
+The scheduler is framework-agnostic: `run` blocks the calling thread (HTTP
+worker threads, `asyncio.to_thread` from Chainlit), `arun` is the coroutine
+wrapper. Any callable can be scheduled, so it is testable with a stub LLM.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "4"))
+
+BUSY_MESSAGE = (
+    "⏳ LegaBot is handling a lot of questions right now. "
+    "Please try again in a few seconds."
+)
+
+ANONYMOUS = "anonymous"
+
+# Queue wait (seconds) of the most recent scheduled call in this context
+queue_wait: ContextVar[float] = ContextVar("llm_queue_wait", default=0.0)
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a call is shed because the queue is full."""
+
+
+class _Ticket:
+    __slots__ = ("user", "event", "enqueued_at", "admitted_at")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+
+    @property
+    def wait(self) -> float:
+        return (self.admitted_at or time.monotonic()) - self.enqueued_at
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_queue_per_user: int = LLM_MAX_QUEUE_PER_USER,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # user -> waiting tickets; order of keys is the round-robin order
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._queued = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timed_out": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    # ---- queue bookkeeping (caller holds the lock) ----
+
+    def _dispatch(self):
+        while self._in_flight < self.max_concurrency and self._queues:
+            user, q = next(iter(self._queues.items()))
+            ticket = q.popleft()
+            self._queued -= 1
+            # Rotate this user to the back so the next slot goes to someone else
+            del self._queues[user]
+            if q:
+                self._queues[user] = q
+            ticket.admitted_at = time.monotonic()
+            self._in_flight += 1
+            ticket.event.set()
+
+    def _enqueue(self, user: str) -> _Ticket:
+        ticket = _Ticket(user)
+        if self._in_flight < self.max_concurrency and not self._queues:
+            ticket.admitted_at = ticket.enqueued_at
+            self._in_flight += 1
+            ticket.event.set()
+            return ticket
+        if self._full(user):
+            self.stats["rejected"] += 1
+            raise SchedulerBusy(BUSY_MESSAGE)
+        self._queues.setdefault(user, deque()).append(ticket)
+        self._queued += 1
+        return ticket
+
+    def _withdraw(self, ticket: _Ticket):
+        """Take a ticket that gave up waiting out of its user's queue."""
+        q = self._queues[ticket.user]
+        q.remove(ticket)
+        self._queued -= 1
+        if not q:
+            del self._queues[ticket.user]
+
+    def _full(self, user: str) -> bool:
+        return self._queued >= self.max_queue or len(self._queues.get(user, ())) >= self.max_queue_per_user
+
+    # ---- public API ----
+
+    def check_admission(self, user_id: Optional[str] = None):
+        """Raise `SchedulerBusy` now if a call for `user_id` would be shed.
+
+        Lets callers skip the work that precedes the LLM call (embedding,
+        retrieval) when it would be thrown away; `acquire` still decides.
+        """
+        user = user_id or ANONYMOUS
+        with self._lock:
+            if self._in_flight >= self.max_concurrency and self._full(user):
+                self.stats["rejected"] += 1
+                raise SchedulerBusy(BUSY_MESSAGE)
+
+    def acquire(self, user_id: Optional[str] = None, timeout: Optional[float] = None) -> float:
+        """Wait for a slot; returns the queue wait in seconds. Pair with `release()`."""
+        user = user_id or ANONYMOUS
+        with self._lock:
+            ticket = self._enqueue(user)
+        if not ticket.event.wait(timeout):
+            with self._lock:
+                if not ticket.event.is_set():
+                    self._withdraw(ticket)
+                    self.stats["timed_out"] += 1
+                    raise SchedulerBusy(BUSY_MESSAGE)
+        with self._lock:
+            self.stats["admitted"] += 1
+            self.stats["total_wait"] += ticket.wait
+            self.stats["max_wait"] = max(self.stats["max_wait"], ticket.wait)
+        queue_wait.set(ticket.wait)
+        logger.info("llm slot admitted user=%s queue_wait_ms=%.1f", user, ticket.wait * 1000)
+        return ticket.wait
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _run(self, fn: Callable[..., Any], args, kwargs, user_id: Optional[str],
+             timeout: Optional[float]) -> Tuple[Any, float]:
+        wait = self.acquire(user_id, timeout)
+        try:
+            return fn(*args, **kwargs), wait
+        finally:
+            self.release()
+
+    def run(self, fn: Callable[..., Any], *args, user_id: Optional[str] = None,
+            timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` once a slot is free for `user_id`."""
+        return self._run(fn, args, kwargs, user_id, timeout)[0]
+
+    async def arun(self, fn: Callable[..., Any], *args, user_id: Optional[str] = None,
+                   timeout: Optional[float] = None, **kwargs) -> Any:
+        # to_thread runs in a copy of our context, so queue_wait is set again here
+        result, wait = await asyncio.to_thread(self._run, fn, args, kwargs, user_id, timeout)
+        queue_wait.set(wait)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            admitted = self.stats["admitted"]
+            return {
+                **self.stats,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "users_waiting": len(self._queues),
+                "avg_wait": self.stats["total_wait"] / admitted if admitted else 0.0,
+            }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
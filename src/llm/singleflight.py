@@ -0,0 +1,84 @@
+"""
+Single-flight request coalescing.
+
+When many users ask the same question at the same moment (e.g. everyone
+clicking the same example button), only the first caller runs the expensive
+retrieval + LLM call; the others wait for it and receive the same result.
+Nothing is cached once the call finishes — this only merges calls that are
+in flight at the same time.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutine calls with the same key on one event loop.
+    The shared work runs in its own task, so a waiter being cancelled (e.g. a
+    user closing the tab) does not cancel it for everyone else.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        task = self._tasks.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _t, k=key: self._tasks.pop(k, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
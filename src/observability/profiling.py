@@ -0,0 +1,156 @@
+"""
+On-demand sampling profiler for the serving hot path.
+
+A fraction of calls wrapped in `profile_call(name)` get a background sampler
+thread that records the calling thread's stack every few milliseconds. Each
+sampled call is written as a collapsed-stack file (`*.folded`, one
+"frame;frame;frame count" line per stack) that flamegraph.pl, speedscope or
+inferno can render directly.
+
+Sampling can be switched at runtime without a redeploy:
+  - LEGABOT_PROFILE_RATE at startup (0 = off, 1 = every call)
+  - `set_sample_rate()` from an admin action
+  - writing {"rate": 0.05} to the control file (LEGABOT_PROFILE_CONTROL),
+    which is re-read at most once a second
+Output is capped by file count and total size; the oldest profiles go first.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+PROFILE_DIR = Path(os.getenv("LEGABOT_PROFILE_DIR", str(PROJECT_ROOT / "profiles")))
+PROFILE_CONTROL = Path(os.getenv("LEGABOT_PROFILE_CONTROL", str(PROFILE_DIR / "control.json")))
+PROFILE_INTERVAL_MS = float(os.getenv("LEGABOT_PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("LEGABOT_PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_MB = float(os.getenv("LEGABOT_PROFILE_MAX_MB", "50"))
+
+_rate = float(os.getenv("LEGABOT_PROFILE_RATE", "0"))
+_control_mtime: Optional[float] = None
+_control_checked = 0.0
+_lock = threading.Lock()
+
+
+def set_sample_rate(rate: float):
+    """Fraction of calls to profile (0 disables)."""
+    global _rate
+    _rate = min(1.0, max(0.0, float(rate)))
+    logger.info("profiling sample rate set to %.3f", _rate)
+
+
+def get_sample_rate() -> float:
+    _poll_control_file()
+    return _rate
+
+
+def _poll_control_file():
+    global _control_mtime, _control_checked
+    now = time.monotonic()
+    if now - _control_checked < 1.0:
+        return
+    with _lock:
+        _control_checked = now
+        try:
+            mtime = PROFILE_CONTROL.stat().st_mtime
+        except OSError:
+            return
+        if mtime == _control_mtime:
+            return
+        _control_mtime = mtime
+        try:
+            set_sample_rate(json.loads(PROFILE_CONTROL.read_text())["rate"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("ignoring bad profiling control file %s: %s", PROFILE_CONTROL, e)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's stack on a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="legabot-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _enforce_caps():
+    files = sorted(PROFILE_DIR.glob("*.folded"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    max_bytes = PROFILE_MAX_MB * 1024 * 1024
+    while files and (len(files) > PROFILE_MAX_FILES or total > max_bytes):
+        oldest = files.pop(0)
+        total -= oldest.stat().st_size
+        oldest.unlink(missing_ok=True)
+
+
+def _write_profile(name: str, sampler: StackSampler, elapsed: float) -> Optional[Path]:
+    if not sampler.samples:
+        return None
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = PROFILE_DIR / f"{stamp}-{name}-{os.getpid()}-{int(elapsed * 1000)}ms-{random.randrange(16 ** 4):04x}.folded"
+    path.write_text(sampler.folded(), encoding="utf-8")
+    with _lock:
+        _enforce_caps()
+    return path
+
+
+@contextmanager
+def profile_call(name: str):
+    """Profile the enclosed block for a sampled fraction of calls."""
+    rate = get_sample_rate()
+    if rate <= 0 or random.random() >= rate:
+        yield
+        return
+    sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        try:
+            _write_profile(name, sampler, time.perf_counter() - start)
+        except OSError as e:
+            logger.warning("could not write profile for %s: %s", name, e)
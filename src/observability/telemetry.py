@@ -0,0 +1,187 @@
+"""
+OpenTelemetry tracing and metrics for the RAG pipeline.
+
+Exporter is chosen with LEGABOT_OTEL_EXPORTER:
+  none     – default; the OpenTelemetry API stays a no-op
+  console  – spans and metrics printed to stdout
+  file     – JSON lines under LEGABOT_OTEL_DIR (works fully offline)
+  otlp     – OTLP to a collector (OTEL_EXPORTER_OTLP_ENDPOINT, default localhost)
+
+Every pipeline stage is wrapped in `stage(name, **attrs)`, which opens a span
+and records its duration in the `legabot.stage.duration` histogram.
+"""
+
+import atexit
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from opentelemetry import metrics, trace
+except ImportError:  # telemetry is optional
+    metrics, trace = None, None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+OTEL_EXPORTER = os.getenv("LEGABOT_OTEL_EXPORTER", "none").lower()
+OTEL_DIR = Path(os.getenv("LEGABOT_OTEL_DIR", str(PROJECT_ROOT / "telemetry")))
+OTLP_PROTOCOL = os.getenv("LEGABOT_OTLP_PROTOCOL", "http").lower()
+METRIC_INTERVAL_MS = int(os.getenv("LEGABOT_OTEL_METRIC_INTERVAL_MS", "15000"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "legabot")
+
+_init_lock = threading.Lock()
+_initialised = False
+_instruments: Dict[str, Any] = {}
+
+
+def _exporters():
+    """Return (span_exporter, metric_exporter) for the configured backend."""
+    if OTEL_EXPORTER == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        return ConsoleSpanExporter(), ConsoleMetricExporter()
+
+    if OTEL_EXPORTER == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        OTEL_DIR.mkdir(parents=True, exist_ok=True)
+        spans = open(OTEL_DIR / "spans.jsonl", "a", encoding="utf-8")
+        metric_out = open(OTEL_DIR / "metrics.jsonl", "a", encoding="utf-8")
+        return (
+            ConsoleSpanExporter(out=spans, formatter=lambda s: s.to_json(indent=None) + "\n"),
+            ConsoleMetricExporter(out=metric_out, formatter=lambda m: m.to_json(indent=None) + "\n"),
+        )
+
+    if OTEL_EXPORTER == "otlp":
+        if OTLP_PROTOCOL == "grpc":
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        else:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        return OTLPSpanExporter(), OTLPMetricExporter()
+
+    return None, None
+
+
+def init_telemetry():
+    """Install tracer/meter providers once per process (no-op when disabled)."""
+    global _initialised
+    if _initialised or trace is None:
+        return
+    with _init_lock:
+        if _initialised:
+            return
+        span_exporter, metric_exporter = _exporters()
+        if span_exporter is not None:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+            resource = Resource.create({"service.name": SERVICE_NAME})
+            tracer_provider = TracerProvider(resource=resource)
+            tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+            trace.set_tracer_provider(tracer_provider)
+
+            reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=METRIC_INTERVAL_MS)
+            meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
+            metrics.set_meter_provider(meter_provider)
+
+            atexit.register(tracer_provider.shutdown)
+            atexit.register(meter_provider.shutdown)
+
+        meter = metrics.get_meter("legabot")
+        _instruments["stage_ms"] = meter.create_histogram(
+            "legabot.stage.duration", unit="ms", description="Duration of one pipeline stage")
+        _instruments["ttft_ms"] = meter.create_histogram(
+            "legabot.llm.time_to_first_token", unit="ms", description="LLM time to first streamed token")
+        _instruments["tokens"] = meter.create_histogram(
+            "legabot.llm.tokens", unit="{token}", description="Prompt and completion tokens per answer")
+        _instruments["cache"] = meter.create_counter(
+            "legabot.cache.lookups", description="Cache lookups by cache name and outcome")
+        # Last: other threads skip the lock once this is set and use _instruments straight away
+        _initialised = True
+
+
+def _clean(attrs: Dict[str, Any]) -> Dict[str, Any]:
+    return {f"legabot.{k}": v for k, v in attrs.items() if isinstance(v, (str, bool, int, float))}
+
+
+class _NoSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+
+@contextmanager
+def stage(name: str, **attrs):
+    """
+    Span + duration histogram for one pipeline stage. Extra attributes can be
+    added inside the block with `span.set_attribute("legabot.x", ...)`.
+    The histogram is tagged with the stage name and `backend`, if given.
+    """
+    init_telemetry()
+    if trace is None:
+        yield _NoSpan()
+        return
+    start = time.perf_counter()
+    with trace.get_tracer("legabot").start_as_current_span(f"legabot.{name}", attributes=_clean(attrs)) as span:
+        try:
+            yield span
+        finally:
+            labels = {"stage": name}
+            if "backend" in attrs:
+                labels["backend"] = str(attrs["backend"])
+            _instruments["stage_ms"].record((time.perf_counter() - start) * 1000, labels)
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of `stage` for whole functions (sync or async)."""
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def ainner(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return ainner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def record_ttft(seconds: float, **attrs):
+    init_telemetry()
+    if trace is not None:
+        _instruments["ttft_ms"].record(seconds * 1000, {k: str(v) for k, v in attrs.items()})
+
+
+def record_tokens(kind: str, count: int, model: Optional[str] = None):
+    init_telemetry()
+    if trace is not None:
+        labels = {"kind": kind}
+        if model:
+            labels["model"] = model
+        _instruments["tokens"].record(count, labels)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    init_telemetry()
+    if trace is None:
+        return
+    if hits:
+        _instruments["cache"].add(hits, {"cache": cache, "outcome": "hit"})
+    if misses:
+        _instruments["cache"].add(misses, {"cache": cache, "outcome": "miss"})
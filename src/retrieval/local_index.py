@@ -0,0 +1,73 @@
+# 📁 File: src/retrieval/local_index.py
+# In-process vector search over Data/legal_embeddings.npy
+
+"""
+A brute-force cosine index over the same chunks that were uploaded to
+Pinecone. It returns matches shaped like Pinecone's (id = row number in
+legal_text.csv, score, metadata.text/file_name), so it can stand in for the
+remote index when Pinecone is slow or unavailable.
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+TEXT_FILE = PROJECT_ROOT / "Data" / "legal_text.csv"
+EMBED_FILE = PROJECT_ROOT / "Data" / "legal_embeddings.npy"
+
+# Same snippet length as store_pinecone.py keeps in metadata
+SNIPPET_CHARS = 800
+
+
+class LocalIndex:
+    def __init__(self, embeddings: np.ndarray, texts: Sequence[str], file_names: Sequence[str]):
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        self.embeddings = vecs / np.maximum(norms, 1e-12)
+        self.texts = list(texts)
+        self.file_names = list(file_names)
+
+    @classmethod
+    def from_files(cls, text_file: Path = TEXT_FILE, embed_file: Path = EMBED_FILE) -> "LocalIndex":
+        df = pd.read_csv(text_file)
+        embeddings = np.load(embed_file)
+        if len(df) != len(embeddings):
+            raise RuntimeError(f"{text_file.name} has {len(df)} rows but {embed_file.name} has {len(embeddings)} vectors")
+        return cls(embeddings, df["text"].astype(str).tolist(), df["file_name"].astype(str).tolist())
+
+    def search(self, query_vec: Sequence[float], top_k: int = 5) -> List[Dict]:
+        q = np.asarray(query_vec, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        scores = self.embeddings @ q
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "id": str(i),
+                "score": float(scores[i]),
+                "metadata": {"text": self.texts[i][:SNIPPET_CHARS], "file_name": self.file_names[i]},
+            }
+            for i in top
+        ]
+
+    def query(self, vector: Sequence[float], top_k: int = 5, include_metadata: bool = True, **_) -> Dict:
+        """Pinecone-compatible `index.query` signature."""
+        return {"matches": self.search(vector, top_k)}
+
+
+_local: Optional[LocalIndex] = None
+_lock = threading.Lock()
+
+
+def get_local_index() -> LocalIndex:
+    global _local
+    if _local is None:
+        with _lock:
+            if _local is None:
+                _local = LocalIndex.from_files()
+    return _local
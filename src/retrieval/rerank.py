@@ -0,0 +1,154 @@
+# 📁 File: src/retrieval/rerank.py
+# Cross-encoder reranking of over-fetched vector matches
+
+"""
+The vector store returns candidates ordered by bi-encoder similarity, which is
+cheap but imprecise. A small local cross-encoder scores (query, chunk) pairs
+jointly, so we can over-fetch candidates, keep only the best few and send
+fewer chunks to the LLM.
+
+Scores are cached per (query, chunk) and the stage has a latency budget: when
+the estimated cost of scoring the uncached pairs exceeds it, reranking is
+skipped and the caller falls back to vector order.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+
+# Weight of the newest observation in the per-pair latency estimate
+_EWMA_ALPHA = 0.2
+# Each skipped call shrinks the estimate by this factor, so one slow (cold)
+# measurement cannot switch reranking off for good: the estimate drifts back
+# under the budget, the next call scores for real and re-measures.
+_SKIP_DECAY = 0.9
+
+
+def _chunk_text(m: Dict) -> str:
+    md = m.get("metadata", {}) or {}
+    return (md.get("text") or "").strip()
+
+
+def _cache_key(query: str, text: str) -> Tuple[str, str]:
+    q = " ".join(query.lower().split())
+    return q, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        top_n: int = RERANK_TOP_N,
+        budget_ms: float = RERANK_BUDGET_MS,
+        cache_size: int = RERANK_CACHE_SIZE,
+        batch_size: int = 32,
+    ):
+        self.model_name = model_name
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._pair_ms: Optional[float] = None
+        self.stats = {"calls": 0, "skipped": 0, "cache_hits": 0, "pairs_scored": 0}
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=512)
+        return self._model
+
+    def warmup(self):
+        """Load the model and seed the latency estimate outside the request path."""
+        model = self._get_model()
+        start = time.perf_counter()
+        model.predict([("warmup", "warmup")] * 4, batch_size=self.batch_size)
+        self._pair_ms = (time.perf_counter() - start) * 1000 / 4
+
+    def estimate_ms(self, n_pairs: int) -> float:
+        if self._pair_ms is None or n_pairs == 0:
+            return 0.0
+        return self._pair_ms * n_pairs
+
+    def rerank(self, query: str, matches: List[Dict], top_n: Optional[int] = None,
+               counts: Optional[Dict[str, int]] = None) -> Optional[List[Dict]]:
+        """
+        Return the `top_n` best matches by cross-encoder score (as plain dicts
+        carrying `rerank_score`), or None if scoring would exceed the budget.
+
+        `counts`, if given, gets this call's score-cache "hits" and "misses"
+        (`stats` is shared by concurrent calls).
+        """
+        n = self.top_n if top_n is None else top_n
+        texts = [_chunk_text(m) for m in matches]
+        keys = [_cache_key(query, t) for t in texts]
+
+        scores: List[Optional[float]] = []
+        with self._lock:
+            for k in keys:
+                s = self._cache.get(k)
+                if s is not None:
+                    self._cache.move_to_end(k)
+                scores.append(s)
+            todo = [i for i, s in enumerate(scores) if s is None]
+            self.stats["calls"] += 1
+            self.stats["cache_hits"] += len(keys) - len(todo)
+        if counts is not None:
+            counts.update(hits=len(keys) - len(todo), misses=len(todo))
+
+        if self.estimate_ms(len(todo)) > self.budget_ms:
+            with self._lock:
+                self.stats["skipped"] += 1
+                self._pair_ms *= _SKIP_DECAY
+            return None
+
+        if todo:
+            model = self._get_model()
+            start = time.perf_counter()
+            fresh = model.predict([(query, texts[i]) for i in todo], batch_size=self.batch_size)
+            per_pair = (time.perf_counter() - start) * 1000 / len(todo)
+            with self._lock:
+                self.stats["pairs_scored"] += len(todo)
+                self._pair_ms = per_pair if self._pair_ms is None else (
+                    _EWMA_ALPHA * per_pair + (1 - _EWMA_ALPHA) * self._pair_ms
+                )
+                for i, s in zip(todo, fresh):
+                    scores[i] = float(s)
+                    self._cache[keys[i]] = float(s)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        ranked = sorted(zip(matches, scores), key=lambda p: p[1], reverse=True)[:n]
+        return [
+            {
+                "id": m.get("id"),
+                "score": m.get("score"),
+                "rerank_score": s,
+                "metadata": m.get("metadata", {}) or {},
+            }
+            for m, s in ranked
+        ]
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+    return _reranker
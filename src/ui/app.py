@@ -1,5 +1,5 @@
 from __future__ import annotations
-import os, sys
+import logging, os, sys, threading
 from pathlib import Path
 
 # --- Path/bootstrap so `src.*` imports work when launching from anywhere
@@ -18,7 +18,9 @@ from src.auth.auth_service import (
     signup_email_password,
     logout as sb_logout,
     current_user,
+    current_access_token,
 )
+from src.auth.session import start_session
 
 # Optional helper to resend email confirmation
 try:
@@ -26,7 +28,14 @@ try:
 except Exception:
     resend_confirmation = None
 
-from src.llm.rag_pipeline import get_legal_answer
+from src.db.history_backend import aget_conversation_page, user_client
+from src.db.write_behind import get_writer
+from src.llm import rag_pipeline
+from src.llm.rag_pipeline import aget_legal_answer
+from src.observability.profiling import get_sample_rate, set_sample_rate
+from src.ui import turns
+
+logger = logging.getLogger(__name__)
 
 
 # --------------------------- Constants & Styling ---------------------------
@@ -34,6 +43,14 @@ from src.llm.rag_pipeline import get_legal_answer
 APP_TITLE = "⚖️ LegaBot"
 APP_SUBTITLE = "Indian Legal Research Assistant"
 
+# Users allowed to run admin commands such as /profile
+ADMIN_EMAILS = {
+    e.strip().lower() for e in os.getenv("LEGABOT_ADMIN_EMAILS", "").split(",") if e.strip()
+}
+
+# Messages loaded per "History" / "Load older" click
+HISTORY_PAGE_SIZE = int(os.getenv("LEGABOT_HISTORY_PAGE_SIZE", "10"))
+
 # Message templates with better formatting
 WELCOME_MSG = """# Welcome to LegaBot! ⚖️
 
@@ -79,18 +96,38 @@ Click the examples below or type your own question!
 """
 
 
+# --------------------------- Warmup ---------------------------
+
+def _warmup():
+    for backend, error in rag_pipeline.warmup().items():
+        logger.warning("RAG %s not ready yet: %s", backend, error)
+
+# Model loads and connections happen once per process, off the first question
+threading.Thread(target=_warmup, name="rag-warmup", daemon=True).start()
+
+
 # --------------------------- Session Management ---------------------------
 
 def set_session_user(user: dict | None):
     cl.user_session.set("user", user if user else None)
 
 def get_session_user() -> dict | None:
+    auth = cl.user_session.get("auth")
+    if auth:
+        # Verified locally and refreshed in the background: no auth round trip
+        u = auth.user()
+        set_session_user(u)
+        return u
     u = current_user()
     if u:
         set_session_user(u)
         return u
     return cl.user_session.get("user")
 
+def get_access_token() -> str | None:
+    auth = cl.user_session.get("auth")
+    return auth.access_token if auth else current_access_token()
+
 
 # --------------------------- Notification Helpers ---------------------------
 
@@ -132,6 +169,7 @@ def get_user_actions():
     """Actions for logged-in users"""
     return [
         cl.Action(name="ask_examples", label="💡 Examples", value="ask_examples"),
+        cl.Action(name="history", label="📜 History", value="history"),
         cl.Action(name="profile", label="👤 Profile", value="profile"),
         cl.Action(name="logout", label="🚪 Logout", value="logout"),
     ]
@@ -277,10 +315,12 @@ async def handle_login(action: cl.Action):
         return
     
     try:
-        login_email_password(email, password)
-        u = current_user()
+        res = login_email_password(email, password)
+        auth = start_session(getattr(res, "session", None))
+        u = auth.user() if auth else current_user()
         
         if u:
+            cl.user_session.set("auth", auth)
             set_session_user(u)
             await send_success(f"Welcome back! You're now logged in as **{u.get('email', '')}**")
             await cl.Message(
@@ -395,8 +435,12 @@ Type **yes** to confirm or **no** to cancel.
         return
     
     try:
-        sb_logout()
+        auth = cl.user_session.get("auth")
+        if auth:
+            auth.close()
+        sb_logout(auth.access_token if auth else None)
     finally:
+        cl.user_session.set("auth", None)
         set_session_user(None)
         await cl.Message(
             content="""# 👋 Logged Out Successfully
@@ -469,6 +513,85 @@ async def handle_example_query(action: cl.Action):
     await process_legal_query(action.value)
 
 
+# --------------------------- Admin Commands ---------------------------
+
+def is_admin(user: dict | None) -> bool:
+    return bool(user) and (user.get("email") or "").lower() in ADMIN_EMAILS
+
+
+async def handle_profile_command(command: str):
+    """`/profile` shows the sampling rate, `/profile 0.05` sets it, `/profile off` disables it."""
+    parts = command.split()
+    if len(parts) > 1:
+        arg = parts[1].lower()
+        try:
+            set_sample_rate(0.0 if arg == "off" else float(arg))
+        except ValueError:
+            await send_warning("Usage: `/profile [rate between 0 and 1 | off]`")
+            return
+    await send_info(f"Profiling sample rate: **{get_sample_rate():.3f}**")
+
+
+# --------------------------- Chat History ---------------------------
+
+def get_user_client():
+    """Chat-history handle acting as the signed-in user (see history_backend)."""
+    user = cl.user_session.get("user") or {}
+    return user_client(get_access_token(), user.get("id"))
+
+
+async def persist_turn(query: str, answer: str):
+    """Queue the turn for the write-behind writer (see src/ui/turns.py); never fails the answer."""
+    user = cl.user_session.get("user") or {}
+    conversation_id = await turns.apersist_turn(
+        get_user_client(), user.get("id"), cl.user_session.get("conversation_id"), query, answer
+    )
+    cl.user_session.set("conversation_id", conversation_id)
+
+
+def format_history(messages: list) -> str:
+    lines = []
+    for m in messages:
+        who = "🧑 **You**" if m["role"] == "user" else "⚖️ **LegaBot**"
+        lines.append(f"{who} · *{str(m['created_at'])[:16].replace('T', ' ')}*\n\n{m['content']}")
+    return "\n\n---\n\n".join(lines)
+
+
+async def show_history_page(before: str | None = None):
+    """Newest page first; each "Load older" click fetches one more page back."""
+    sb = get_user_client()
+    conversation_id = cl.user_session.get("conversation_id")
+    if not sb or not conversation_id:
+        await send_info("No saved messages in this conversation yet.")
+        return
+
+    # Awaited on this loop with the postgres backend; unflushed turns are added from memory
+    page = await aget_conversation_page(sb, conversation_id, HISTORY_PAGE_SIZE, before)
+    page = get_writer().overlay_page(page, conversation_id, before)
+    if not page["messages"]:
+        await send_info("No saved messages in this conversation yet.")
+        return
+
+    actions = []
+    if page["older"]:
+        actions.append(cl.Action(name="history_older", label="⬆️ Load older", value=page["older"]))
+    heading = "# 📜 Conversation History" if before is None else "# 📜 Earlier Messages"
+    await cl.Message(
+        content=f"{heading}\n\n{format_history(page['messages'])}",
+        actions=actions or get_user_actions(),
+    ).send()
+
+
+@cl.action_callback("history")
+async def handle_history(action: cl.Action):
+    await show_history_page()
+
+
+@cl.action_callback("history_older")
+async def handle_history_older(action: cl.Action):
+    await show_history_page(before=action.value)
+
+
 # --------------------------- Message Handler ---------------------------
 
 @cl.on_message
@@ -489,6 +612,9 @@ Please login or create an account to continue.
         return
     
     query = message.content.strip()
+    if query.startswith("/profile") and is_admin(user):
+        await handle_profile_command(query)
+        return
     await process_legal_query(query)
 
 
@@ -511,8 +637,9 @@ async def process_legal_query(query: str):
     ).send()
     
     try:
-        # Get answer from RAG pipeline
-        answer = get_legal_answer(query)
+        # Get answer from RAG pipeline (off the event loop, coalesced with identical questions)
+        user = cl.user_session.get("user") or {}
+        answer = await aget_legal_answer(query, user_id=user.get("id"))
         
         # Format and send response
         formatted_answer = f"""# ⚖️ Legal Research Result
@@ -535,6 +662,7 @@ async def process_legal_query(query: str):
             content=formatted_answer,
             actions=get_user_actions()
         ).send()
+        await persist_turn(query, answer)
         
     except Exception as e:
         await send_error(
@@ -47,6 +47,7 @@ from src.auth.auth_service import (
     current_user,
     logout,
 )
+from src.auth.session import start_session
 def st_current_user():
     user = current_user()
     if user:
@@ -57,8 +58,10 @@ def st_current_user():
 def st_login(email: str, password: str):
     try:
         resp = login_email_password(email, password)
-        user = current_user()
+        auth = start_session(getattr(resp, "session", None))
+        user = auth.user() if auth else current_user()
         if user:
+            st.session_state["auth"] = auth
             st.session_state["user"] = user
             return True, "Login successful"
         return False, "Login succeeded but no session found"
@@ -67,7 +70,10 @@ def st_login(email: str, password: str):
 
 def st_logout():
     try:
-        logout()
+        auth = st.session_state.pop("auth", None)
+        if auth:
+            auth.close()
+        logout(auth.access_token if auth else None)
     except Exception:
         pass
     st.session_state.pop("user", None)
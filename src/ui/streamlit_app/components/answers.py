@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import streamlit as st
+from src.llm import rag_pipeline
+from src.ui.turns import is_real_answer
+from src.ui.streamlit_app.components.history import persist_turn
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("LEGABOT_ANSWER_WORKERS", "4"))
+CACHE_PER_USER = int(os.getenv("LEGABOT_ANSWER_CACHE_PER_USER", "20"))
+CACHE_USERS = int(os.getenv("LEGABOT_ANSWER_CACHE_USERS", "500"))
+CACHE_TTL = float(os.getenv("LEGABOT_ANSWER_CACHE_TTL", "3600"))
+POLL_SECONDS = float(os.getenv("LEGABOT_ANSWER_POLL_SECONDS", "1"))
+PENDING_KEY = "legabot_pending"  # {"query", "future", "started"} while an answer is being generated
+
+class AnswerCache:
+    """Each user's last CACHE_PER_USER answers, for the last CACHE_USERS users (LRU at both levels)."""
+
+    def __init__(self, per_user: int = CACHE_PER_USER, users: int = CACHE_USERS, ttl: float = CACHE_TTL):
+        self.per_user = per_user
+        self.users = users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._answers: "OrderedDict[str, OrderedDict[str, tuple]]" = OrderedDict()
+
+    def get(self, user_id: Optional[str], query: str) -> Optional[str]:
+        if not user_id:
+            return None
+        with self._lock:
+            answers = self._answers.get(user_id)
+            item = answers.get(rag_pipeline.normalise_query(query)) if answers else None
+            if item is None or item[0] < time.monotonic():
+                return None
+            self._answers.move_to_end(user_id)
+            answers.move_to_end(rag_pipeline.normalise_query(query))
+            return item[1]
+
+    def put(self, user_id: Optional[str], query: str, answer: str):
+        if not user_id or not is_real_answer(answer):
+            return
+        with self._lock:
+            answers = self._answers.setdefault(user_id, OrderedDict())
+            self._answers.move_to_end(user_id)
+            answers[rag_pipeline.normalise_query(query)] = (time.monotonic() + self.ttl, answer)
+            answers.move_to_end(rag_pipeline.normalise_query(query))
+            while len(answers) > self.per_user:
+                answers.popitem(last=False)
+            while len(self._answers) > self.users:
+                self._answers.popitem(last=False)
+
+# Process-wide: shared by every session and kept across reruns
+@st.cache_resource(show_spinner=False)
+def answer_executor() -> ThreadPoolExecutor:
+    pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="legabot-answer")
+    pool.submit(_warmup)  # model load and connections happen off the first question
+    return pool
+
+@st.cache_resource(show_spinner=False)
+def answer_cache() -> AnswerCache:
+    return AnswerCache()
+
+def _warmup():
+    for backend, error in rag_pipeline.warmup().items():
+        logger.warning("RAG %s not ready yet: %s", backend, error)
+
+def _answer(cache: AnswerCache, user_id: Optional[str], query: str) -> str:
+    answer = rag_pipeline.get_legal_answer(query, user_id=user_id)
+    cache.put(user_id, query, answer)
+    return answer
+
+def is_pending() -> bool:
+    return PENDING_KEY in st.session_state
+
+def ask(user: Optional[dict], query: str):
+    """Answer from the user's cache, or start generating in the background; reruns reattach to it."""
+    user_id = (user or {}).get("id")
+    st.session_state["last_query"] = query
+    cached = answer_cache().get(user_id, query)
+    if cached is not None:
+        st.session_state["last_answer"] = cached
+        persist_turn(user, query, cached)
+        return
+    future: Future = answer_executor().submit(_answer, answer_cache(), user_id, query)
+    st.session_state[PENDING_KEY] = {"query": query, "future": future, "started": time.time()}
+
+def discard_pending():
+    """Stop waiting for the in-flight answer; it still lands in the answer cache."""
+    st.session_state.pop(PENDING_KEY, None)
+
+def collect(user: Optional[dict]) -> bool:
+    """Move a finished background answer into the session. True if there was one."""
+    pending = st.session_state.get(PENDING_KEY)
+    if not pending or not pending["future"].done():
+        return False
+    st.session_state.pop(PENDING_KEY, None)
+    try:
+        answer = pending["future"].result()
+    except Exception as e:
+        answer = f"⚠️ Error: {e}"
+    st.session_state["last_query"] = pending["query"]
+    st.session_state["last_answer"] = answer
+    persist_turn(user, pending["query"], answer)  # skips errors and "busy, try again"
+    return True
+
+@st.fragment(run_every=POLL_SECONDS)
+def pending_answer(user: Optional[dict]):
+    """Progress while the answer is generated; reruns the page once it is ready."""
+    pending = st.session_state.get(PENDING_KEY)
+    if not pending:
+        return
+    if collect(user):
+        st.toast("Answer ready.", icon="✅")
+        st.rerun()
+    st.info(f"⏳ Searching legal documents and generating an answer for “{pending['query']}” "
+            f"({time.time() - pending['started']:.0f}s)")
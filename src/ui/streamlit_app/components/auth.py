@@ -1,16 +1,42 @@
 from typing import Optional
 import streamlit as st
-from src.auth.auth_service import current_user, logout
+from src.auth.auth_service import current_access_token, current_user, logout
+from src.auth.session import AuthSession
 
 SESSION_KEY = "legabot_user"
+AUTH_KEY = "legabot_auth"
 
 def get_user() -> Optional[dict]:
+    auth = st.session_state.get(AUTH_KEY)
+    if auth:
+        # Verified locally and refreshed in the background: no auth round trip
+        u = auth.user()
+        set_user(u)
+        return u
     u = current_user()
     if u:
         st.session_state[SESSION_KEY] = u
         return u
     return st.session_state.get(SESSION_KEY)
 
+def set_auth(auth: Optional[AuthSession]):
+    if auth:
+        st.session_state[AUTH_KEY] = auth
+    else:
+        old = st.session_state.pop(AUTH_KEY, None)
+        if old:
+            old.close()
+
+def sign_out():
+    """End the AuthSession, if any, and sign its current token out of Supabase."""
+    auth = st.session_state.get(AUTH_KEY)
+    set_auth(None)
+    logout(auth.access_token if auth else None)
+
+def get_access_token() -> Optional[str]:
+    auth = st.session_state.get(AUTH_KEY)
+    return auth.access_token if auth else current_access_token()
+
 def set_user(user: Optional[dict]):
     if user:
         st.session_state[SESSION_KEY] = user
@@ -31,7 +57,7 @@ def logout_with_confirm():
         with c2:
             if st.button("Yes, logout", type="primary", use_container_width=True):
                 try:
-                    logout()
+                    sign_out()
                 finally:
                     set_user(None)
                     st.toast("Logged out", icon="👋")
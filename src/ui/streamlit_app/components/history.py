@@ -0,0 +1,53 @@
+import os
+from typing import Optional
+
+import streamlit as st
+from src.db.history_backend import user_client as backend_client
+from src.db.write_behind import get_writer
+from src.ui import turns
+from src.ui.streamlit_app.components.auth import SESSION_KEY, get_access_token
+
+PAGE_SIZE = int(os.getenv("LEGABOT_HISTORY_PAGE_SIZE", "10"))
+CONV_KEY = "legabot_conversation_id"
+PAGES_KEY = "legabot_history"  # {"messages": [...], "older": cursor | None}
+
+def user_client():
+    """Chat-history handle acting as the signed-in user (see history_backend)."""
+    user = st.session_state.get(SESSION_KEY) or {}
+    return backend_client(get_access_token(), user.get("id"))
+
+def persist_turn(user: Optional[dict], query: str, answer: str):
+    """Queue the turn for the write-behind writer (see src/ui/turns.py); never fails the answer."""
+    conversation_id = turns.persist_turn(
+        user_client(), (user or {}).get("id"), st.session_state.get(CONV_KEY), query, answer
+    )
+    if conversation_id:
+        st.session_state[CONV_KEY] = conversation_id
+    st.session_state.pop(PAGES_KEY, None)  # reload the newest page on next render
+
+def _load(before: Optional[str] = None):
+    sb = user_client()
+    conversation_id = st.session_state.get(CONV_KEY)
+    if not sb or not conversation_id:
+        return
+    page = get_writer().get_conversation_page(sb, conversation_id, PAGE_SIZE, before)
+    loaded = st.session_state.get(PAGES_KEY) if before else None
+    st.session_state[PAGES_KEY] = {
+        "messages": page["messages"] + (loaded["messages"] if loaded else []),
+        "older": page["older"],
+    }
+
+def history_panel():
+    """Newest page of the conversation; older pages load on demand."""
+    if not st.session_state.get(CONV_KEY):
+        return
+    with st.expander("📜 Conversation history"):
+        if PAGES_KEY not in st.session_state:
+            _load()
+        history = st.session_state.get(PAGES_KEY) or {"messages": [], "older": None}
+        if history["older"] and st.button("⬆️ Load older", use_container_width=True):
+            _load(before=history["older"])
+            st.rerun()
+        for m in history["messages"]:
+            with st.chat_message("user" if m["role"] == "user" else "assistant"):
+                st.markdown(m["content"])
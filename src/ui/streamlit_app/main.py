@@ -13,7 +13,10 @@ import streamlit as st
 from src.ui.streamlit_app.components.brand import show_logo_or_title
 from src.ui.streamlit_app.components.auth import get_user, guard_auth, logout_with_confirm
 from src.ui.streamlit_app.components.styling import apply_custom_styling, answer_card
-from src.llm.rag_pipeline import get_legal_answer
+from src.ui.streamlit_app.components.history import history_panel
+from src.ui.streamlit_app.components.answers import (
+    answer_executor, ask, collect, discard_pending, is_pending, pending_answer,
+)
 
 st.set_page_config(page_title="LegaBot – Home", page_icon="⚖️", layout="wide")
 apply_custom_styling()
@@ -35,17 +38,20 @@ with c3:
 
 st.divider()
 guard_auth()  # redirect if not logged in
+answer_executor()  # process-wide; the first run also warms the RAG pipeline
+collect(user)  # an answer that finished while the page was rerunning for something else
 
 # Ask UI
 st.subheader("Ask a legal question")
 query = st.text_area("Your question", placeholder="e.g., What is theft under IPC?", height=140)
 cc1, cc2 = st.columns([1.2, 1])
 with cc1:
-    run = st.button("Ask", type="primary", use_container_width=True)
+    run = st.button("Ask", type="primary", use_container_width=True, disabled=is_pending())
 with cc2:
     clear = st.button("Clear", use_container_width=True)
 
 if clear:
+    discard_pending()
     st.session_state.pop("last_answer", None)
     st.session_state.pop("last_query", None)
     st.rerun()
@@ -54,19 +60,18 @@ if run:
     if not query.strip():
         st.warning("Please enter a valid question.")
     else:
-        st.session_state["last_query"] = query.strip()
-        with st.spinner("Searching legal documents and generating answer..."):
-            try:
-                st.session_state["last_answer"] = get_legal_answer(query.strip())
-                st.toast("Answer ready.", icon="✅")
-            except Exception as e:
-                st.session_state["last_answer"] = f"⚠️ Error: {e}"
-        st.rerun()
+        ask(user, query.strip())
+        st.rerun()  # render with Ask disabled and the progress fragment attached
 
-if "last_answer" in st.session_state and st.session_state["last_answer"]:
+# Generation runs in the background: reruns from any widget reattach here
+if is_pending():
+    pending_answer(user)
+elif "last_answer" in st.session_state and st.session_state["last_answer"]:
     st.markdown("#### Answer")
     answer_card(st.session_state["last_answer"])
 
+history_panel()
+
 # Sidebar examples
 with st.sidebar:
     st.markdown("### 💡 Examples")
@@ -75,13 +80,8 @@ with st.sidebar:
         "Punishment for murder?",
         "What section deals with bail?",
     ]:
-        if st.button(ex, use_container_width=True):
-            st.session_state["last_query"] = ex
-            with st.spinner("Generating answer..."):
-                try:
-                    st.session_state["last_answer"] = get_legal_answer(ex)
-                except Exception as e:
-                    st.session_state["last_answer"] = f"⚠️ Error: {e}"
+        if st.button(ex, use_container_width=True, disabled=is_pending()):
+            ask(user, ex)
             st.rerun()
 
     pinecone_idx = os.getenv("PINECONE_INDEX_NAME", "")
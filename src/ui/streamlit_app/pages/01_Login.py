@@ -10,9 +10,10 @@ load_dotenv(PROJECT_ROOT / ".env")
 
 import streamlit as st
 from src.ui.streamlit_app.components.brand import show_logo_or_title
-from src.ui.streamlit_app.components.auth import set_user, get_user
+from src.ui.streamlit_app.components.auth import set_auth, set_user, get_user
 from src.ui.streamlit_app.components.styling import apply_custom_styling
 from src.auth.auth_service import login_email_password, current_user
+from src.auth.session import start_session
 
 st.set_page_config(page_title="Login – LegaBot", page_icon="🔑", layout="centered")
 apply_custom_styling()
@@ -41,9 +42,11 @@ if submit:
         st.error("Please fill both email and password.")
     else:
         try:
-            login_email_password(email.strip(), pwd)
-            u = current_user()
+            res = login_email_password(email.strip(), pwd)
+            auth = start_session(getattr(res, "session", None))
+            u = auth.user() if auth else current_user()
             if u:
+                set_auth(auth)
                 set_user(u)
                 st.toast("Logged in.", icon="✅")
                 st.switch_page("main.py")
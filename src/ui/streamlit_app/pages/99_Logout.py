@@ -11,9 +11,8 @@ load_dotenv(PROJECT_ROOT / ".env")
 import time
 import streamlit as st
 from src.ui.streamlit_app.components.brand import show_logo_or_title
-from src.ui.streamlit_app.components.auth import get_user, set_user
+from src.ui.streamlit_app.components.auth import get_user, set_user, sign_out
 from src.ui.streamlit_app.components.styling import apply_custom_styling
-from src.auth.auth_service import logout
 
 st.set_page_config(page_title="Logout – LegaBot", page_icon="🚪", layout="centered")
 apply_custom_styling()
@@ -39,7 +38,7 @@ else:
     with c2:
         if st.button("Yes, logout", type="primary", use_container_width=True):
             try:
-                logout()
+                sign_out()
             finally:
                 set_user(None)
                 st.success("Logged out successfully.")
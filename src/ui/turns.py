@@ -0,0 +1,57 @@
+"""
+Saving question/answer turns to chat history, shared by the Chainlit and
+Streamlit UIs. Each UI keeps the conversation id in its own session store
+and passes it in; only real answers are saved (not "busy, try again",
+errors or passages-only fallbacks, which are worth asking again).
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from src.db.history_backend import acreate_new_conversation, history
+from src.db.write_behind import get_writer
+from src.llm.scheduler import BUSY_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# rag_pipeline's error replies and degraded (passages-only) answers start with this
+ERROR_PREFIX = "⚠️"
+
+
+def is_real_answer(answer: Optional[str]) -> bool:
+    """Whether `answer` is worth saving or serving again."""
+    return bool(answer) and answer != BUSY_MESSAGE and not answer.startswith(ERROR_PREFIX)
+
+
+def persist_turn(sb, user_id: Optional[str], conversation_id: Optional[str],
+                 question: str, answer: str) -> Optional[str]:
+    """
+    Queue the turn for the write-behind writer, creating the conversation
+    first if there is none yet. Blocking; never fails the answer.
+
+    Returns the conversation id to keep in the session (None if there is none).
+    """
+    if not sb or not user_id or not is_real_answer(answer):
+        return conversation_id
+    try:
+        if not conversation_id:
+            conversation_id = history().create_new_conversation(sb, user_id, question[:60])
+        get_writer().save_turn(sb, conversation_id, user_id, question, answer)
+    except Exception as e:
+        logger.warning("Could not save chat turn: %s", e)
+    return conversation_id
+
+
+async def apersist_turn(sb, user_id: Optional[str], conversation_id: Optional[str],
+                        question: str, answer: str) -> Optional[str]:
+    """persist_turn for event-loop UIs; only the write-behind enqueue (a spool fsync) leaves the loop."""
+    if not sb or not user_id or not is_real_answer(answer):
+        return conversation_id
+    try:
+        if not conversation_id:
+            conversation_id = await acreate_new_conversation(sb, user_id, question[:60])
+        await asyncio.to_thread(get_writer().save_turn, sb, conversation_id, user_id, question, answer)
+    except Exception as e:
+        logger.warning("Could not save chat turn: %s", e)
+    return conversation_id
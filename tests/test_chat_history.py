@@ -0,0 +1,74 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from src.db import chat_history
+
+
+class _Query:
+    def __init__(self, result):
+        self._result = result
+
+    def select(self, columns, **kwargs):
+        if isinstance(self._result, dict):  # result depends on the columns asked for
+            self._result = self._result["counters" if "message_count" in columns else "plain"]
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        if isinstance(self._result, Exception):
+            raise self._result
+        return type("Result", (), {"data": self._result, "count": len(self._result)})()
+
+
+class FakeClient:
+    """Counter-column selects get `listing`, the listing RPC `rpc_result`, everything else no rows."""
+
+    def __init__(self, listing, rpc_result):
+        self.listing = listing
+        self.rpc_result = rpc_result
+
+    def table(self, name):
+        return _Query({"counters": self.listing, "plain": []} if name == "conversations" else [])
+
+    def rpc(self, fn, params=None):
+        return _Query(self.rpc_result)
+
+
+ROW = {"id": "c1", "title": "t", "created_at": "x", "updated_at": "x", "message_count": 2, "last_message": "hi"}
+
+
+def test_missing_counter_columns_fall_back_to_the_rpc():
+    sb = FakeClient(APIError({"code": "42703", "message": "column does not exist"}), [ROW])
+    assert chat_history.get_user_conversations(sb, "u1") == [ROW]
+
+
+def test_other_errors_are_raised_not_hidden_by_a_fallback():
+    sb = FakeClient(APIError({"code": "57014", "message": "canceling statement due to statement timeout"}), [ROW])
+    with pytest.raises(APIError):
+        chat_history.get_user_conversations(sb, "u1")
+
+    sb = FakeClient(APIError({"code": "42703", "message": "column does not exist"}),
+                    APIError({"code": "42501", "message": "permission denied"}))
+    with pytest.raises(APIError):
+        chat_history.get_user_conversations(sb, "u1")
+
+
+def test_missing_rpc_falls_back_to_per_conversation_queries():
+    sb = FakeClient(APIError({"code": "42703", "message": "column does not exist"}),
+                    APIError({"code": "PGRST202", "message": "Could not find the function"}))
+    assert chat_history.get_user_conversations(sb, "u1") == []
+
+
+def test_update_conversation_timestamp_sends_utc_offset():
+    sent = []
+
+    class Client:
+        def table(self, name):
+            query = _Query([])
+            query.update = lambda values: sent.append(values) or query
+            return query
+
+    chat_history.update_conversation_timestamp(Client(), "c1")
+    assert sent[0]["updated_at"].endswith("+00:00")
@@ -0,0 +1,39 @@
+import numpy as np
+
+from src.llm.compression import compress_matches
+
+VOCAB = ["theft", "murder", "bail", "dowry"]
+
+
+def encode(sentences):
+    # One-hot on the first vocabulary word in the sentence: enough to rank by topic
+    out = np.zeros((len(sentences), len(VOCAB)), dtype=np.float32)
+    for row, s in enumerate(sentences):
+        for col, word in enumerate(VOCAB):
+            if word in s.lower():
+                out[row, col] = 1.0
+                break
+    return out
+
+
+def match(i, text):
+    return {"id": str(i), "score": 0.9, "metadata": {"file_name": "ipc.pdf", "text": text}}
+
+
+def test_chunk_whose_best_sentence_was_seen_keeps_it():
+    shared = "Theft is the dishonest taking of movable property."
+    matches = [
+        match(1, f"Murder is defined elsewhere. {shared}"),
+        match(2, f"{shared} Bail is covered in another code."),  # overlap repeats the shared sentence
+    ]
+    out = compress_matches([1, 0, 0, 0], matches, encode, sentences_per_chunk=1, neighbours=0)
+    assert [m["id"] for m in out] == ["1", "2"]
+    assert out[1]["metadata"]["text"] == shared
+
+
+def test_repeated_neighbours_are_still_deduplicated():
+    shared = "Theft is the dishonest taking of movable property."
+    matches = [match(1, f"{shared} Murder is defined elsewhere."), match(2, f"Murder is defined elsewhere. {shared}")]
+    out = compress_matches([1, 0, 0, 0], matches, encode, sentences_per_chunk=1, neighbours=1)
+    assert out[0]["metadata"]["text"] == f"{shared} Murder is defined elsewhere."
+    assert out[1]["metadata"]["text"] == shared
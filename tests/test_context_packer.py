@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from src.llm.context_packer import GAP_MARKER, merge_adjacent
+from src.retrieval.local_index import TEXT_FILE
+
+# store_pinecone keeps text[:800] of each ~1000-character chunk as metadata
+STORED = 800
+
+
+@pytest.fixture(scope="module")
+def chunks():
+    return pd.read_csv(TEXT_FILE)["text"].astype(str).tolist()
+
+
+def match(i: int, text: str, score: float = 0.8):
+    return {"id": str(i), "score": score, "metadata": {"file_name": "ipc.pdf", "text": text}}
+
+
+def test_stored_snippets_are_joined_with_a_gap_marker(chunks):
+    # Rows 2 and 3 are neighbours whose 100-character overlap sits past the stored 800
+    a, b = chunks[2][:STORED], chunks[3][:STORED]
+    merged = merge_adjacent([match(2, a), match(3, b)])
+    assert len(merged) == 1 and merged[0]["merged_ids"] == ["2", "3"]
+    text = merged[0]["metadata"]["text"]
+    assert GAP_MARKER in text
+    assert text.startswith(a.replace("\n", " ").strip())
+
+
+def test_full_chunks_are_stitched_on_their_overlap(chunks):
+    a, b = chunks[2].replace("\n", " ").strip(), chunks[3].replace("\n", " ").strip()
+    text = merge_adjacent([match(2, chunks[2]), match(3, chunks[3])])[0]["metadata"]["text"]
+    assert GAP_MARKER not in text
+    assert text.startswith(a)
+    # The shared text appears once: the merge is shorter than the two chunks side by side
+    assert len(text) < len(a) + len(b)
+    assert text.endswith(b[-200:])
+
+
+def test_non_adjacent_chunks_stay_separate(chunks):
+    merged = merge_adjacent([match(2, chunks[2][:STORED]), match(4, chunks[4][:STORED])])
+    assert [m["id"] for m in merged] == ["2", "4"]
@@ -0,0 +1,46 @@
+from src.benchmarks.fakes import FakeSupabase
+from src.db import chat_history
+from src.db.archive import read_ndjson
+from src.db.export import export_user_history, import_user_history
+
+USER = "00000000-0000-0000-0000-000000000044"
+OTHER = "00000000-0000-0000-0000-0000000000ff"
+
+
+def history(conversations, messages):
+    sb = FakeSupabase(rtt_ms=0)
+    for user in (USER, OTHER):
+        for c in range(conversations):
+            conversation_id = chat_history.create_new_conversation(sb, user, f"c{c}")
+            for m in range(messages):
+                chat_history.save_message(sb, conversation_id, user, "user", f"{c}/{m}")
+    return sb
+
+
+def test_export_pages_messages_by_user_not_per_conversation(tmp_path):
+    sb = history(conversations=30, messages=2)
+    sb.reset_counters()
+    counts = export_user_history(sb, USER, tmp_path / "out.ndjson", page_size=10)
+    assert (counts["conversation"], counts["message"]) == (30, 60)
+    assert sb.round_trips <= 4 + 2 * 7  # conversation pages + at most two requests per message page
+
+    current, seen = None, []
+    for record in read_ndjson(tmp_path / "out.ndjson"):
+        if record["type"] == "conversation":
+            current = record["id"]
+        else:
+            assert record["conversation_id"] == current and record["user_id"] == USER
+            seen.append(record["content"])
+    assert sorted(seen) == sorted(f"{c}/{m}" for c in range(30) for m in range(2))
+
+
+def test_import_restores_only_updated_at(tmp_path):
+    source = history(conversations=2, messages=2)
+    export_user_history(source, USER, tmp_path / "out.ndjson")
+    exported = {c["id"]: c["updated_at"] for c in source.tables["conversations"] if c["user_id"] == USER}
+
+    target = FakeSupabase(rtt_ms=0)
+    import_user_history(target, USER, tmp_path / "out.ndjson")
+    imported = {c["id"]: c for c in target.tables["conversations"]}
+    assert {cid: c["updated_at"] for cid, c in imported.items()} == exported
+    assert all(c["message_count"] == 2 for c in imported.values())  # counters left as the triggers set them
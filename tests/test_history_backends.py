@@ -0,0 +1,183 @@
+"""
+Parity between the two chat-history backends on a real Postgres with the
+migrations applied: chat_history over HTTP (through the PostgREST stand-in
+from history_backend_bench) and chat_history_pg over asyncpg, on the same
+rows. Set TEST_DATABASE_URL to run, e.g. against a throwaway container:
+
+    docker run -d -p 5433:5432 -e POSTGRES_HOST_AUTH_METHOD=trust postgres:16
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5433/postgres pytest tests/test_history_backends.py
+"""
+
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+DSN = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+USER_A = "00000000-0000-0000-0000-00000000a048"
+USER_B = "00000000-0000-0000-0000-00000000b048"
+MESSAGES = 25
+
+
+@pytest.fixture(scope="module")
+def db():
+    psycopg2 = pytest.importorskip("psycopg2")
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('public.messages') IS NOT NULL AND to_regprocedure("
+                "'public.search_messages(uuid, text, integer, integer)') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        pytest.skip("chat-history migrations are not applied to TEST_DATABASE_URL")
+    cur.execute("SELECT to_regclass('auth.users') IS NOT NULL")
+    has_auth = cur.fetchone()[0]
+    for user in (USER_A, USER_B):
+        if has_auth:
+            cur.execute("INSERT INTO auth.users (id) VALUES (%s) ON CONFLICT DO NOTHING", (user,))
+        cur.execute("DELETE FROM conversations WHERE user_id = %s", (user,))
+    yield cur
+    for user in (USER_A, USER_B):
+        cur.execute("DELETE FROM conversations WHERE user_id = %s", (user,))
+        if has_auth:
+            cur.execute("DELETE FROM auth.users WHERE id = %s", (user,))
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def backends(db):
+    """(http api, its client, pg api, its client) for USER_A."""
+    from src.auth.supabase_user_client import UserClientPool
+    from src.benchmarks.client_pool_bench import ANON_KEY
+    from src.benchmarks.history_backend_bench import _PostgRESTStandIn, fake_token
+    from src.db import chat_history, chat_history_pg
+
+    chat_history_pg.DATABASE_URL = DSN
+    _PostgRESTStandIn.dsn, _PostgRESTStandIn.rtt_s = DSN, 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PostgRESTStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = UserClientPool(f"http://127.0.0.1:{server.server_address[1]}", ANON_KEY)
+    yield chat_history, pool.get(fake_token(USER_A)), chat_history_pg.sync, chat_history_pg.PgClient(USER_A)
+    pool.close()
+    server.shutdown()
+
+
+def conversation(db, user: str, messages: int = MESSAGES) -> str:
+    """A conversation with `messages` rows; two pairs share a created_at so ties are ordered by id."""
+    conversation_id = str(uuid.uuid4())
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db.execute("INSERT INTO conversations (id, user_id, title) VALUES (%s, %s, 'parity')", (conversation_id, user))
+    for i in range(messages):
+        created = start + timedelta(seconds=i - (i in (7, 16)))
+        db.execute(
+            "INSERT INTO messages (id, conversation_id, user_id, role, content, created_at) VALUES (%s, %s, %s, %s, %s, %s)",
+            (str(uuid.uuid4()), conversation_id, user, "user" if i % 2 == 0 else "assistant", f"message {i}", created),
+        )
+    return conversation_id
+
+
+def comparable(rows):
+    from src.db.chat_history import parse_timestamp
+    return [(r["id"], r["role"], r["content"], r["metadata"], parse_timestamp(r["created_at"])) for r in rows]
+
+
+def test_pages_and_cursors_match(db, backends):
+    http, sb, pg, client = backends
+    conversation_id = conversation(db, USER_A)
+
+    http_page, pg_page = http.get_conversation_page(sb, conversation_id, 10), pg.get_conversation_page(client, conversation_id, 10)
+    seen = []
+    while True:
+        assert comparable(http_page["messages"]) == comparable(pg_page["messages"])
+        assert http_page["has_more"] == pg_page["has_more"]
+        seen = http_page["messages"] + seen
+        if http_page["older"] is None:
+            assert pg_page["older"] is None
+            break
+        # Cursors are interchangeable: page back with the other backend's cursor
+        http_page, pg_page = (
+            http.get_conversation_page(sb, conversation_id, 10, before=pg_page["older"]),
+            pg.get_conversation_page(client, conversation_id, 10, before=http_page["older"]),
+        )
+    assert [r["content"] for r in seen] == [r["content"] for r in http.get_conversation_history(sb, conversation_id)]
+    assert len(seen) == MESSAGES
+
+    middle = seen[MESSAGES // 2]
+    cursor = http.encode_cursor(middle)
+    assert comparable(http.get_conversation_page(sb, conversation_id, 5, after=cursor)["messages"]) == \
+        comparable(pg.get_conversation_page(client, conversation_id, 5, after=cursor)["messages"])
+
+
+def test_conversation_lists_match(db, backends):
+    http, sb, pg, client = backends
+    conversation(db, USER_A, messages=3)
+    http_rows, pg_rows = http.get_user_conversations(sb, USER_A), pg.get_user_conversations(client, USER_A)
+    assert [(r["id"], r["title"], r["message_count"], r["last_message"]) for r in http_rows] == \
+        [(r["id"], r["title"], r["message_count"], r["last_message"]) for r in pg_rows]
+
+
+@pytest.mark.parametrize("backend", ["http", "pg"])
+def test_insert_messages_skips_ids_that_exist(db, backends, backend):
+    http, sb, pg, client = backends
+    api, handle = (http, sb) if backend == "http" else (pg, client)
+    conversation_id = conversation(db, USER_A, messages=1)
+    existing = api.get_conversation_history(handle, conversation_id)[0]
+
+    replayed = {**existing, "user_id": USER_A, "content": "changed on replay"}
+    new = http.message_row(conversation_id, USER_A, "assistant", "new")
+    api.insert_messages(handle, [replayed, new])
+    api.insert_messages(handle, [new])
+
+    rows = api.get_conversation_history(handle, conversation_id)
+    assert [(r["id"], r["content"]) for r in rows] == [(existing["id"], existing["content"]), (new["id"], "new")]
+
+
+def test_pg_client_only_touches_its_own_users_rows(db, backends):
+    http, _, pg, client = backends
+    theirs = conversation(db, USER_B, messages=2)
+    db.execute("SELECT updated_at FROM conversations WHERE id = %s", (theirs,))
+    updated_at = db.fetchone()[0]
+
+    assert pg.get_conversation_page(client, theirs, 10)["messages"] == []
+    assert pg.get_conversation_history(client, theirs) == []
+    with pytest.raises(PermissionError):
+        pg.save_turn(client, theirs, USER_B, "q", "a")
+    with pytest.raises(PermissionError):
+        pg.insert_messages(client, [http.message_row(theirs, USER_B, "user", "q")])
+    with pytest.raises(PermissionError):
+        pg.get_user_conversations(client, USER_B)
+    with pytest.raises(PermissionError):
+        pg.search_messages(client, USER_B, "message")
+    assert pg.delete_conversation(client, theirs, USER_B) is False
+    pg.update_conversation_timestamp(client, theirs)
+
+    db.execute("SELECT count(*), max(c.updated_at) FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+               "WHERE m.conversation_id = %s", (theirs,))
+    assert db.fetchone() == (2, updated_at)
+
+
+def test_async_helpers_await_chat_history_pg_and_keep_the_cache_right(db, backends, monkeypatch):
+    from src.db import chat_history_pg, history_backend, history_cache
+
+    _, _, pg, client = backends
+    cache = history_cache.HistoryCache(pg, history_cache.MemoryStore())
+    monkeypatch.setattr(history_backend, "BACKEND", "postgres")
+    monkeypatch.setattr(history_backend, "_history", cache)
+    cache.get_user_conversations(client, USER_A)  # now cached
+
+    async def chat():
+        conversation_id = await history_backend.acreate_new_conversation(client, USER_A, "async")
+        await chat_history_pg.save_turn(client, conversation_id, USER_A, "q", "a")
+        page = await history_backend.aget_conversation_page(client, conversation_id, 10)
+        await chat_history_pg.close_pool()
+        return conversation_id, page
+
+    conversation_id, page = asyncio.run(chat())
+    assert [m["content"] for m in page["messages"]] == ["q", "a"]
+    assert conversation_id in [c["id"] for c in cache.get_user_conversations(client, USER_A)]
@@ -0,0 +1,52 @@
+from src.benchmarks.fakes import FakeSupabase
+from src.db import chat_history
+from src.db.history_cache import HistoryCache, MemoryStore
+
+USER = "00000000-0000-0000-0000-000000000049"
+
+
+def setup(turns=3):
+    sb = FakeSupabase(rtt_ms=0)
+    sb.user_id = USER
+    cache = HistoryCache(chat_history, MemoryStore())
+    conversation_id = chat_history.create_new_conversation(sb, USER)
+    for t in range(turns):
+        chat_history.save_turn(sb, conversation_id, USER, f"q{t}", f"a{t}")
+    return sb, cache, conversation_id
+
+
+def contents(page):
+    return [m["content"] for m in page["messages"]]
+
+
+def test_newest_page_is_served_from_the_cache():
+    sb, cache, conversation_id = setup()
+    first = cache.get_conversation_page(sb, conversation_id, 4)
+    first["messages"].append({"content": "callers may extend what they get"})
+    sb.reset_counters()
+
+    again = cache.get_conversation_page(sb, conversation_id, 4)
+    assert sb.round_trips == 0
+    assert contents(again) == ["q1", "a1", "q2", "a2"]
+    assert cache.get_conversation_page(sb, conversation_id, 2)["messages"] != again["messages"]  # keyed on limit
+
+
+def test_turns_drop_the_cached_page():
+    sb, cache, conversation_id = setup()
+    cache.get_conversation_page(sb, conversation_id, 4)
+    cache.save_turn(sb, conversation_id, USER, "q3", "a3")
+    assert contents(cache.get_conversation_page(sb, conversation_id, 4)) == ["q2", "a2", "q3", "a3"]
+
+    cache.insert_messages(sb, [chat_history.message_row(conversation_id, USER, "user", "q4")])
+    assert contents(cache.get_conversation_page(sb, conversation_id, 4))[-1] == "q4"
+
+
+def test_pages_behind_a_cursor_are_not_cached():
+    sb, cache, conversation_id = setup()
+    newest = cache.get_conversation_page(sb, conversation_id, 2)
+    sb.reset_counters()
+    older = cache.get_conversation_page(sb, conversation_id, 2, before=newest["older"])
+    cache.get_conversation_page(sb, conversation_id, 2, before=newest["older"])
+    assert contents(older) == ["q1", "a1"]
+    assert sb.round_trips == 2
+    assert cache.stats["hits"] == 0
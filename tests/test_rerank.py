@@ -0,0 +1,39 @@
+from src.retrieval.rerank import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.calls += 1
+        return [float(len(text)) for _, text in pairs]
+
+
+def matches(n):
+    return [{"id": str(i), "score": 0.5, "metadata": {"text": "x" * (i + 1)}} for i in range(n)]
+
+
+def test_slow_cold_estimate_recovers():
+    reranker = CrossEncoderReranker(budget_ms=150, top_n=3)
+    reranker._model = FakeCrossEncoder()
+    reranker._pair_ms = 500.0  # one cold measurement: 20 pairs would be 10 s
+    results = [reranker.rerank(f"query {i}", matches(20)) for i in range(100)]
+    assert results[0] is None
+    assert any(r is not None for r in results), "reranking stayed off after one slow measurement"
+    scored = next(r for r in results if r is not None)
+    assert [m["id"] for m in scored] == ["19", "18", "17"]
+    # The real (fast) measurement replaced the stale estimate
+    assert reranker.estimate_ms(20) < 150
+    assert reranker.rerank("another", matches(20)) is not None
+
+
+def test_counts_are_per_call():
+    reranker = CrossEncoderReranker(budget_ms=150, top_n=3)
+    reranker._model = FakeCrossEncoder()
+    reranker.rerank("query", matches(4))  # another request warming the cache
+    counts = {}
+    ranked = reranker.rerank("query", matches(6), top_n=5, counts=counts)
+    assert counts == {"hits": 4, "misses": 2}
+    assert len(ranked) == 5
+    assert reranker.stats["cache_hits"] == 4
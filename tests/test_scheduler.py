@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.llm.scheduler import LLMScheduler, SchedulerBusy, queue_wait
+
+
+def test_check_admission_sheds_only_when_a_call_would_be_rejected():
+    sched = LLMScheduler(max_concurrency=1, max_queue=1, max_queue_per_user=1)
+    sched.check_admission("a")
+    sched.acquire("a")
+    sched.check_admission("b")  # would queue, not be shed
+
+    started = threading.Event()
+
+    def queued():
+        started.set()
+        sched.acquire("b")
+        sched.release()
+
+    waiter = threading.Thread(target=queued)
+    waiter.start()
+    started.wait()
+    while sched.snapshot()["queued"] == 0:
+        pass
+    with pytest.raises(SchedulerBusy):
+        sched.check_admission("c")
+    sched.release()
+    waiter.join()
+    sched.check_admission("c")
+
+
+def test_arun_sets_queue_wait_in_the_callers_context():
+    sched = LLMScheduler(max_concurrency=1)
+
+    async def main():
+        queue_wait.set(-1.0)
+        result = await sched.arun(lambda x: x * 2, 21, user_id="a")
+        return result, queue_wait.get()
+
+    result, wait = asyncio.run(main())
+    assert result == 42
+    assert 0.0 <= wait < 1.0
+
+
+def test_timed_out_callers_leave_the_queue():
+    sched = LLMScheduler(max_concurrency=1, max_queue=2, max_queue_per_user=2)
+    sched.acquire("a")
+    for _ in range(2):
+        with pytest.raises(SchedulerBusy):
+            sched.acquire("b", timeout=0.01)
+    assert sched.snapshot()["queued"] == 0 and sched.snapshot()["users_waiting"] == 0
+    sched.check_admission("c")  # nobody is really waiting
+    sched.release()
+    assert sched.acquire("c", timeout=0) == 0.0  # the fast path is open again
+    sched.release()
@@ -0,0 +1,81 @@
+import time
+from types import SimpleNamespace
+
+import jwt
+
+from src.auth import auth_service, session
+
+SECRET = "test-secret-of-at-least-thirty-two-bytes"
+
+
+class FakeAuth:
+    """The bits of the shared client's gotrue client that sign-in/out touch."""
+
+    def __init__(self, access_token=None):
+        self.session = SimpleNamespace(access_token=access_token, refresh_token="r1") if access_token else None
+        self.revoked = []
+        self.admin = SimpleNamespace(sign_out=lambda token: self.revoked.append(token))
+
+    def get_session(self):
+        return self.session
+
+    def set_session(self, access_token, refresh_token):
+        self.session = SimpleNamespace(access_token=access_token, refresh_token=refresh_token)
+
+    def sign_out(self):
+        self.revoked.append(self.session.access_token if self.session else None)
+        self.session = None
+
+
+def token(sub="11111111-1111-1111-1111-111111111111"):
+    claims = {"sub": sub, "aud": "authenticated", "exp": int(time.time()) + 3600, "email": "a@b.c"}
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def fake_client(monkeypatch, access_token=None):
+    auth = FakeAuth(access_token)
+    monkeypatch.setattr(auth_service, "supabase", lambda: SimpleNamespace(auth=auth))
+    monkeypatch.setattr(session, "SUPABASE_JWT_SECRET", SECRET)
+    return auth
+
+
+def test_sign_in_leaves_the_session_to_the_auth_session(monkeypatch):
+    access = token()
+    shared = fake_client(monkeypatch)
+    one_off = SimpleNamespace(sign_in_with_password=lambda credentials: SimpleNamespace(
+        session=SimpleNamespace(access_token=access, refresh_token="r1")))
+    monkeypatch.setattr(auth_service, "sign_in_client", lambda: SimpleNamespace(auth=one_off))
+
+    res = auth_service.login_email_password("a@b.c", "pw")
+    auth = session.start_session(res.session)
+    assert auth is not None and auth.user()["email"] == "a@b.c"
+    assert shared.session is None  # no second refresher for the same refresh token
+    assert shared.revoked == []
+    auth.close()
+
+
+def test_unverifiable_sessions_go_to_the_shared_client(monkeypatch):
+    shared = fake_client(monkeypatch)
+    monkeypatch.setattr(session, "SUPABASE_JWT_SECRET", "not-the-secret-the-token-was-signed-with")
+    unverifiable = token(sub="22222222-2222-2222-2222-222222222222")
+    assert session.start_session(SimpleNamespace(access_token=unverifiable, refresh_token="r1")) is None
+    assert shared.session.refresh_token == "r1"  # current_user() keeps working
+
+
+def test_logout_signs_out_the_auth_sessions_current_token(monkeypatch):
+    shared = fake_client(monkeypatch)
+    auth_service.logout("refreshed-token")
+    assert shared.revoked == ["refreshed-token"]
+
+
+def test_pooled_clients_take_their_user_from_verified_tokens_only(monkeypatch):
+    from src.auth.supabase_user_client import UserClientPool
+
+    monkeypatch.setattr(session, "SUPABASE_JWT_SECRET", SECRET)
+    victim = "33333333-3333-3333-3333-333333333333"
+    forged = jwt.encode({"sub": victim, "aud": "authenticated", "exp": int(time.time()) + 3600},
+                        "an-attackers-secret-of-thirty-two-bytes", algorithm="HS256")
+    pool = UserClientPool("http://127.0.0.1:9", "anon")
+    assert pool.get(token(sub=victim)).user_id == victim
+    assert pool.get(forged).user_id is None  # never served the victim's cached history
+    pool.close()
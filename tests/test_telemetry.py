@@ -0,0 +1,27 @@
+import threading
+import time
+
+import pytest
+
+from src.observability import telemetry
+
+
+@pytest.mark.skipif(telemetry.trace is None, reason="opentelemetry not installed")
+def test_stage_waits_for_instruments_while_another_thread_initialises(monkeypatch):
+    monkeypatch.setattr(telemetry, "_initialised", False)
+    monkeypatch.setattr(telemetry, "_instruments", {})
+    exporting = threading.Event()
+
+    def slow_exporters():
+        exporting.set()
+        time.sleep(0.2)
+        return None, None
+
+    monkeypatch.setattr(telemetry, "_exporters", slow_exporters)
+    first = threading.Thread(target=telemetry.init_telemetry)
+    first.start()
+    exporting.wait()
+    with telemetry.stage("test"):
+        pass
+    first.join()
+    assert "stage_ms" in telemetry._instruments
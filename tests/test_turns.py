@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from src.llm.scheduler import BUSY_MESSAGE
+from src.ui import turns
+
+
+def test_only_real_answers_count():
+    assert turns.is_real_answer("Section 378 IPC defines theft.")
+    assert not turns.is_real_answer(BUSY_MESSAGE)
+    assert not turns.is_real_answer("⚠️ Error: timed out")
+    assert not turns.is_real_answer("⚠️ The answer service is not responding right now, ...")
+    assert not turns.is_real_answer("")
+
+
+def test_persist_turn_creates_the_conversation_once_and_skips_non_answers(monkeypatch):
+    created, saved = [], []
+    monkeypatch.setattr(turns, "history", lambda: SimpleNamespace(
+        create_new_conversation=lambda sb, user_id, title: created.append(title) or "conv-1"))
+    monkeypatch.setattr(turns, "get_writer", lambda: SimpleNamespace(
+        save_turn=lambda sb, conv, user_id, q, a: saved.append((conv, q, a))))
+
+    assert turns.persist_turn("sb", "u1", None, "busy?", BUSY_MESSAGE) is None
+    conv = turns.persist_turn("sb", "u1", None, "What is theft?", "Section 378.")
+    assert turns.persist_turn("sb", "u1", conv, "Punishment?", "Section 379.") == conv
+    assert turns.persist_turn("sb", "u1", conv, "Again?", "⚠️ Error: boom") == conv
+    assert created == ["What is theft?"]
+    assert saved == [("conv-1", "What is theft?", "Section 378."), ("conv-1", "Punishment?", "Section 379.")]
+
+
+def test_persist_turn_never_raises(monkeypatch):
+    def down():
+        raise ConnectionError("database down")
+    monkeypatch.setattr(turns, "history", down)
+    assert turns.persist_turn("sb", "u1", None, "q", "a") is None
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from postgrest.exceptions import APIError
+
+from src.db.write_behind import WriteBehindWriter
+
+
+class Recorder:
+    """insert() stand-in: fails for the users in `failing`, records everything else."""
+
+    def __init__(self, failing=(), error=None):
+        self.failing = set(failing)
+        self.error = error or RuntimeError("database unavailable")
+        self.inserted = []
+        self.lock = threading.Lock()
+
+    def __call__(self, client, rows):
+        if rows[0]["user_id"] in self.failing:
+            raise self.error
+        with self.lock:
+            self.inserted.extend((client, r["id"]) for r in rows)
+
+
+def writer(tmp_path, insert, **kwargs):
+    return WriteBehindWriter(
+        spool_path=tmp_path / "spool.jsonl", dead_letter_path=tmp_path / "dead.jsonl",
+        flush_interval=0.01, fsync=False, insert=insert, api=SimpleNamespace(), **kwargs,
+    ).start()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_failing_user_backs_off_alone_and_is_dead_lettered(tmp_path):
+    insert = Recorder(failing={"a"})
+    w = writer(tmp_path, insert, max_attempts=2)
+    bad = w.save_turn("client-a", "conv-a", "a", "q", "answer")
+    for i in range(3):
+        w.save_turn("client-b", "conv-b", "b", f"q{i}", "answer")
+        wait_for(lambda: not w.pending(user_id="b"), timeout=0.5)
+
+    wait_for(lambda: w.stats["dead_lettered"] == 2)
+    assert w.pending() == []
+    dead = [json.loads(line) for line in (tmp_path / "dead.jsonl").read_text().splitlines()]
+    assert [d["row"]["id"] for d in dead] == bad
+    assert all(d["attempts"] == 2 and "database unavailable" in d["error"] for d in dead)
+    w.close()
+    # Dead-lettered rows are acknowledged, so a restart does not replay them
+    assert writer(tmp_path, Recorder()).pending() == []
+
+
+def test_rejected_token_drops_the_client_until_the_next_write(tmp_path):
+    insert = Recorder(failing={"a"}, error=APIError({"code": "PGRST301", "message": "JWT expired"}))
+    w = writer(tmp_path, insert)
+    first = w.save_message("stale", "conv", "a", "user", "hello")
+    wait_for(lambda: w.stats["auth_errors"] == 1)
+    assert w.snapshot()["parked"] == 1
+
+    insert.failing.clear()
+    second = w.save_message("fresh", "conv", "a", "assistant", "hi")
+    assert w.flush(2.0)
+    assert insert.inserted == [("fresh", first), ("fresh", second)]
+    w.close()
+
+
+def test_rows_carry_utc_offsets(tmp_path):
+    w = writer(tmp_path, Recorder())
+    w.save_turn("client", "conv", "u", "q", "answer")
+    assert all(r["created_at"].endswith("+00:00") for r in w.pending())
+    assert w.snapshot()["oldest_pending_s"] >= 0
+    w.close()
+
+
+def test_writes_after_close_go_straight_to_the_database(tmp_path):
+    insert = Recorder()
+    w = writer(tmp_path, insert)
+    w.close()
+    ids = w.save_turn("client", "conv", "u", "q", "answer")
+    assert [i for _, i in insert.inserted] == ids
+    assert w.stats["inline_writes"] == 2
+
+
+def test_spool_fsync_does_not_hold_up_readers(tmp_path, monkeypatch):
+    w = writer(tmp_path, Recorder())
+    syncing = threading.Event()
+    release = threading.Event()
+
+    def slow_fsync(fd):
+        syncing.set()
+        release.wait(5)
+
+    w.fsync = True
+    monkeypatch.setattr("src.db.write_behind.os.fsync", slow_fsync)
+    saver = threading.Thread(target=w.save_message, args=("client", "conv", "u", "user", "hello"))
+    saver.start()
+    assert syncing.wait(5)
+    started = time.monotonic()
+    w.pending()
+    w.snapshot()
+    assert time.monotonic() - started < 1
+    release.set()
+    saver.join()
+    w.fsync = False
+    w.close()
+
+
+def crash(w):
+    """Stop a writer the way a killed process would: its spool lock goes, its spool stays."""
+    w._spool.close()
+    w._spool = None
+
+
+def test_writers_sharing_a_directory_keep_their_own_rows(tmp_path):
+    release = threading.Event()
+    a = writer(tmp_path, lambda client, rows: release.wait(5))
+    mine = a.save_turn("client-a", "conv-a", "a", "q", "answer")
+    b = writer(tmp_path, Recorder(failing={"a"}))
+    theirs = b.save_turn("client-b", "conv-a", "a", "q", "answer")
+    b.save_turn("client-b", "conv-b", "b", "q", "answer")
+    wait_for(lambda: len(b.pending()) == 2)
+    with b._spool_lock:
+        b._compact()
+
+    # Both writers are alive: nobody adopts their spools, and b's compactions left a's rows alone
+    assert a.spool_file != b.spool_file
+    assert writer(tmp_path, Recorder()).pending() == []
+    crash(a)
+    adopted = writer(tmp_path, Recorder())
+    assert [r["id"] for r in adopted.pending()] == mine
+    assert not a.spool_file.exists()
+    assert {r["id"] for r in b.pending()} == set(theirs)
+    release.set()
+    b.close(0.1)
+
+
+def test_rows_no_client_comes_back_for_are_dead_lettered(tmp_path):
+    release = threading.Event()
+    a = writer(tmp_path, lambda client, rows: release.wait(5))
+    ids = a.save_turn("client", "conv", "gone", "q", "answer")
+    crash(a)
+
+    b = writer(tmp_path, Recorder(), park_timeout=0.05)
+    assert b.stats["replayed"] == 2
+    wait_for(lambda: b.stats["dead_lettered"] == 2)
+    assert b.pending() == []
+    dead = [json.loads(line) for line in (tmp_path / "dead.jsonl").read_text().splitlines()]
+    assert [d["row"]["id"] for d in dead] == ids and "no client" in dead[0]["error"]
+    wait_for(lambda: b.spool_file.stat().st_size == 0)
+    release.set()
+    b.close()
+    assert not b.spool_file.exists()